@@ -1,19 +1,1180 @@
+import time
+
+# Отсчет времени запуска для --startup-log: до загрузки openpyxl и PyQt6
+STARTUP_STARTED = time.perf_counter()
+
+import hashlib
+import io
+import json
+import mmap
+import multiprocessing
+import operator
+import os
+import random
+import re
+import sqlite3
+import struct
 import sys
-from datetime import datetime, timedelta
+import tempfile
+import zipfile
+import zlib
+from array import array
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from itertools import accumulate, compress
+import bisect
 import calendar
-from openpyxl import Workbook
+import codecs
+import csv
+from xml.sax.saxutils import escape
+from openpyxl import Workbook, load_workbook
 from openpyxl.styles import Font, PatternFill, Border, Side, Alignment
+from openpyxl.styles.borders import DEFAULT_BORDER
 from openpyxl.utils import get_column_letter
+from openpyxl.utils.exceptions import InvalidFileException
 from PyQt6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout,
                              QHBoxLayout, QPushButton, QLabel, QComboBox,
-                             QTableWidget, QTableWidgetItem, QMessageBox,
-                             QFileDialog, QHeaderView, QFrame, QScrollArea)
-from PyQt6.QtCore import Qt
-from PyQt6.QtGui import QFont
+                             QTableWidget, QTableWidgetItem, QMessageBox, QInputDialog,
+                             QFileDialog, QHeaderView, QFrame, QScrollArea, QCheckBox,
+                             QAbstractScrollArea, QToolTip)
+from PyQt6.QtCore import Qt, QEvent, QBuffer, QByteArray, QIODevice, QObject, QRect, QTimer
+from PyQt6.QtGui import (QColor, QFont, QGuiApplication, QImage, QKeySequence, QPainter, QPixmap, QRegion,
+                         QShortcut)
+
+
+# Версия шаблона книги: увеличить при изменении оформления
+TEMPLATE_VERSION = 1
+TEMPLATE_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.plan_app', 'templates')
+
+# Журнал замеров запуска (--startup-log или PLAN_APP_STARTUP_LOG=1)
+STARTUP_LOG_PATH = os.path.join(os.path.expanduser('~'), '.plan_app', 'startup.log')
+
+# Нерабочие праздничные дни по ст. 112 ТК РФ: (месяц, день)
+STATUTORY_HOLIDAYS = [
+    (1, 1), (1, 2), (1, 3), (1, 4), (1, 5), (1, 6), (1, 7), (1, 8),
+    (2, 23), (3, 8), (5, 1), (5, 9), (6, 12), (11, 4),
+]
+# Версия правил расчета праздников (HolidayCalendar.compute_holidays): входит в хэш календаря
+HOLIDAY_RULES_VERSION = 2
+
+# Официальные списки праздников на годы вне встроенных (рядом с программой или в профиле)
+APP_DIR = os.path.dirname(os.path.abspath(sys.executable if getattr(sys, 'frozen', False) else __file__))
+HOLIDAY_OVERRIDE_FILES = [
+    os.path.join(APP_DIR, 'holidays.json'),
+    os.path.join(os.path.expanduser('~'), '.plan_app', 'holidays.json'),
+]
+
+# Двоичный календарь рабочих дней: собирается только python main.py --build-calendar [путь],
+# окно открывает его, если он есть
+CALENDAR_STORE_PATH = os.path.join(os.path.expanduser('~'), '.plan_app', 'calendar.bin')
+CALENDAR_STORE_MAGIC = b'PLANCAL\0'
+CALENDAR_STORE_VERSION = 1
+CALENDAR_STORE_YEARS = (2000, 2100)
+# magic, версия, эпоха (порядковый номер дня), дней, рабочих дней, хэш исходных данных
+CALENDAR_STORE_HEADER = struct.Struct('<8sIIII32s')
+DAY_HOLIDAY = 1
+DAY_WORKING = 2
+
+# Снимок сессии: таблица, настройки и последний график, восстанавливаются при запуске
+SESSION_PATH = os.path.join(os.path.expanduser('~'), '.plan_app', 'session.bin')
+SESSION_MAGIC = b'PLANSES\0'
+SESSION_VERSION = 1
+# magic, версия; далее JSON, сжатый zlib
+SESSION_HEADER = struct.Struct('<8sI')
+# Пауза после правки до записи снимка, мс
+SESSION_SAVE_DELAY = 1000
+# Шагов отмены правок таблицы
+PLAN_HISTORY_LIMIT = 10000
+
+# Каталог планов: python main.py --catalog-add книга.xlsx ... / --catalog-find "ГИА:2.2"
+CATALOG_PATH = os.path.join(os.path.expanduser('~'), '.plan_app', 'catalog.sqlite3')
+CATALOG_VERSION = 1
+# Сколько id передавать в одном IN (...): ограничение числа параметров SQLite
+CATALOG_BATCH = 500
+CATALOG_SCHEMA = """
+CREATE TABLE IF NOT EXISTS plans (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    program_type TEXT NOT NULL,
+    start_year INTEGER NOT NULL,
+    work_week INTEGER NOT NULL,
+    content_hash TEXT NOT NULL,
+    saved_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS plans_program_year ON plans (program_type, start_year);
+CREATE INDEX IF NOT EXISTS plans_start_year ON plans (start_year);
+CREATE INDEX IF NOT EXISTS plans_content_hash ON plans (content_hash);
+
+-- Строки шаблона; даты заполнены, если план сохранен вместе с графиком
+CREATE TABLE IF NOT EXISTS periods (
+    plan_id INTEGER NOT NULL REFERENCES plans (id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    year INTEGER NOT NULL,
+    semester INTEGER NOT NULL,
+    type TEXT NOT NULL,
+    weeks REAL NOT NULL,
+    start_date TEXT,
+    end_date TEXT,
+    days INTEGER,
+    PRIMARY KEY (plan_id, position)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS periods_activity ON periods (type, year, semester, plan_id);
+
+CREATE TABLE IF NOT EXISTS schedules (
+    plan_id INTEGER PRIMARY KEY REFERENCES plans (id) ON DELETE CASCADE,
+    calendar_hash TEXT NOT NULL,
+    data BLOB NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS exports (
+    id INTEGER PRIMARY KEY,
+    plan_id INTEGER NOT NULL REFERENCES plans (id) ON DELETE CASCADE,
+    filename TEXT NOT NULL,
+    format TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    exported_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS exports_plan ON exports (plan_id);
+"""
+
+# Маски рабочей недели: бит i — день недели i (0 — понедельник)
+WORK_WEEK_5 = 0b0011111
+WORK_WEEK_6 = 0b0111111
+WORK_WEEKS = {
+    '5 дней (пн–пт)': WORK_WEEK_5,
+    '6 дней (пн–сб)': WORK_WEEK_6,
+}
+# Рабочая неделя по умолчанию для программ, маски отдельных видов деятельности
+PROGRAM_WORK_WEEKS = {
+    'Ординатура (2 года)': WORK_WEEK_5,
+    'Аспирантура (3 года)': WORK_WEEK_5,
+}
+ACTIVITY_WORK_WEEKS = {}
+
+# Периоды, которые оптимизатор размещения может переставлять внутри семестра
+MOVABLE_ACTIVITY_TYPES = ('П', 'У')
+# С первой такой строки хвост семестра неподвижен: практика не переносится за аттестацию и каникулы
+PLACEMENT_FIXED_TYPES = ('ПА', 'ГИА', 'Г', 'Д', 'К')
+
+# Порядок видов деятельности внутри семестра, который подбор плана пробует первым
+PLAN_ACTIVITY_ORDER = ['Т', 'Э', 'У', 'П', 'ПА', 'ГИА', 'Г', 'Д', 'К']
+
+ACTIVITY_TYPES = ['Т', 'Э', 'П', 'У', 'ПА', 'ГИА', 'Г', 'Д', 'К']
+# Названия видов деятельности в легенде и текстовых выгрузках
+ACTIVITY_NAMES = {
+    'Т': 'Теоретическое обучение',
+    'Э': 'Экзаменационная сессия',
+    'П': 'Практика (производственная, преддипломная)',
+    'У': 'Учебная практика',
+    'ПА': 'Промежуточная аттестация',
+    'ГИА': 'Государственная итоговая аттестация',
+    'Г': 'Подготовка к сдаче и сдача гос. экзамена',
+    'Д': 'Подготовка и защита выпускной квалификационной работы',
+    'К': 'Каникулы',
+}
+# Столбцы таблицы периодов и значения выпадающих списков в них
+TABLE_COLUMNS = ['Год', 'Семестр', 'Тип', 'Недели']
+TABLE_CHOICES = {'Год': ['1', '2', '3'], 'Семестр': ['1', '2'], 'Тип': ACTIVITY_TYPES}
+DAYS_OF_WEEK = ['Пн', 'Вт', 'Ср', 'Чт', 'Пт', 'Сб', 'Вс']
+
+# Ключи стилей календаря: (шрифт, заливка, граница, выравнивание)
+CALENDAR_HEADER_KEY = ('header', 'header', 'thin', 'center')
+CALENDAR_TITLE_KEY = ('title', 'legend_header', 'thick', 'center')
+CALENDAR_YEAR_KEY = ('year_title', 'year_header', 'thick', 'center')
+
+# Заголовки листа календаря объединяются до колонки BB
+CALENDAR_LAST_COL = 54
+# Первая строка ячеек-носителей стилей в шаблоне потоковой записи
+STYLE_CARRIER_ROW = 2
+# Лист календаря в шаблоне идет вторым
+CALENDAR_SHEET_PATH = 'xl/worksheets/sheet2.xml'
+# Пустой последний блок deflate: завершает склеенные сжатые фрагменты записи zip
+ZIP_DEFLATE_END = b'\x03\x00'
+# write_zip_entries пишет zip без расширения zip64: размеры и смещения меньше этой границы
+ZIP_ENTRIES_LIMIT = zipfile.ZIP64_LIMIT
+
+# Сторона ячейки дня на картинке календаря, пикселей
+CALENDAR_IMAGE_CELL = 12
+
+# Календарь в окне: сторона ячейки, ширина подписей, высота шапки, отступ между графиками
+CALENDAR_VIEW_CELL = 18
+CALENDAR_VIEW_LABEL_WIDTH = 110
+CALENDAR_VIEW_HEADER = 22
+CALENDAR_VIEW_GAP = 10
+
+# Колонка D: начало блока курсов на листе итогов
+SUMMARY_COL_OFFSET = 4
+
+# Книга по группам: лист со списком групп
+GROUPS_SHEET_TITLE = 'Группы'
+GROUPS_SHEET_PATH = 'xl/worksheets/groups.xml'
+OCCUPANCY_SHEET_TITLE = 'Загрузка'
+OCCUPANCY_SHEET_PATH = 'xl/worksheets/occupancy.xml'
+# Сколько групп вперед строят процессы-исполнители при выгрузке книги по группам
+GROUP_EXPORT_LOOKAHEAD = 8
+
+# Список типов деятельности в правильном порядке
+SUMMARY_ACTIVITY_TYPES = [
+    ('', 'Теоретическое обучение', 'Т'),
+    ('Э', 'Экзаменационные сессии', 'Э'),
+    ('У', 'Учебная практика', 'У'),
+    ('Н', 'Научно-исслед. работа', 'Н'),
+    ('П', 'Производственная практика', 'П'),
+    ('Пд', 'Преддипломная практика', 'Пд'),
+    ('ПА', 'Повторная, вторая повторная промежуточная аттестация', 'ПА'),
+    ('Д', 'Подготовка к процедуре защиты и защита выпускной квалификационной работы', 'Д'),
+    ('Г', 'Подготовка к сдаче и сдача гос. экзамена', 'Г'),
+    ('К', 'Каникулы', 'К'),
+    ('*', 'Нерабочие праздничные дни (не включая воскресенья)', '*'),
+]
+
+
+def format_weeks(weeks):
+    """Недели в виде '5 2/6'"""
+    if weeks < 0.01:
+        return ''
+    whole = int(weeks)
+    fraction = weeks - whole
+    if fraction < 0.01:
+        return str(whole) if whole > 0 else ''
+    sixths = round(fraction * 6)
+    if sixths == 0:
+        return str(whole) if whole > 0 else ''
+    elif sixths == 6:
+        return str(whole + 1)
+    else:
+        return f'{whole} {sixths}/6' if whole > 0 else f'{sixths}/6'
+
+
+def schedule_runs(generated_schedule):
+    """Отрезки подряд идущих дней периодов: (первый день, последний день, тип) в номерах дней"""
+    runs = []
+    for period in generated_schedule:
+        days = period['days']
+        if not days:
+            continue
+
+        first = previous = days[0].toordinal()
+        for day in days[1:]:
+            ordinal = day.toordinal()
+            if ordinal != previous + 1:
+                runs.append((first, previous, period['type']))
+                first = ordinal
+            previous = ordinal
+        runs.append((first, previous, period['type']))
+    return runs
+
+
+def ics_escape(text):
+    """Экранирование текстового значения iCalendar (RFC 5545, 3.3.11)"""
+    return text.replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,').replace('\n', '\\n')
+
+
+def ics_line(line):
+    """Строка iCalendar с переносом по 75 байт и CRLF"""
+    data = line.encode('utf-8')
+    if len(data) <= 75:
+        return line + '\r\n'
+
+    parts = []
+    start = 0
+    limit = 75
+    while start < len(data):
+        end = min(start + limit, len(data))
+        # Не разрывать многобайтовый символ UTF-8
+        while end < len(data) and data[end] & 0xC0 == 0x80:
+            end -= 1
+        parts.append(data[start:end].decode('utf-8'))
+        start = end
+        limit = 74
+    return '\r\n '.join(parts) + '\r\n'
+
+
+def deflate_segment(data):
+    """Сжатый фрагмент записи zip (raw deflate до полного сброса): фрагменты склеиваются побайтно"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, -15)
+    return compressor.compress(data) + compressor.flush(zlib.Z_FULL_FLUSH)
+
+
+def write_zip_entries(file, entries, date_time):
+    """Записать zip из готовых сжатых записей [(имя, crc32, сжатые данные, размер)]"""
+    dos_time = (date_time.hour << 11) | (date_time.minute << 5) | (date_time.second // 2)
+    dos_date = ((date_time.year - 1980) << 9) | (date_time.month << 5) | date_time.day
+
+    offset = 0
+    directory = []
+    for name, crc, compressed, size in entries:
+        encoded = name.encode('utf-8')
+        header = struct.pack('<IHHHHHIIIHH', 0x04034b50, 20, 0, zipfile.ZIP_DEFLATED, dos_time, dos_date,
+                             crc, len(compressed), size, len(encoded), 0)
+        file.write(header + encoded)
+        file.write(compressed)
+
+        directory.append(struct.pack('<IHHHHHHIIIHHHHHII', 0x02014b50, 20, 20, 0, zipfile.ZIP_DEFLATED,
+                                     dos_time, dos_date, crc, len(compressed), size, len(encoded),
+                                     0, 0, 0, 0, 0, offset) + encoded)
+        offset += len(header) + len(encoded) + len(compressed)
+
+    directory = b''.join(directory)
+    file.write(directory)
+    file.write(struct.pack('<IHHHHIIH', 0x06054b50, 0, 0, len(entries), len(entries), len(directory), offset, 0))
+
+
+def encode_schedule(generated_schedule):
+    """График в списки для JSON: дни хранятся как шаги между порядковыми номерами дат"""
+    encoded = []
+    for period in generated_schedule:
+        ordinals = [day.toordinal() for day in period['days']]
+        start = period['start_date'].toordinal()
+        steps = [b - a for a, b in zip([start] + ordinals, ordinals)]
+        encoded.append([period['year'], period['semester'], period['type'], period['weeks'],
+                        start, period['end_date'].toordinal(), steps])
+    return encoded
+
+
+def decode_schedule(encoded):
+    """График из списков encode_schedule"""
+    generated_schedule = []
+    for year, semester, activity_type, weeks, start, end, steps in encoded:
+        days = [datetime.fromordinal(ordinal) for ordinal in accumulate(steps, initial=start)]
+        generated_schedule.append({'year': year, 'semester': semester, 'type': activity_type, 'weeks': weeks,
+                                   'start_date': days[0], 'end_date': datetime.fromordinal(end),
+                                   'days': days[1:]})
+    return generated_schedule
+
+
+def encode_session(state):
+    """Снимок сессии в байты"""
+    schedule = None
+    if state['schedule'] is not None:
+        schedule = encode_schedule(state['schedule'])
+
+    payload = {'program_type': state['program_type'], 'start_year': state['start_year'],
+               'work_week': state['work_week'], 'rows': state['rows'],
+               'calendar_hash': state['calendar_hash'], 'schedule': schedule}
+    data = json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    return SESSION_HEADER.pack(SESSION_MAGIC, SESSION_VERSION) + zlib.compress(data, 9)
+
+
+def decode_session(data):
+    """Снимок сессии из байтов; ValueError, если файл чужой, другой версии или поврежден"""
+    try:
+        magic, version = SESSION_HEADER.unpack_from(data, 0)
+        if magic != SESSION_MAGIC or version != SESSION_VERSION:
+            raise ValueError('Неподдерживаемый снимок сессии')
+        state = json.loads(zlib.decompress(data[SESSION_HEADER.size:]).decode('utf-8'))
+        state = {key: state[key] for key in ('program_type', 'start_year', 'work_week', 'rows', 'calendar_hash',
+                                             'schedule')}
+
+        if state['schedule'] is not None:
+            state['schedule'] = decode_schedule(state['schedule'])
+    except (struct.error, zlib.error, UnicodeDecodeError, KeyError, TypeError) as e:
+        raise ValueError(f'Поврежденный снимок сессии: {e}')
+    return state
+
+
+def save_session_file(path, state):
+    """Записать снимок сессии через временный файл (вызывается в фоновом потоке)"""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(encode_session(state))
+    os.replace(tmp_path, path)
+
+
+def plan_content_hash(program_type, start_year, work_week, periods_data):
+    """Хэш содержимого плана: одинаков для одинаковых таблиц и настроек"""
+    rows = [[int(row['Год']), int(row['Семестр']), row['Тип'], float(row['Недели'])] for row in periods_data]
+    source = json.dumps([program_type, start_year, work_week, rows], ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha256(source.encode('utf-8')).hexdigest()
+
+
+def parse_catalog_query(text):
+    """Условия поиска в каталоге из строки «Аспирантура 2026 ГИА:2.2 hash:3fa9».
+
+    Год из четырех цифр — год начала, тип занятия с необязательным «:курс.семестр»
+    (ГИА, ГИА:2, ГИА:.2, ГИА:2.2), начало названия программы, hash: — начало хэша.
+    Возвращает аргументы PlanCatalog.find_plans; ValueError, если условие непонятно.
+    """
+    filters = {}
+    for token in text.split():
+        code, _, place = token.partition(':')
+        if re.fullmatch(r'\d{4}', token):
+            filters['start_year'] = int(token)
+        elif code.lower() == 'hash' and re.fullmatch(r'[0-9a-fA-F]+', place):
+            filters['content_hash'] = place.lower()
+        elif code in ACTIVITY_TYPES:
+            match = re.fullmatch(r'(\d)?(?:\.(\d))?', place)
+            if match is None:
+                raise ValueError(f'Неверные курс и семестр: {token}')
+            year, semester = (int(value) if value else None for value in match.groups())
+            filters['activity'] = (code, year, semester)
+        else:
+            programs = [name for name in PROGRAM_WORK_WEEKS if name.lower().startswith(token.lower())]
+            if len(programs) != 1:
+                raise ValueError(f'Непонятное условие: {token}')
+            filters['program_type'] = programs[0]
+    return filters
 
 
-class EducationalScheduleApp:
+class PlanCatalog:
+    """Каталог планов в SQLite: таблицы периодов, графики и выгрузки с поиском без открытия xlsx.
+
+    План — словарь {'name', 'program_type', 'start_year', 'work_week', 'periods_data',
+    'schedule' (или None), 'calendar_hash'}. Одинаковое содержимое (plan_content_hash)
+    хранится один раз: повторное сохранение обновляет название и график.
+    """
+
+    def __init__(self, path=CATALOG_PATH):
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.connection = sqlite3.connect(path)
+        try:
+            self.connection.execute('PRAGMA foreign_keys = ON')
+            version = self.connection.execute('PRAGMA user_version').fetchone()[0]
+            if version > CATALOG_VERSION:
+                raise ValueError(f'Каталог создан более новой версией программы: {path}')
+            if version < CATALOG_VERSION:
+                self.connection.executescript(CATALOG_SCHEMA)
+                self.connection.execute(f'PRAGMA user_version = {CATALOG_VERSION}')
+        except sqlite3.DatabaseError as e:
+            self.connection.close()
+            raise ValueError(f'Неподдерживаемый файл каталога: {path} ({e})')
+        except ValueError:
+            self.connection.close()
+            raise
+
+    def close(self):
+        self.connection.close()
+
+    def save_plans(self, plans):
+        """Сохранить планы одной транзакцией; id в порядке plans"""
+        saved_at = datetime.now().isoformat(timespec='seconds')
+        plan_ids = []
+        # id плана -> строки; одинаковые планы в одном пакете записываются один раз
+        period_rows = {}
+        schedule_rows = {}
+
+        with self.connection:
+            for plan in plans:
+                content_hash = plan_content_hash(plan['program_type'], plan['start_year'], plan['work_week'],
+                                                 plan['periods_data'])
+                schedule = plan.get('schedule')
+                row = self.connection.execute('SELECT id FROM plans WHERE content_hash = ?',
+                                              (content_hash,)).fetchone()
+                if row is None:
+                    plan_id = self.connection.execute(
+                        'INSERT INTO plans (name, program_type, start_year, work_week, content_hash, saved_at) '
+                        'VALUES (?, ?, ?, ?, ?, ?)',
+                        (plan['name'], plan['program_type'], plan['start_year'], plan['work_week'],
+                         content_hash, saved_at)).lastrowid
+                else:
+                    plan_id = row[0]
+                    self.connection.execute('UPDATE plans SET name = ?, saved_at = ? WHERE id = ?',
+                                            (plan['name'], saved_at, plan_id))
+                    if schedule is None:
+                        # Таблица та же; даты периодов остаются от сохраненного ранее графика
+                        plan_ids.append(plan_id)
+                        continue
+                    self.connection.execute('DELETE FROM periods WHERE plan_id = ?', (plan_id,))
+                plan_ids.append(plan_id)
+
+                rows = period_rows[plan_id] = []
+                for position, row in enumerate(plan['periods_data']):
+                    dates = (None, None, None)
+                    if schedule is not None:
+                        period = schedule[position]
+                        dates = (period['start_date'].strftime('%Y-%m-%d'),
+                                 period['end_date'].strftime('%Y-%m-%d'), len(period['days']))
+                    rows.append((plan_id, position, int(row['Год']), int(row['Семестр']), row['Тип'],
+                                 float(row['Недели'])) + dates)
+                if schedule is not None:
+                    data = json.dumps(encode_schedule(schedule), separators=(',', ':')).encode('utf-8')
+                    schedule_rows[plan_id] = (plan_id, plan['calendar_hash'], zlib.compress(data, 9))
+
+            self.connection.executemany('INSERT INTO periods VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                                        (row for rows in period_rows.values() for row in rows))
+            self.connection.executemany('INSERT OR REPLACE INTO schedules VALUES (?, ?, ?)', schedule_rows.values())
+        return plan_ids
+
+    def load_plans(self, plan_ids):
+        """Планы по id в том же порядке (несуществующие пропускаются), с 'id', 'content_hash' и 'saved_at'"""
+        plan_ids = list(plan_ids)
+        plans = {}
+        for offset in range(0, len(plan_ids), CATALOG_BATCH):
+            batch = plan_ids[offset:offset + CATALOG_BATCH]
+            marks = ', '.join('?' * len(batch))
+            for plan_id, name, program_type, start_year, work_week, content_hash, saved_at in self.connection.execute(
+                    f'SELECT id, name, program_type, start_year, work_week, content_hash, saved_at '
+                    f'FROM plans WHERE id IN ({marks})', batch):
+                plans[plan_id] = {'id': plan_id, 'name': name, 'program_type': program_type,
+                                  'start_year': start_year, 'work_week': work_week, 'content_hash': content_hash,
+                                  'saved_at': saved_at, 'periods_data': [], 'schedule': None, 'calendar_hash': None}
+            for plan_id, year, semester, activity_type, weeks in self.connection.execute(
+                    f'SELECT plan_id, year, semester, type, weeks FROM periods '
+                    f'WHERE plan_id IN ({marks}) ORDER BY plan_id, position', batch):
+                plans[plan_id]['periods_data'].append({'Год': year, 'Семестр': semester, 'Тип': activity_type,
+                                                       'Недели': weeks})
+            for plan_id, calendar_hash, data in self.connection.execute(
+                    f'SELECT plan_id, calendar_hash, data FROM schedules WHERE plan_id IN ({marks})', batch):
+                plans[plan_id]['schedule'] = decode_schedule(json.loads(zlib.decompress(data)))
+                plans[plan_id]['calendar_hash'] = calendar_hash
+        return [plans[plan_id] for plan_id in plan_ids if plan_id in plans]
+
+    def find_plans(self, program_type=None, start_year=None, content_hash=None, activity=None):
+        """Планы по условиям: activity = (тип, курс или None, семестр или None); hash — начало хэша"""
+        conditions = []
+        params = []
+        if program_type is not None:
+            conditions.append('program_type = ?')
+            params.append(program_type)
+        if start_year is not None:
+            conditions.append('start_year = ?')
+            params.append(start_year)
+        if content_hash is not None:
+            # Диапазон вместо LIKE: поиск по индексу хэша
+            conditions.append('content_hash >= ? AND content_hash < ?')
+            params += [content_hash, content_hash + 'g']
+        if activity is not None:
+            activity_type, year, semester = activity
+            period_conditions = ['type = ?']
+            params.append(activity_type)
+            if year is not None:
+                period_conditions.append('year = ?')
+                params.append(year)
+            if semester is not None:
+                period_conditions.append('semester = ?')
+                params.append(semester)
+            conditions.append(f'id IN (SELECT plan_id FROM periods WHERE {" AND ".join(period_conditions)})')
+
+        where = f'WHERE {" AND ".join(conditions)} ' if conditions else ''
+        rows = self.connection.execute(
+            f'SELECT id, name, program_type, start_year, content_hash, saved_at FROM plans {where}'
+            f'ORDER BY program_type, start_year, id', params)
+        return [{'id': plan_id, 'name': name, 'program_type': program_type, 'start_year': start_year,
+                 'content_hash': content_hash, 'saved_at': saved_at}
+                for plan_id, name, program_type, start_year, content_hash, saved_at in rows]
+
+    def record_export(self, plan_id, filename, fmt, size):
+        with self.connection:
+            self.connection.execute(
+                'INSERT INTO exports (plan_id, filename, format, size, exported_at) VALUES (?, ?, ?, ?, ?)',
+                (plan_id, filename, fmt, size, datetime.now().isoformat(timespec='seconds')))
+
+    def exports(self, plan_id):
+        """Выгрузки плана: [(файл, формат, размер, время)], последние первыми"""
+        return self.connection.execute(
+            'SELECT filename, format, size, exported_at FROM exports WHERE plan_id = ? ORDER BY id DESC',
+            (plan_id,)).fetchall()
+
+
+class ScheduleSummary:
+    """Сводная статистика по сгенерированному графику"""
+
     def __init__(self):
+        # (курс, семестр) -> {тип: {'weeks': ..., 'days': ...}}
+        self.stats = {}
+        # (курс, семестр) -> количество праздничных дней
+        self.holidays_count = {}
+        # (курс, семестр) -> всего недель / рабочих дней
+        self.semester_weeks = {}
+        self.semester_days = {}
+
+        self.period_count = 0
+        self.total_weeks = 0
+        self.total_days = 0
+
+    def activity(self, year, semester, code):
+        """Недели и дни по типу занятий за семестр"""
+        item = self.stats.get((year, semester), {}).get(code)
+        if item is None:
+            return 0, 0
+        return item['weeks'], item['days']
+
+    def holidays(self, year, semester):
+        return self.holidays_count.get((year, semester), 0)
+
+    @classmethod
+    def combined(cls, summaries):
+        """Итоги нескольких графиков: недели, дни и праздники складываются по курсам и семестрам"""
+        total = cls()
+        for summary in summaries:
+            for key, items in summary.stats.items():
+                stats = total.stats.setdefault(key, {})
+                for code, item in items.items():
+                    entry = stats.setdefault(code, {'weeks': 0, 'days': 0})
+                    entry['weeks'] += item['weeks']
+                    entry['days'] += item['days']
+            for counts, total_counts in ((summary.holidays_count, total.holidays_count),
+                                         (summary.semester_weeks, total.semester_weeks),
+                                         (summary.semester_days, total.semester_days)):
+                for key, value in counts.items():
+                    total_counts[key] = total_counts.get(key, 0) + value
+            total.period_count += summary.period_count
+            total.total_weeks += summary.total_weeks
+            total.total_days += summary.total_days
+        return total
+
+    def fingerprint(self):
+        """Хэш значений итогов: одинаков для графиков с одинаковыми итогами"""
+        stats = sorted((key, sorted((code, item['weeks'], item['days']) for code, item in items.items()))
+                       for key, items in self.stats.items())
+        values = [stats, sorted(self.holidays_count.items()), sorted(self.semester_weeks.items()),
+                  sorted(self.semester_days.items())]
+        return hashlib.sha256(repr(values).encode('utf-8')).hexdigest()
+
+
+class ScheduleDiff:
+    """Различия двух версий графика"""
+
+    def __init__(self):
+        self.added = []    # периоды только в новой версии
+        self.removed = []  # периоды только в старой версии
+        self.shifted = []  # (старый, новый): тот же период с другими датами
+        # (первый день, последний день, было, стало, рабочих дней) — отрезки со сменой занятия
+        self.changed_ranges = []
+        self.changed_days = 0
+
+    def is_empty(self):
+        return not (self.added or self.removed or self.shifted or self.changed_ranges)
+
+    def describe(self, limit=10):
+        """Строки для показа в окне"""
+        def span(period):
+            return (f"{period['start_date']:%d.%m.%Y}–{period['end_date']:%d.%m.%Y} "
+                    f"({len(period['days'])} дн)")
+
+        def label(period):
+            return f"{period['year']} курс, {period['semester']} сем., {period['type']}"
+
+        lines = [f'➕ {label(period)}: {span(period)}' for period in self.added]
+        lines += [f'➖ {label(period)}: {span(period)}' for period in self.removed]
+        lines += [f'↔️ {label(new)}: {span(old)} → {span(new)}' for old, new in self.shifted]
+        if len(lines) > limit:
+            lines = lines[:limit] + [f'… и еще {len(lines) - limit}']
+
+        lines.append(f'📅 Дней со сменой занятия: {self.changed_days} '
+                     f'(отрезков: {len(self.changed_ranges)})')
+        return lines
+
+
+class PlanHistory:
+    """История правок плана для отмены и повтора.
+
+    Снимок — кортеж (программа, год начала, маска недели, строки), строки — кортежи.
+    Неизмененные строки берутся из предыдущего снимка, поэтому шаг стоит
+    один кортеж ссылок, а не копию таблицы.
+    """
+
+    def __init__(self, current, limit=PLAN_HISTORY_LIMIT):
+        self.current = current
+        self.undo_stack = deque(maxlen=limit)
+        self.redo_stack = []
+
+    def record(self, snapshot):
+        """Запомнить новое состояние; False, если ничего не изменилось"""
+        if snapshot == self.current:
+            return False
+        known = {row: row for row in self.current[3]}
+        rows = tuple(known.get(row, row) for row in snapshot[3])
+        self.undo_stack.append(self.current)
+        self.redo_stack.clear()
+        self.current = snapshot[:3] + (rows,)
+        return True
+
+    def undo(self):
+        """Предыдущий снимок или None"""
+        if not self.undo_stack:
+            return None
+        self.redo_stack.append(self.current)
+        self.current = self.undo_stack.pop()
+        return self.current
+
+    def redo(self):
+        """Отмененный снимок или None"""
+        if not self.redo_stack:
+            return None
+        self.undo_stack.append(self.current)
+        self.current = self.redo_stack.pop()
+        return self.current
+
+
+class OccupancyIndex:
+    """Численность студентов по дням для многих графиков.
+
+    Периоды раскладываются на отрезки подряд идущих дней и заносятся в
+    разностные массивы по номерам дней; для каждого типа занятий хранятся
+    численность на каждый день и ее префиксные суммы, поэтому день, неделя
+    и любой интервал считаются за O(1).
+    """
+
+    def __init__(self, schedules):
+        # schedules: пары (график, численность)
+        runs = []  # (тип, первый день, последний день, численность)
+        for generated_schedule, students in schedules:
+            for first, last, activity_type in schedule_runs(generated_schedule):
+                runs.append((activity_type, first, last, students))
+
+        self.epoch = min((run[1] for run in runs), default=0)
+        self.day_count = max((run[2] for run in runs), default=self.epoch - 1) - self.epoch + 1
+
+        diffs = {}
+        for activity_type, first, last, students in runs:
+            if activity_type not in diffs:
+                diffs[activity_type] = [0] * (self.day_count + 1)
+            diff = diffs[activity_type]
+            diff[first - self.epoch] += students
+            diff[last - self.epoch + 1] -= students
+
+        # тип -> численность по дням от epoch и префиксные суммы численности
+        self.daily = {}
+        self.cumulative = {}
+        for activity_type, diff in diffs.items():
+            self.daily[activity_type] = array('q', accumulate(diff[:-1]))
+            self.cumulative[activity_type] = array('q', accumulate(self.daily[activity_type], initial=0))
+
+    @classmethod
+    def from_groups(cls, groups):
+        """По группам {'schedule', 'students'}; без численности группа считается за одну"""
+        return cls((group['schedule'], group.get('students') or 1) for group in groups)
+
+    def activity_types(self):
+        return [code for code in ACTIVITY_TYPES if code in self.daily]
+
+    def dates(self):
+        return [datetime.fromordinal(self.epoch + index) for index in range(self.day_count)]
+
+    def on_day(self, activity_type, date):
+        """Сколько студентов занято activity_type в этот день"""
+        daily = self.daily.get(activity_type)
+        index = date.toordinal() - self.epoch
+        if daily is None or not 0 <= index < self.day_count:
+            return 0
+        return daily[index]
+
+    def student_days(self, activity_type, start_date, end_date):
+        """Сумма численности по дням интервала [start_date, end_date]"""
+        cumulative = self.cumulative.get(activity_type)
+        if cumulative is None:
+            return 0
+
+        first = min(max(start_date.toordinal() - self.epoch, 0), self.day_count)
+        last = min(max(end_date.toordinal() - self.epoch + 1, 0), self.day_count)
+        if last <= first:
+            return 0
+        return cumulative[last] - cumulative[first]
+
+    def weekly(self, activity_type, start_date, end_date):
+        """Студенто-дни по неделям интервала: [(понедельник, сумма)]"""
+        monday = start_date - timedelta(days=start_date.weekday())
+        weeks = []
+        while monday <= end_date:
+            sunday = monday + timedelta(days=6)
+            weeks.append((monday, self.student_days(activity_type, max(monday, start_date),
+                                                    min(sunday, end_date))))
+            monday += timedelta(days=7)
+        return weeks
+
+
+class PlacementOptimizer:
+    """Перестановка подвижных периодов (практик) внутри семестров под вместимость баз.
+
+    Наборы — словари {'start_year', 'periods', 'students', 'work_week'}, periods в формате
+    таблицы периодов. Ход переносит подвижный период на другое место в своем семестре
+    до неподвижного хвоста (PLACEMENT_FIXED_TYPES): суммы недель сохраняются, рабочие
+    дни семестра те же, поэтому превышение вместимости пересчитывается только по дням
+    этого семестра. Дни периодов берутся из таблиц рабочих дней (WorkingDayIndex).
+    """
+
+    def __init__(self, app, cohorts, capacities, movable=MOVABLE_ACTIVITY_TYPES, seed=0):
+        self.app = app
+        self.capacities = dict(capacities)
+        self.movable = set(movable)
+        self.random = random.Random(seed)
+
+        self.cohorts = []
+        # [номер набора, первая строка, порядок строк, день начала, день после блока, занятость];
+        # дни — порядковые номера дат
+        self.blocks = []
+        self.candidates = []
+        occupied = []
+
+        for cohort_idx, cohort in enumerate(cohorts):
+            work_week = cohort.get('work_week', WORK_WEEK_5)
+            plan = app.prepare_periods(cohort['periods'], work_week)
+            generated_schedule = app.schedule_periods(plan, cohort['start_year'])
+            students = cohort.get('students') or 1
+            self.cohorts.append((list(cohort['periods']), plan, students))
+
+            # Блок — подряд идущие строки одного семестра до первой строки PLACEMENT_FIXED_TYPES;
+            # остаток семестра — неподвижный блок, его строки не переставляются
+            first = 0
+            while first < len(plan):
+                end = first
+                while end < len(plan) and plan[end][:2] == plan[first][:2]:
+                    end += 1
+                tail = next((row for row in range(first, end) if plan[row][2] in PLACEMENT_FIXED_TYPES), end)
+
+                for rows, movable in ((range(first, tail), True), (range(tail, end), False)):
+                    if not rows:
+                        continue
+                    order = list(rows)
+                    start_day = generated_schedule[rows[0]]['start_date'].toordinal()
+                    usage, next_day = self.block_usage(cohort_idx, order, start_day)
+                    block = [cohort_idx, rows[0], order, start_day, next_day, usage]
+                    self.blocks.append(block)
+                    if movable and len(order) > 1 and any(plan[row][2] in self.movable for row in order):
+                        self.candidates.append(block)
+                    occupied.extend(usage)
+                first = end
+
+        # Диапазон дней всех семестров: после перестановок практика может занять любой из них
+        self.epoch = min((block[3] for block in self.blocks), default=0)
+        day_count = max((block[4] for block in self.blocks), default=self.epoch) - self.epoch
+
+        # тип с ограничением -> численность по дням от epoch
+        self.occupancy = {activity_type: [0] * day_count for activity_type in self.capacities}
+        for activity_type, ordinal, students in occupied:
+            self.occupancy[activity_type][ordinal - self.epoch] += students
+
+        self.overflow = sum(max(0, count - self.capacities[activity_type])
+                            for activity_type, counts in self.occupancy.items() for count in counts)
+
+    def block_usage(self, cohort_idx, order, start_day):
+        """Занятость ограниченных типов при данном порядке строк блока и день после блока"""
+        periods, plan, students = self.cohorts[cohort_idx]
+        usage = []
+        current_day = start_day
+        for row in order:
+            year, semester, activity_type, weeks, work_week = plan[row]
+            count = int(weeks * work_week.bit_count())
+            index = self.app.get_working_day_index(work_week)
+
+            # Номера рабочих дней по префиксной таблице, без построения дат; вне таблицы — по календарю
+            offset = current_day - index.epoch
+            first = index.prefix[offset] if 0 <= offset < index.day_count else None
+            if first is not None and first + count < len(index.working):
+                period_days = [index.epoch + day for day in index.working[first:first + count]]
+                current_day = index.epoch + index.working[first + count]
+            else:
+                dates, next_date = self.app.calculate_academic_weeks(datetime.fromordinal(current_day), weeks,
+                                                                     work_week)
+                period_days = [date.toordinal() for date in dates]
+                current_day = next_date.toordinal()
+
+            if activity_type in self.capacities:
+                usage.extend((activity_type, day, students) for day in period_days)
+        return usage, current_day
+
+    def overflow_delta(self, old_usage, new_usage):
+        """Изменение суммарного превышения при замене занятости блока"""
+        changes = {}
+        for activity_type, ordinal, students in old_usage:
+            changes[activity_type, ordinal] = changes.get((activity_type, ordinal), 0) - students
+        for activity_type, ordinal, students in new_usage:
+            changes[activity_type, ordinal] = changes.get((activity_type, ordinal), 0) + students
+
+        delta = 0
+        for (activity_type, ordinal), change in changes.items():
+            if change:
+                count = self.occupancy[activity_type][ordinal - self.epoch]
+                capacity = self.capacities[activity_type]
+                delta += max(0, count + change - capacity) - max(0, count - capacity)
+        return delta
+
+    def apply(self, block, new_order, new_usage):
+        for activity_type, ordinal, students in block[5]:
+            self.occupancy[activity_type][ordinal - self.epoch] -= students
+        for activity_type, ordinal, students in new_usage:
+            self.occupancy[activity_type][ordinal - self.epoch] += students
+        block[2] = new_order
+        block[5] = new_usage
+
+    def optimize(self, iterations=5000):
+        """Локальный поиск: принимаются ходы, не увеличивающие превышение"""
+        candidates = self.candidates
+
+        for _ in range(iterations):
+            if self.overflow == 0 or not candidates:
+                break
+
+            block = self.random.choice(candidates)
+            cohort_idx, first, order, start_day, next_day, usage = block
+            plan = self.cohorts[cohort_idx][1]
+
+            source = self.random.choice([pos for pos, row in enumerate(order) if plan[row][2] in self.movable])
+            target = self.random.randrange(len(order) - 1)
+            new_order = order[:source] + order[source + 1:]
+            new_order.insert(target if target < source else target + 1, order[source])
+
+            new_usage, after_day = self.block_usage(cohort_idx, new_order, start_day)
+            # Разные маски недели у типов могут сдвинуть конец семестра — такой ход не годится
+            if after_day != next_day:
+                continue
+
+            delta = self.overflow_delta(usage, new_usage)
+            if delta <= 0:
+                self.apply(block, new_order, new_usage)
+                self.overflow += delta
+
+        return self.overflow
+
+    def layouts(self):
+        """Таблицы периодов наборов в найденном порядке"""
+        orders = {}
+        for cohort_idx, first, order, start_day, next_day, usage in self.blocks:
+            orders.setdefault(cohort_idx, []).extend(order)
+        return [[periods[row] for row in orders.get(cohort_idx, [])]
+                for cohort_idx, (periods, plan, students) in enumerate(self.cohorts)]
+
+
+class HolidayCalendar:
+    """Производственный календарь РФ на любой год.
+
+    Для лет из официальных списков (встроенных или из файла) берутся они,
+    для остальных даты вычисляются по ст. 112 ТК РФ. Вычисленные годы
+    приблизительны: переносы постановлением правительства (рабочие субботы,
+    выбор мостов) предсказать нельзя. Результат по каждому году компилируется
+    в множество порядковых номеров дней и кэшируется.
+    """
+
+    def __init__(self, official=None):
+        # год -> список дат 'YYYY-MM-DD' из постановлений правительства
+        self.official = {}
+        for year, dates in (official or {}).items():
+            self.official[int(year)] = list(dates)
+
+        # год -> frozenset(datetime.toordinal())
+        self.compiled = {}
+
+    def load_overrides(self, path):
+        """Подгрузить официальные списки из JSON {"2029": ["2029-01-01", ...]}"""
+        try:
+            with open(path, encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return False
+
+        for year, dates in data.items():
+            self.official[int(year)] = list(dates)
+            self.compiled.pop(int(year), None)
+        return True
+
+    def compute_holidays(self, year):
+        """Нерабочие праздничные дни по правилам ТК РФ (приблизительно).
+
+        Праздники в выходной переносятся на следующий рабочий день. Два январских
+        праздника, пришедшихся на выходные, переносятся как обычно в постановлениях:
+        первый — на ближайший мост после январских праздников, второй — на 31 декабря,
+        если это будний день, иначе на следующий мост. Мост — будний день между
+        праздником и выходным. Если мостов не осталось, день не переносится.
+        """
+        statutory = [datetime(year, month, day) for month, day in STATUTORY_HOLIDAYS]
+        days_off = set(statutory)
+
+        def is_day_off(day):
+            return day.weekday() >= 5 or day in days_off
+
+        def next_bridge(after):
+            day = after + timedelta(days=1)
+            while day.year == year:
+                before, following = day - timedelta(days=1), day + timedelta(days=1)
+                if not is_day_off(day) and is_day_off(before) and is_day_off(following) \
+                        and (before in days_off or following in days_off):
+                    return day
+                day += timedelta(days=1)
+            return None
+
+        for day in statutory:
+            if day.month == 1 or day.weekday() < 5:
+                continue
+            transfer = day + timedelta(days=1)
+            while is_day_off(transfer):
+                transfer += timedelta(days=1)
+            days_off.add(transfer)
+
+        carried = [day for day in statutory if day.month == 1 and day.weekday() >= 5][:2]
+        last_bridge = datetime(year, 1, 8)
+        for number, day in enumerate(carried):
+            new_year_eve = datetime(year, 12, 31)
+            if number == 1 and not is_day_off(new_year_eve):
+                days_off.add(new_year_eve)
+                continue
+            last_bridge = next_bridge(last_bridge)
+            if last_bridge is None:
+                break
+            days_off.add(last_bridge)
+
+        return sorted(days_off)
+
+    def is_official(self, year):
+        """Праздники года взяты из постановления, а не вычислены"""
+        return year in self.official
+
+    def get_year(self, year):
+        """Скомпилированные праздники года: множество порядковых номеров дней"""
+        compiled = self.compiled.get(year)
+        if compiled is None:
+            if year in self.official:
+                days = [datetime.strptime(value, '%Y-%m-%d') for value in self.official[year]]
+            else:
+                days = self.compute_holidays(year)
+            compiled = frozenset(day.toordinal() for day in days)
+            self.compiled[year] = compiled
+        return compiled
+
+    def is_holiday(self, date):
+        return date.toordinal() in self.get_year(date.year)
+
+    def holidays_for_year(self, year):
+        return [datetime.fromordinal(ordinal) for ordinal in sorted(self.get_year(year))]
+
+    def source_hash(self):
+        """Хэш исходных данных: официальные списки и правила"""
+        source = json.dumps([sorted(self.official.items()), STATUTORY_HOLIDAYS, HOLIDAY_RULES_VERSION],
+                            ensure_ascii=False)
+        return hashlib.sha256(source.encode('utf-8')).digest()
+
+
+class WorkingDayIndex:
+    """Рабочие дни по маске недели: префиксные количества и номера рабочих дней от эпохи"""
+
+    def __init__(self, epoch, day_count, prefix, working):
+        self.epoch = epoch
+        self.day_count = day_count
+        self.prefix = prefix
+        self.working = working
+
+    @classmethod
+    def build(cls, epoch, day_flags, work_week):
+        """Таблицы для маски work_week по флагам праздников каждого дня"""
+        day_count = len(day_flags)
+        first_weekday = datetime.fromordinal(epoch).weekday()
+        week_pattern = bytes((work_week >> ((first_weekday + i) % 7)) & 1 for i in range(7))
+        pattern = (week_pattern * (day_count // 7 + 1))[:day_count]
+
+        works = bytes(day_works and not flags & DAY_HOLIDAY for day_works, flags in zip(pattern, day_flags))
+        prefix = array('I', accumulate(works, initial=0))
+        working = array('I', compress(range(day_count), works))
+
+        return cls(epoch, day_count, prefix, working)
+
+    def working_days_from(self, start_date, count):
+        """count рабочих дней начиная с start_date и следующий рабочий день после них"""
+        index = start_date.toordinal() - self.epoch
+        if index < 0 or index >= self.day_count:
+            return None
+
+        first = self.prefix[index]
+        if first + count >= len(self.working):
+            return None
+
+        epoch = self.epoch
+        days = [datetime.fromordinal(epoch + offset) for offset in self.working[first:first + count]]
+        return days, datetime.fromordinal(epoch + self.working[first + count])
+
+
+class CalendarStore(WorkingDayIndex):
+    """Календарь рабочих дней в двоичном файле, отображенном в память.
+
+    Формат: заголовок, байт флагов на каждый день от эпохи, префиксные
+    количества рабочих дней и номера рабочих дней подряд (пятидневка).
+    Страницы файла разделяются всеми процессами без копирования.
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self.mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        try:
+            (magic, version, epoch, day_count,
+             working_count, self.source_hash) = CALENDAR_STORE_HEADER.unpack_from(self.mmap, 0)
+
+            flags_size = (day_count + 3) // 4 * 4
+            expected_size = (CALENDAR_STORE_HEADER.size + flags_size
+                             + (day_count + 1) * 4 + working_count * 4)
+            if magic != CALENDAR_STORE_MAGIC or version != CALENDAR_STORE_VERSION \
+                    or len(self.mmap) != expected_size:
+                raise ValueError(f'Неподдерживаемый файл календаря: {path}')
+        except (struct.error, ValueError):
+            self.mmap.close()
+            raise ValueError(f'Неподдерживаемый файл календаря: {path}')
+
+        view = memoryview(self.mmap)
+        offset = CALENDAR_STORE_HEADER.size
+        self.flags = view[offset:offset + day_count]
+        offset += flags_size
+        prefix = view[offset:offset + (day_count + 1) * 4].cast('I')
+        offset += (day_count + 1) * 4
+        working = view[offset:offset + working_count * 4].cast('I')
+
+        super().__init__(epoch, day_count, prefix, working)
+
+    def close(self):
+        self.flags.release()
+        self.prefix.release()
+        self.working.release()
+        self.mmap.close()
+
+    def day_flags(self, date):
+        """Флаги дня или None, если дата вне файла"""
+        index = date.toordinal() - self.epoch
+        if 0 <= index < self.day_count:
+            return self.flags[index]
+        return None
+
+
+def compute_day_flags(holiday_calendar):
+    """Эпоха и флаги (праздник, рабочий день пятидневки) на каждый день CALENDAR_STORE_YEARS"""
+    first_year, last_year = CALENDAR_STORE_YEARS
+    epoch = datetime(first_year, 1, 1).toordinal()
+    day_count = datetime(last_year, 12, 31).toordinal() - epoch + 1
+
+    flags = bytearray(day_count)
+    for index in range(day_count):
+        day = datetime.fromordinal(epoch + index)
+        if holiday_calendar.is_holiday(day):
+            flags[index] = DAY_HOLIDAY
+        elif day.weekday() < 5:
+            flags[index] = DAY_WORKING
+
+    return epoch, flags
+
+
+def build_calendar_store(path, holiday_calendar):
+    """Собрать двоичный календарь рабочих дней из списков праздников"""
+    epoch, flags = compute_day_flags(holiday_calendar)
+    index = WorkingDayIndex.build(epoch, flags, WORK_WEEK_5)
+
+    header = CALENDAR_STORE_HEADER.pack(CALENDAR_STORE_MAGIC, CALENDAR_STORE_VERSION, epoch, index.day_count,
+                                        len(index.working), holiday_calendar.source_hash())
+
+    # Уникальный временный файл рядом и переименование: параллельные сборки не мешают друг другу,
+    # а читатели видят либо прежний файл, либо новый целиком
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix='.~calendar', suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(header)
+            f.write(flags)
+            f.write(bytes(-len(flags) % 4))
+            f.write(index.prefix.tobytes())
+            f.write(index.working.tobytes())
+        umask = os.umask(0)
+        os.umask(umask)
+        os.chmod(tmp_path, 0o666 & ~umask)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return path
+
+
+class EducationalScheduleApp:
+    def __init__(self, calendar_store_path=None, holiday_calendar=None):
         # Русские названия месяцев
         self.month_names_ru = {
             1: 'Январь', 2: 'Февраль', 3: 'Март', 4: 'Апрель',
@@ -21,6 +1182,11 @@ class EducationalScheduleApp:
             9: 'Сентябрь', 10: 'Октябрь', 11: 'Ноябрь', 12: 'Декабрь'
         }
 
+        # Кэш шаблонов книги: (число лет обучения, потоковая запись) -> xlsx
+        self.template_cache = {}
+        # Фрагменты прошлого пакета для инкрементального экспорта (save_excel_incremental)
+        self.package_cache = {}
+
         # Праздничные дни России по годам
         self.holidays = {
             2025: ['2025-01-01', '2025-01-02', '2025-01-03', '2025-01-04', '2025-01-06',
@@ -38,48 +1204,150 @@ class EducationalScheduleApp:
                    '2028-11-04']
         }
 
+        # Остальные годы считаются по правилам; официальные уточнения можно положить в holidays.json.
+        # Процессы-исполнители экспорта получают готовый календарь родителя (init_export_worker)
+        if holiday_calendar is None:
+            holiday_calendar = HolidayCalendar(self.holidays)
+            for path in HOLIDAY_OVERRIDE_FILES:
+                holiday_calendar.load_overrides(path)
+        self.holiday_calendar = holiday_calendar
+
+        # Двоичный календарь рабочих дней (mmap), если путь передан явно; без него все считается по HolidayCalendar
+        self.calendar_store = None
+        if calendar_store_path is not None:
+            self.calendar_store = self.open_calendar_store(calendar_store_path)
+
+        # Неизменные части сетки календаря по учебным годам
+        self.calendar_frames = {}
+
+        # Таблицы рабочих дней по маскам недели, строятся при первом обращении
+        self.working_day_indexes = {}
+        if self.calendar_store is not None:
+            self.working_day_indexes[WORK_WEEK_5] = self.calendar_store
+
+    def open_calendar_store(self, path):
+        """Открыть двоичный календарь, собранный --build-calendar.
+
+        Если файла нет или он собран по другим спискам праздников, возвращается None
+        и рабочие дни считаются в памяти. Файл здесь не создается и не пересобирается.
+        """
+        try:
+            store = CalendarStore(path)
+        except (OSError, ValueError):
+            return None
+
+        if store.source_hash != self.holiday_calendar.source_hash():
+            store.close()
+            return None
+        return store
+
     def get_monday_of_week(self, date):
         days_since_monday = date.weekday()
         return date - timedelta(days=days_since_monday)
 
-    def is_holiday(self, date):
-        year = date.year
-        date_str = date.strftime('%Y-%m-%d')
-        return date_str in self.holidays.get(year, [])
+    def get_working_day_index(self, work_week=WORK_WEEK_5):
+        """Префиксные таблицы рабочих дней для маски недели"""
+        index = self.working_day_indexes.get(work_week)
+        if index is None:
+            if self.calendar_store is not None:
+                epoch, flags = self.calendar_store.epoch, self.calendar_store.flags
+            else:
+                epoch, flags = compute_day_flags(self.holiday_calendar)
+            index = WorkingDayIndex.build(epoch, flags, work_week)
+            self.working_day_indexes[work_week] = index
+        return index
 
-    def is_working_day(self, date):
-        return date.weekday() < 5 and not self.is_holiday(date)
+    def is_holiday(self, date):
+        if self.calendar_store is not None:
+            flags = self.calendar_store.day_flags(date)
+            if flags is not None:
+                return bool(flags & DAY_HOLIDAY)
+        return self.holiday_calendar.is_holiday(date)
+
+    def is_working_day(self, date, work_week=WORK_WEEK_5):
+        if work_week == WORK_WEEK_5 and self.calendar_store is not None:
+            flags = self.calendar_store.day_flags(date)
+            if flags is not None:
+                return bool(flags & DAY_WORKING)
+        return bool(work_week >> date.weekday() & 1) and not self.is_holiday(date)
+
+    def calculate_academic_weeks(self, start_date, weeks_float, work_week=WORK_WEEK_5):
+        working_days_needed = int(weeks_float * work_week.bit_count())
+
+        # Через префиксные суммы таблицы рабочих дней: без перебора дней
+        result = self.get_working_day_index(work_week).working_days_from(start_date, working_days_needed)
+        if result is not None:
+            return result
 
-    def calculate_academic_weeks(self, start_date, weeks_float):
         current_date = start_date
-        working_days_needed = int(weeks_float * 5)
         working_days_count = 0
         schedule_days = []
 
         while working_days_count < working_days_needed:
-            if self.is_working_day(current_date):
+            if self.is_working_day(current_date, work_week):
                 schedule_days.append(current_date)
                 working_days_count += 1
             current_date += timedelta(days=1)
 
-        while not self.is_working_day(current_date):
+        while not self.is_working_day(current_date, work_week):
             current_date += timedelta(days=1)
 
         return schedule_days, current_date
 
-    def generate_schedule(self, periods_data, start_year):
-        start_date = datetime(start_year, 9, 1)
-        current_date = self.get_monday_of_week(start_date)
+    def generate_schedule(self, periods_data, start_year, work_week=WORK_WEEK_5, activity_work_weeks=None):
+        plan = self.prepare_periods(periods_data, work_week, activity_work_weeks)
+        return self.schedule_periods(plan, start_year)
 
-        generated_schedule = []
+    def prepare_periods(self, periods_data, work_week=WORK_WEEK_5, activity_work_weeks=None):
+        """Шаблон периодов без привязки к году: (год, семестр, тип, недели, маска недели)"""
+        if activity_work_weeks is None:
+            activity_work_weeks = ACTIVITY_WORK_WEEKS
 
+        plan = []
         for row in periods_data:
-            year = int(row['Год'])
-            semester = int(row['Семестр'])
             activity_type = row['Тип']
-            weeks = float(row['Недели'])
+            plan.append((int(row['Год']), int(row['Семестр']), activity_type, float(row['Недели']),
+                         activity_work_weeks.get(activity_type, work_week)))
+        return plan
 
-            period_days, next_date = self.calculate_academic_weeks(current_date, weeks)
+    def schedule_periods(self, plan, start_year, previous=None):
+        """Даты периодов шаблона для набора с началом обучения в start_year.
+
+        previous = (шаблон, год начала, график) — прежний расчет: даты периода зависят
+        только от его записи и даты начала, поэтому общее начало берется как есть,
+        а прежний хвост подхватывается, как только период начинается в ту же дату.
+        """
+        generated_schedule = []
+        common = 0
+        if previous is not None and previous[1] == start_year:
+            previous_plan, _, previous_schedule = previous
+            limit = min(len(plan), len(previous_plan))
+            while common < limit and plan[common] == previous_plan[common]:
+                common += 1
+            # Дописанные в конец периоды начинаются после последнего прежнего: его дата конца неизвестна
+            if common == len(previous_plan) and 0 < common < len(plan):
+                common -= 1
+            generated_schedule = previous_schedule[:common]
+        else:
+            previous_plan, previous_schedule = [], []
+
+        if common < len(previous_schedule):
+            current_date = previous_schedule[common]['start_date']
+        else:
+            current_date = self.get_monday_of_week(datetime(start_year, 9, 1))
+
+        starts = {}
+        for idx in range(common, len(previous_schedule)):
+            starts.setdefault(previous_schedule[idx]['start_date'], idx)
+
+        for idx in range(common, len(plan)):
+            tail = starts.get(current_date)
+            if tail is not None and plan[idx:] == previous_plan[tail:]:
+                generated_schedule.extend(previous_schedule[tail:])
+                break
+
+            year, semester, activity_type, weeks, period_work_week = plan[idx]
+            period_days, next_date = self.calculate_academic_weeks(current_date, weeks, period_work_week)
 
             period_info = {
                 'year': year,
@@ -96,34 +1364,154 @@ class EducationalScheduleApp:
 
         return generated_schedule
 
-    def create_excel_file(self, generated_schedule, start_year, program_type):
-        wb = Workbook()
+    def generate_cohorts(self, periods_data, start_years, program_type, work_week=WORK_WEEK_5,
+                         activity_work_weeks=None):
+        """Графики нескольких наборов по одному шаблону: {год начала: (график, итоги)}.
 
+        Шаблон разбирается один раз, таблицы рабочих дней и сетки учебных годов
+        общие для всех наборов, поэтому каждый следующий набор почти бесплатен.
+        Результат передается в экспорт как есть: save_excel_atomic(график, год, программа, файл, итоги).
+        """
         program_years = 2 if "Ординатура" in program_type else 3
+        plan = self.prepare_periods(periods_data, work_week, activity_work_weeks)
+
+        for period_work_week in {period[4] for period in plan}:
+            self.get_working_day_index(period_work_week)
+        for academic_year in sorted({year + offset for year in start_years for offset in range(program_years)}):
+            self.get_calendar_frame(academic_year)
+
+        cohorts = {}
+        for start_year in start_years:
+            generated_schedule = self.schedule_periods(plan, start_year)
+            cohorts[start_year] = (generated_schedule, self.compute_summary(generated_schedule))
+        return cohorts
+
+    def solve_plan(self, totals, start_year, work_week=WORK_WEEK_5, order=PLAN_ACTIVITY_ORDER,
+                   holidays_in_vacation=True, semester_after_winter=True, warnings=None):
+        """Таблица периодов по требуемым неделям {(курс, семестр, тип): недели}.
+
+        Порядок типов в семестре подбирается перебором в порядке order с отсечениями.
+        Границы периодов — номера рабочих дней по префиксной таблице, без построения дат.
+        Ограничения: зимние праздники внутри семестра приходятся на К; второй семестр
+        начинается после них. Если порядка нет, ValueError с причиной. Если передан
+        список warnings, семестр с праздниками без К не ошибка: причина добавляется в список.
+        """
+        index = self.get_working_day_index(work_week)
+        days_per_week = work_week.bit_count()
+        rank = {code: idx for idx, code in enumerate(order)}
+
+        def position(date):
+            """Сколько рабочих дней от эпохи до date"""
+            offset = date.toordinal() - index.epoch
+            if not 0 <= offset < index.day_count:
+                raise ValueError(f'Дата {date:%d.%m.%Y} вне производственного календаря')
+            return index.prefix[offset]
+
+        semesters = {}
+        for (year, semester, activity_type), weeks in totals.items():
+            if weeks > 0:
+                semesters.setdefault((int(year), int(semester)), []).append((activity_type, weeks))
+
+        # Зимние праздники (1–8 января) каждого учебного года: рабочие дни до и после них
+        years = {year for year, semester in semesters}
+        winter = {}
+        for year in years:
+            winter[year] = (position(datetime(start_year + year, 1, 1)), position(datetime(start_year + year, 1, 9)))
+
+        current = position(self.get_monday_of_week(datetime(start_year, 9, 1)))
+        periods_data = []
+
+        for (year, semester), items in sorted(semesters.items()):
+            items.sort(key=lambda item: rank.get(item[0], len(rank)))
+            lengths = [int(weeks * days_per_week) for activity_type, weeks in items]
+            block_start, block_end = winter[year]
+
+            # Нехватка в рабочих днях: доли недели в шестых не годятся для пятидневки
+            if semester_after_winter and semester == 2 and current < block_end:
+                raise ValueError(f'{year} курс: 2 семестр начинается до окончания зимних праздников, '
+                                 f'в 1 семестре не хватает {block_end - current} раб. дн.')
+
+            # Праздники внутри семестра: период, накрывший последний рабочий день перед ними, — К
+            block = None
+            if holidays_in_vacation and current <= block_start - 1 and block_end < current + sum(lengths):
+                if warnings is not None and all(activity_type != 'К' for activity_type, weeks in items):
+                    warnings.append(f'{year} курс, {semester} семестр: зимние праздники приходятся на занятия, '
+                                    f'в семестре нет каникул (К)')
+                else:
+                    block = (block_start, block_end)
 
-        # ===== СТИЛИ =====
-        header_font = Font(name='Calibri', size=11, bold=True, color='FFFFFF')
-        title_font = Font(name='Calibri', size=16, bold=True, color='1976D2')
-        year_title_font = Font(name='Calibri', size=14, bold=True, color='FFFFFF')
-        legend_header_font = Font(name='Calibri', size=12, bold=True, color='1976D2')
-        legend_font = Font(name='Calibri', size=10, color='000000')
-        data_font = Font(name='Calibri', size=10, color='000000')
+            arrangement = self.arrange_semester(items, lengths, current, block)
+            if arrangement is None:
+                raise ValueError(f'{year} курс, {semester} семестр: зимние праздники не удается '
+                                 f'поставить в каникулы (К)')
+
+            for idx in arrangement:
+                activity_type, weeks = items[idx]
+                periods_data.append({'Год': year, 'Семестр': semester, 'Тип': activity_type, 'Недели': weeks})
+            current += sum(lengths)
+
+        return periods_data
+
+    def arrange_semester(self, items, lengths, start, block=None):
+        """Порядок периодов семестра (номера в items) или None; перебор с запоминанием тупиков"""
+        failed = set()
 
-        thin_border = Border(
+        def arrange(remaining, position):
+            if not remaining:
+                return []
+            if remaining in failed:
+                return None
+
+            for idx in sorted(remaining):
+                end = position + lengths[idx]
+                # Период, накрывший день перед праздниками, должен быть К и закончиться после них
+                if block is not None and position <= block[0] - 1 < end and \
+                        (items[idx][0] != 'К' or end < block[1] + 1):
+                    continue
+                rest = arrange(remaining - {idx}, end)
+                if rest is not None:
+                    return [idx] + rest
+
+            failed.add(remaining)
+            return None
+
+        return arrange(frozenset(range(len(items))), start)
+
+    def optimize_placements(self, cohorts, capacities, iterations=5000, seed=0):
+        """Переставить практики наборов внутри семестров под вместимость баз {тип: студентов в день}.
+
+        Возвращает таблицы периодов наборов и оставшееся превышение в студенто-днях.
+        """
+        optimizer = PlacementOptimizer(self, cohorts, capacities, seed=seed)
+        overflow = optimizer.optimize(iterations)
+        return optimizer.layouts(), overflow
+
+    def create_excel_styles(self):
+        """Стили оформления Excel"""
+        styles = {
+            'header_font': Font(name='Calibri', size=11, bold=True, color='FFFFFF'),
+            'title_font': Font(name='Calibri', size=16, bold=True, color='1976D2'),
+            'year_title_font': Font(name='Calibri', size=14, bold=True, color='FFFFFF'),
+            'legend_header_font': Font(name='Calibri', size=12, bold=True, color='1976D2'),
+            'legend_font': Font(name='Calibri', size=10, color='000000'),
+            'data_font': Font(name='Calibri', size=10, color='000000'),
+        }
+
+        styles['thin_border'] = Border(
             left=Side(style='thin', color='E0E0E0'),
             right=Side(style='thin', color='E0E0E0'),
             top=Side(style='thin', color='E0E0E0'),
             bottom=Side(style='thin', color='E0E0E0')
         )
 
-        thick_border = Border(
+        styles['thick_border'] = Border(
             left=Side(style='medium', color='90CAF9'),
             right=Side(style='medium', color='90CAF9'),
             top=Side(style='medium', color='90CAF9'),
             bottom=Side(style='medium', color='90CAF9')
         )
 
-        activity_fills = {
+        styles['activity_fills'] = {
             'Т': PatternFill(start_color="BBDEFB", end_color="BBDEFB", fill_type="solid"),
             'Э': PatternFill(start_color="FFF59D", end_color="FFF59D", fill_type="solid"),
             'П': PatternFill(start_color="C8E6C9", end_color="C8E6C9", fill_type="solid"),
@@ -135,13 +1523,43 @@ class EducationalScheduleApp:
             'К': PatternFill(start_color="FFE082", end_color="FFE082", fill_type="solid"),
         }
 
-        weekend_fill = PatternFill(start_color="F5F5F5", end_color="F5F5F5", fill_type="solid")
-        holiday_fill = PatternFill(start_color="FFCDD2", end_color="FFCDD2", fill_type="solid")
-        header_fill = PatternFill(start_color="64B5F6", end_color="64B5F6", fill_type="solid")
-        month_fill = PatternFill(start_color="C8E6C9", end_color="C8E6C9", fill_type="solid")
-        month_fill_alt = PatternFill(start_color="E0E0E0", end_color="E0E0E0", fill_type="solid")
-        year_header_fill = PatternFill(start_color="42A5F5", end_color="42A5F5", fill_type="solid")
-        legend_header_fill = PatternFill(start_color="F5F5F5", end_color="F5F5F5", fill_type="solid")
+        styles['weekend_fill'] = PatternFill(start_color="F5F5F5", end_color="F5F5F5", fill_type="solid")
+        styles['holiday_fill'] = PatternFill(start_color="FFCDD2", end_color="FFCDD2", fill_type="solid")
+        styles['header_fill'] = PatternFill(start_color="64B5F6", end_color="64B5F6", fill_type="solid")
+        styles['month_fill'] = PatternFill(start_color="C8E6C9", end_color="C8E6C9", fill_type="solid")
+        styles['month_fill_alt'] = PatternFill(start_color="E0E0E0", end_color="E0E0E0", fill_type="solid")
+        styles['year_header_fill'] = PatternFill(start_color="42A5F5", end_color="42A5F5", fill_type="solid")
+        styles['legend_header_fill'] = PatternFill(start_color="F5F5F5", end_color="F5F5F5", fill_type="solid")
+
+        return styles
+
+    def create_excel_file(self, generated_schedule, start_year, program_type, summary=None, use_template=False,
+                          diff=None):
+        if use_template:
+            wb = self.load_excel_template(program_type)
+        else:
+            wb = self.create_excel_template(program_type)
+
+        self.fill_excel_template(wb, generated_schedule, start_year, program_type, summary)
+        if diff is not None:
+            self.add_diff_sheet(wb, diff)
+        return wb
+
+    def create_excel_template(self, program_type):
+        """Статическая часть книги: оформление без дат, кодов и итогов"""
+        wb = Workbook()
+
+        program_years = 2 if "Ординатура" in program_type else 3
+        styles = self.create_excel_styles()
+
+        title_font = styles['title_font']
+        legend_header_font = styles['legend_header_font']
+        legend_font = styles['legend_font']
+        thin_border = styles['thin_border']
+        thick_border = styles['thick_border']
+        activity_fills = styles['activity_fills']
+        holiday_fill = styles['holiday_fill']
+        legend_header_fill = styles['legend_header_fill']
 
         # ===== ЛИСТ 1: УСЛОВНЫЕ ОБОЗНАЧЕНИЯ =====
         ws_legend = wb.active
@@ -150,7 +1568,6 @@ class EducationalScheduleApp:
         current_row = 1
 
         ws_legend.merge_cells(f'A{current_row}:F{current_row}')
-        ws_legend[f'A{current_row}'] = f"КАЛЕНДАРНЫЙ УЧЕБНЫЙ ГРАФИК {start_year}-{start_year + program_years} г."
         ws_legend[f'A{current_row}'].font = title_font
         ws_legend[f'A{current_row}'].alignment = Alignment(horizontal='center', vertical='center')
         ws_legend[f'A{current_row}'].fill = legend_header_fill
@@ -169,18 +1586,8 @@ class EducationalScheduleApp:
         ws_legend.row_dimensions[current_row].height = 25
         current_row += 1
 
-        legend_items = [
-            ('Т', 'Теоретическое обучение', activity_fills.get('Т')),
-            ('Э', 'Экзаменационная сессия', activity_fills.get('Э')),
-            ('П', 'Практика (производственная, преддипломная)', activity_fills.get('П')),
-            ('У', 'Учебная практика', activity_fills.get('У')),
-            ('ПА', 'Промежуточная аттестация', activity_fills.get('ПА')),
-            ('ГИА', 'Государственная итоговая аттестация', activity_fills.get('ГИА')),
-            ('Г', 'Подготовка к сдаче и сдача гос. экзамена', activity_fills.get('Г')),
-            ('Д', 'Подготовка и защита выпускной квалификационной работы', activity_fills.get('Д')),
-            ('К', 'Каникулы', activity_fills.get('К')),
-            ('*', 'Нерабочие праздничные дни', holiday_fill),
-        ]
+        legend_items = [(code, name, activity_fills.get(code)) for code, name in ACTIVITY_NAMES.items()]
+        legend_items.append(('*', 'Нерабочие праздничные дни', holiday_fill))
 
         for symbol, description, fill in legend_items:
             ws_legend[f'A{current_row}'] = symbol
@@ -208,81 +1615,256 @@ class EducationalScheduleApp:
         # ===== ЛИСТ 2: КАЛЕНДАРНЫЙ ГРАФИК =====
         ws = wb.create_sheet("Календарный график")
 
-        current_row = 1
+        ws.merge_cells('A1:BB1')
+        ws['A1'].font = title_font
+        ws['A1'].alignment = Alignment(horizontal='center', vertical='center')
+        ws['A1'].fill = legend_header_fill
+        ws['A1'].border = thick_border
+        ws.row_dimensions[1].height = 35
 
-        ws.merge_cells(f'A{current_row}:BB{current_row}')
-        ws[f'A{current_row}'] = f"КАЛЕНДАРНЫЙ УЧЕБНЫЙ ГРАФИК {start_year}-{start_year + program_years} г."
-        ws[f'A{current_row}'].font = title_font
-        ws[f'A{current_row}'].alignment = Alignment(horizontal='center', vertical='center')
-        ws[f'A{current_row}'].fill = legend_header_fill
-        ws[f'A{current_row}'].border = thick_border
-        ws.row_dimensions[current_row].height = 35
-        current_row += 1
+        ws.column_dimensions['A'].width = 6
+        for col_idx in range(2, 60):
+            ws.column_dimensions[get_column_letter(col_idx)].width = 4.5
 
-        current_row += 1
+        # ===== ЛИСТ 3: ИТОГИ =====
+        ws_summary = wb.create_sheet("Итоги")
+        self.create_summary_layout(ws_summary, program_years)
+
+        return wb
+
+    def fill_excel_template(self, wb, generated_schedule, start_year, program_type, summary=None):
+        """Заполнить шаблон переменными значениями: даты, коды, итоги"""
+        program_years = 2 if "Ординатура" in program_type else 3
+        styles = self.create_excel_styles()
+
+        if summary is None:
+            summary = self.compute_summary(generated_schedule)
+
+        title = self.excel_title(start_year, program_years)
+
+        wb["Условные обозначения"]['A1'] = title
+
+        ws = wb["Календарный график"]
+        ws['A1'] = title
+
+        activity_index = self.build_activity_index(generated_schedule)
+        current_row = 3
 
         for academic_year in range(program_years):
             actual_year = start_year + academic_year
 
             ws.merge_cells(f'A{current_row}:BB{current_row}')
             ws[f'A{current_row}'] = f"УЧЕБНЫЙ ГОД {actual_year}-{actual_year + 1}"
-            ws[f'A{current_row}'].font = year_title_font
+            ws[f'A{current_row}'].font = styles['year_title_font']
             ws[f'A{current_row}'].alignment = Alignment(horizontal='center', vertical='center')
-            ws[f'A{current_row}'].fill = year_header_fill
-            ws[f'A{current_row}'].border = thick_border
+            ws[f'A{current_row}'].fill = styles['year_header_fill']
+            ws[f'A{current_row}'].border = styles['thick_border']
             ws.row_dimensions[current_row].height = 28
             current_row += 1
 
             current_row += 1
 
             current_row = self.create_horizontal_calendar(
-                ws, actual_year, generated_schedule,
-                activity_fills, weekend_fill, holiday_fill,
-                thin_border, header_font, header_fill,
-                month_fill, month_fill_alt, data_font, current_row
+                ws, actual_year, generated_schedule, styles, current_row, activity_index
             )
 
             current_row += 2
 
-        ws.column_dimensions['A'].width = 6
-        for col_idx in range(2, 60):
-            ws.column_dimensions[get_column_letter(col_idx)].width = 4.5
-
-        # ===== ЛИСТ 3: ИТОГИ =====
-        self.create_beautiful_summary_sheet(wb, generated_schedule, start_year, program_type)
+        self.fill_summary_sheet(wb["Итоги"], summary, program_years)
 
         return wb
 
-    def create_horizontal_calendar(self, ws, start_year, generated_schedule,
-                                   activity_fills, weekend_fill, holiday_fill,
-                                   thin_border, header_font, header_fill,
-                                   month_fill, month_fill_alt, data_font, start_row):
-        """ГОРИЗОНТАЛЬНЫЙ КАЛЕНДАРЬ"""
-        current_row = start_row
+    def excel_title(self, start_year, program_years):
+        return f"КАЛЕНДАРНЫЙ УЧЕБНЫЙ ГРАФИК {start_year}-{start_year + program_years} г."
 
-        start_date = datetime(start_year, 9, 1)
+    def excel_template_path(self, program_years, streaming=False):
+        suffix = '_stream' if streaming else ''
+        return os.path.join(TEMPLATE_CACHE_DIR, f'template_v{TEMPLATE_VERSION}_{program_years}{suffix}.xlsx')
+
+    def get_excel_template_bytes(self, program_type, streaming=False):
+        """Шаблон книги: из памяти, с диска или построить заново"""
+        program_years = 2 if "Ординатура" in program_type else 3
+
+        data = self.template_cache.get((program_years, streaming))
+        if data is not None:
+            return data
+
+        path = self.excel_template_path(program_years, streaming)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            data = None
+
+        if data is None:
+            wb = self.create_excel_template(program_type)
+            if streaming:
+                self.add_calendar_style_carriers(wb["Календарный график"])
+
+            buffer = io.BytesIO()
+            wb.save(buffer)
+            data = buffer.getvalue()
+
+            # Дисковый кэш необязателен: при ошибке записи работаем из памяти
+            try:
+                os.makedirs(TEMPLATE_CACHE_DIR, exist_ok=True)
+                tmp_path = f'{path}.{os.getpid()}.tmp'
+                with open(tmp_path, 'wb') as f:
+                    f.write(data)
+                os.replace(tmp_path, path)
+            except OSError:
+                pass
+
+        self.template_cache[(program_years, streaming)] = data
+        return data
+
+    def load_excel_template(self, program_type, streaming=False):
+        return load_workbook(io.BytesIO(self.get_excel_template_bytes(program_type, streaming)))
+
+    def create_calendar_styles(self, styles):
+        """Компоненты стилей календаря по коротким именам"""
+        fills = dict(styles['activity_fills'])
+        fills.update({
+            'header': styles['header_fill'],
+            'white': PatternFill(start_color="FFFFFF", end_color="FFFFFF", fill_type="solid"),
+            'holiday': styles['holiday_fill'],
+            'weekend': styles['weekend_fill'],
+            'week': PatternFill(start_color="66BB6A", end_color="66BB6A", fill_type="solid"),
+            'legend_header': styles['legend_header_fill'],
+            'year_header': styles['year_header_fill'],
+        })
+
+        return {
+            'font': {
+                'header': styles['header_font'],
+                'title': styles['title_font'],
+                'year_title': styles['year_title_font'],
+                'month': Font(name='Calibri', size=10, bold=True, color='424242'),
+                'holiday': Font(name='Calibri', size=10, bold=True, color='D32F2F'),
+                'day': Font(name='Calibri', size=10, bold=False, color='000000'),
+                'day_bold': Font(name='Calibri', size=10, bold=True, color='000000'),
+                'week': Font(name='Calibri', size=10, bold=True, color='FFFFFF'),
+            },
+            'fill': fills,
+            'border': {
+                'thin': styles['thin_border'],
+                'thick': styles['thick_border'],
+                'month_end': Border(
+                    left=Side(style='thin', color='E0E0E0'),
+                    right=Side(style='medium', color='B0BEC5'),
+                    top=Side(style='thin', color='E0E0E0'),
+                    bottom=Side(style='thin', color='E0E0E0')
+                ),
+            },
+            'alignment': {
+                'center': Alignment(horizontal='center', vertical='center'),
+            },
+        }
+
+    def merged_border_styles(self, start_border, end_border=None):
+        """Границы объединенной строки так, как их выставляет openpyxl: (начало, середина, конец)"""
+        if end_border is not None:
+            start_border = start_border + Border(right=end_border.right, bottom=end_border.bottom)
+
+        inner = DEFAULT_BORDER
+        last = DEFAULT_BORDER
+        for name in ('top', 'right', 'bottom'):
+            side = getattr(start_border, name)
+            if side is None or side.style is None:
+                continue
+            if name != 'right':
+                inner += Border(**{name: side})
+            last += Border(**{name: side})
+
+        return start_border, inner, last
+
+    def resolve_calendar_style(self, calendar_styles, key):
+        """Ключ стиля (шрифт, заливка, граница, выравнивание) -> объекты openpyxl"""
+        font, fill, border, alignment = key
+
+        if isinstance(border, tuple):
+            _, base, end, part = border
+            parts = self.merged_border_styles(calendar_styles['border'][base],
+                                              calendar_styles['border'].get(end))
+            border = parts[('start', 'inner', 'end').index(part)]
+        else:
+            border = calendar_styles['border'].get(border)
+
+        return (calendar_styles['font'].get(font),
+                calendar_styles['fill'].get(fill),
+                border,
+                calendar_styles['alignment'].get(alignment))
+
+    def calendar_style_keys(self):
+        """Фиксированный набор ключей стилей листа календаря"""
+        keys = [
+            CALENDAR_HEADER_KEY,
+            CALENDAR_TITLE_KEY,
+            CALENDAR_YEAR_KEY,
+            ('title', 'legend_header', ('merged', 'thick', None, 'start'), 'center'),
+            (None, None, ('merged', 'thick', None, 'inner'), None),
+            (None, None, ('merged', 'thick', None, 'end'), None),
+            ('month', 'white', ('merged', 'thin', 'month_end', 'start'), 'center'),
+            (None, None, ('merged', 'thin', 'month_end', 'inner'), None),
+            (None, None, ('merged', 'thin', 'month_end', 'end'), None),
+        ]
+
+        for border in ('thin', 'month_end'):
+            keys += [
+                ('month', 'white', border, 'center'),
+                (None, 'white', border, 'center'),
+                (None, 'white', border, None),
+                ('holiday', 'holiday', border, 'center'),
+                ('week', 'week', border, 'center'),
+                (None, 'weekend', border, None),
+                (None, None, border, None),
+            ]
+            for font in ('day', 'day_bold'):
+                keys.append((font, None, border, 'center'))
+                keys.append((font, 'weekend', border, 'center'))
+                keys += [(font, code, border, 'center') for code in ACTIVITY_TYPES]
+
+        return list(dict.fromkeys(keys))
+
+    def build_activity_index(self, generated_schedule):
+        """Индекс дата -> тип занятия (приоритет у первого периода, как в get_activity_for_date)"""
+        activity_index = {}
+        for period in generated_schedule:
+            for day in period['days']:
+                activity_index.setdefault(day, period['type'])
+        return activity_index
+
+    def get_calendar_weeks(self, start_year):
+        """Недели учебного года: списки дат с понедельника по воскресенье"""
         end_date = datetime(start_year + 1, 8, 31)
-        first_monday = self.get_monday_of_week(start_date)
 
         all_weeks = []
-        current_date = first_monday
+        current_date = self.get_monday_of_week(datetime(start_year, 9, 1))
         while current_date <= end_date:
-            week_dates = [current_date + timedelta(days=i) for i in range(7)]
-            all_weeks.append(week_dates)
+            all_weeks.append([current_date + timedelta(days=i) for i in range(7)])
             current_date += timedelta(days=7)
+        return all_weeks
+
+    def get_calendar_frame(self, start_year):
+        """Неизменная часть сетки учебного года; общая для всех графиков с этим годом"""
+        frame = self.calendar_frames.get(start_year)
+        if frame is None:
+            frame = self.build_calendar_frame(start_year)
+            self.calendar_frames[start_year] = frame
+        return frame
+
+    def build_calendar_frame(self, start_year):
+        """Месяцы, даты и номера недель учебного года и ячейки под строки занятий"""
+        start_date = datetime(start_year, 9, 1)
+        end_date = datetime(start_year + 1, 8, 31)
+        all_weeks = self.get_calendar_weeks(start_year)
 
-        academic_months_list = [(start_year, m) for m in range(9, 13)] + \
-                               [(start_year + 1, m) for m in range(1, 9)]
+        academic_months = [(start_year, m) for m in range(9, 13)] + \
+                          [(start_year + 1, m) for m in range(1, 9)]
         month_to_index = {}
-        for idx, month_key in enumerate(academic_months_list):
+        for idx, month_key in enumerate(academic_months):
             month_to_index[month_key] = idx
 
-        ws[f'A{current_row}'] = 'Месяц'
-        ws[f'A{current_row}'].font = header_font
-        ws[f'A{current_row}'].fill = header_fill
-        ws[f'A{current_row}'].alignment = Alignment(horizontal='center', vertical='center')
-        ws[f'A{current_row}'].border = thin_border
-
         month_columns = {}
         for week_idx, week_dates in enumerate(all_weeks):
             col = week_idx + 2
@@ -294,17 +1876,15 @@ class EducationalScheduleApp:
                     month_columns[month_key] = []
                 month_columns[month_key].append(col)
 
-        academic_months = [(start_year, m) for m in range(9, 13)] + \
-                          [(start_year + 1, m) for m in range(1, 9)]
+        # Последние колонки месяцев отделяются толстой границей
+        month_end_columns = {max(cols) for cols in month_columns.values()}
 
-        thick_month_border = Border(
-            left=Side(style='thin', color='E0E0E0'),
-            right=Side(style='medium', color='B0BEC5'),
-            top=Side(style='thin', color='E0E0E0'),
-            bottom=Side(style='thin', color='E0E0E0')
-        )
+        rows = []    # (смещение строки, высота, [(колонка, значение, ключ стиля)])
+        merges = []  # (смещение строки, первая колонка, последняя колонка)
 
-        for month_idx, (year, month) in enumerate(academic_months):
+        # ===== МЕСЯЦЫ =====
+        cells = [(1, 'Месяц', CALENDAR_HEADER_KEY)]
+        for year, month in academic_months:
             month_key = (year, month)
             if month_key in month_columns:
                 cols = sorted(month_columns[month_key])
@@ -312,166 +1892,1173 @@ class EducationalScheduleApp:
                 end_col = cols[-1]
 
                 for col in range(start_col, end_col + 1):
-                    cell = ws.cell(row=current_row, column=col)
-
+                    border = 'month_end' if col == end_col else 'thin'
                     if col == start_col:
-                        cell.value = self.month_names_ru[month]
-                        cell.font = Font(name='Calibri', size=10, bold=True, color='424242')
-
-                    cell.fill = PatternFill(start_color="FFFFFF", end_color="FFFFFF", fill_type="solid")
-                    cell.alignment = Alignment(horizontal='center', vertical='center')
-
-                    if col == end_col:
-                        cell.border = thick_month_border
+                        cells.append((col, self.month_names_ru[month], ('month', 'white', border, 'center')))
                     else:
-                        cell.border = thin_border
+                        cells.append((col, None, (None, 'white', border, 'center')))
 
                 if start_col != end_col:
-                    ws.merge_cells(
-                        f'{get_column_letter(start_col)}{current_row}:{get_column_letter(end_col)}{current_row}')
-
-        ws.row_dimensions[current_row].height = 20
-        current_row += 1
+                    merges.append((0, start_col, end_col))
+        rows.append((0, 20, cells))
 
-        days_of_week = ['Пн', 'Вт', 'Ср', 'Чт', 'Пт', 'Сб', 'Вс']
-
-        for day_idx, day_name in enumerate(days_of_week):
-            ws[f'A{current_row}'] = day_name
-            ws[f'A{current_row}'].font = header_font
-            ws[f'A{current_row}'].fill = header_fill
-            ws[f'A{current_row}'].alignment = Alignment(horizontal='center', vertical='center')
-            ws[f'A{current_row}'].border = thin_border
+        # ===== ДАТЫ =====
+        slots = []  # по дням недели: (колонка, дата, граница, шрифт, вид дня) для строк занятий
+        for day_idx, day_name in enumerate(DAYS_OF_WEEK):
+            cells = [(1, day_name, CALENDAR_HEADER_KEY)]
+            day_slots = []
 
             for week_idx, week_dates in enumerate(all_weeks):
                 col = week_idx + 2
                 date = week_dates[day_idx]
-
-                cell = ws.cell(row=current_row, column=col)
+                border = 'month_end' if col in month_end_columns else 'thin'
 
                 if start_date <= date <= end_date:
-                    cell.value = date.day
+                    is_bold = month_to_index.get((date.year, date.month), 0) % 2 == 0
+                    font = 'day_bold' if is_bold else 'day'
 
-                    month_key = (date.year, date.month)
-                    month_index = month_to_index.get(month_key, 0)
-                    is_bold = month_index % 2 == 0
+                    if self.is_holiday(date):
+                        kind = 'holiday'
+                        key = ('holiday', 'holiday', border, 'center')
+                    elif date.weekday() >= 5:
+                        kind = 'weekend'
+                        key = (font, 'weekend', border, 'center')
+                    else:
+                        kind = 'day'
+                        key = (font, None, border, 'center')
+                    cells.append((col, date.day, key))
+                    day_slots.append((col, date, border, font, kind))
+                else:
+                    cells.append((col, '', (None, 'white', 'thin', None)))
+                    day_slots.append((col, date, border, None, 'outside'))
 
-                    cell.alignment = Alignment(horizontal='center', vertical='center')
+            rows.append((1 + day_idx, 18, cells))
+            slots.append(day_slots)
 
-                    is_last_col_of_month = False
-                    for m_key, cols in month_columns.items():
-                        if col == max(cols):
-                            is_last_col_of_month = True
-                            break
+        # ===== НОМЕРА НЕДЕЛЬ =====
+        cells = [(1, 'Неделя', CALENDAR_HEADER_KEY)]
+        for week_idx in range(len(all_weeks)):
+            col = week_idx + 2
+            border = 'month_end' if col in month_end_columns else 'thin'
+            cells.append((col, week_idx + 1, ('week', 'week', border, 'center')))
+        rows.append((8, 20, cells))
 
-                    cell.border = thick_month_border if is_last_col_of_month else thin_border
+        return {'rows': rows, 'merges': merges, 'slots': slots, 'weeks': len(all_weeks)}
 
-                    if self.is_holiday(date):
-                        cell.fill = holiday_fill
-                        cell.font = Font(name='Calibri', size=10, bold=True, color='D32F2F')
-                    elif date.weekday() >= 5:
-                        cell.fill = weekend_fill
-                        cell.font = Font(name='Calibri', size=10, bold=is_bold, color='000000')
+    def build_calendar_grid(self, start_year, generated_schedule, activity_index=None):
+        """Сетка горизонтального календаря: значения и ключи стилей без openpyxl"""
+        if activity_index is None:
+            activity_index = self.build_activity_index(generated_schedule)
+
+        frame = self.get_calendar_frame(start_year)
+        rows = list(frame['rows'])
+
+        # ===== ЗАНЯТИЯ =====
+        rows.append((10, 20, [(1, 'Занятия', ('week', 'week', 'thin', 'center'))]))
+
+        for day_idx, day_name in enumerate(DAYS_OF_WEEK):
+            cells = [(1, day_name, CALENDAR_HEADER_KEY)]
+
+            for col, date, border, font, kind in frame['slots'][day_idx]:
+                if kind == 'outside':
+                    cells.append((col, '', (None, 'white', border, None)))
+                elif kind == 'holiday':
+                    cells.append((col, '*', ('holiday', 'holiday', border, 'center')))
+                else:
+                    activity_type = activity_index.get(date)
+                    if activity_type and activity_type in ACTIVITY_TYPES:
+                        cells.append((col, activity_type, (font, activity_type, border, 'center')))
+                    elif kind == 'weekend':
+                        cells.append((col, None, (None, 'weekend', border, None)))
                     else:
-                        cell.font = Font(name='Calibri', size=10, bold=is_bold, color='000000')
+                        cells.append((col, None, (None, None, border, None)))
+
+            rows.append((11 + day_idx, 18, cells))
+
+        return {'rows': rows, 'merges': frame['merges'], 'height': 18, 'weeks': frame['weeks']}
+
+    def create_horizontal_calendar(self, ws, start_year, generated_schedule, styles, start_row,
+                                   activity_index=None):
+        """ГОРИЗОНТАЛЬНЫЙ КАЛЕНДАРЬ"""
+        grid = self.build_calendar_grid(start_year, generated_schedule, activity_index)
+        calendar_styles = self.create_calendar_styles(styles)
+        resolved = {}
+
+        for offset, height, cells in grid['rows']:
+            row = start_row + offset
+            for col, value, key in cells:
+                cell = ws.cell(row=row, column=col)
+                if value is not None:
+                    cell.value = value
+
+                if key not in resolved:
+                    resolved[key] = self.resolve_calendar_style(calendar_styles, key)
+                font, fill, border, alignment = resolved[key]
+
+                if font is not None:
+                    cell.font = font
+                if fill is not None:
+                    cell.fill = fill
+                if border is not None:
+                    cell.border = border
+                if alignment is not None:
+                    cell.alignment = alignment
+
+            ws.row_dimensions[row].height = height
+
+        for offset, start_col, end_col in grid['merges']:
+            ws.merge_cells(start_row=start_row + offset, start_column=start_col,
+                           end_row=start_row + offset, end_column=end_col)
+
+        return start_row + grid['height']
+
+    def calendar_image_colors(self):
+        """Цвета картинки календаря из заливок Excel: ключ заливки -> #RRGGBB"""
+        styles = self.create_excel_styles()
+        colors = {code: '#' + fill.start_color.rgb[-6:] for code, fill in styles['activity_fills'].items()}
+        for key in ('weekend', 'holiday', 'header', 'year_header'):
+            colors[key] = '#' + styles[f'{key}_fill'].start_color.rgb[-6:]
+        colors[None] = '#FFFFFF'
+        return colors
+
+    def calendar_image_scene(self, generated_schedule, start_year, program_years, cell=CALENDAR_IMAGE_CELL):
+        """Картинка горизонтального календаря: (ширина, высота, прямоугольники, подписи).
+
+        Прямоугольники — (x, y, ширина, высота, цвет), подписи — (x, y базовой линии, текст, размер, цвет).
+        Ячейки и заливки берутся из той же сетки, что и лист Excel.
+        """
+        colors = self.calendar_image_colors()
+        activity_index = self.build_activity_index(generated_schedule)
+        label_width = cell * 2
+        title_height = cell + 4
+        block_height = title_height + cell + 7 * cell + cell // 2
+
+        rects = []
+        labels = []
+        weeks = 0
+        for academic_year in range(program_years):
+            actual_year = start_year + academic_year
+            grid = self.build_calendar_grid(actual_year, generated_schedule, activity_index)
+            weeks = max(weeks, grid['weeks'])
+            top = academic_year * block_height
+
+            rects.append((0, top, label_width + grid['weeks'] * cell, title_height - 2, colors['year_header']))
+            labels.append((4, top + title_height - 5, f'{actual_year}-{actual_year + 1}', cell - 2, '#FFFFFF'))
+
+            for offset, height, cells in grid['rows']:
+                if offset == 0:
+                    # Названия месяцев над первой неделей месяца
+                    for col, value, key in cells:
+                        if value and col > 1:
+                            labels.append((label_width + (col - 2) * cell, top + title_height + cell - 3,
+                                           value[:3], cell - 3, '#424242'))
+                elif 11 <= offset <= 17:
+                    y = top + title_height + cell + (offset - 11) * cell
+                    for col, value, key in cells:
+                        if col == 1:
+                            labels.append((2, y + cell - 3, value, cell - 4, '#424242'))
+                        elif key[1] != 'white':
+                            rects.append((label_width + (col - 2) * cell, y, cell - 1, cell - 1,
+                                          colors.get(key[1], colors[None])))
+
+        return label_width + weeks * cell, program_years * block_height, rects, labels
+
+    def render_calendar_image(self, generated_schedule, start_year, program_years, cell=CALENDAR_IMAGE_CELL):
+        """Картинка календаря в QImage без окна; подписи рисуются, если создано приложение Qt.
+
+        Без дисплея QGuiApplication создается с QT_QPA_PLATFORM=offscreen (так делает --thumbnails).
+        """
+        width, height, rects, labels = self.calendar_image_scene(generated_schedule, start_year, program_years, cell)
+
+        image = QImage(width, height, QImage.Format.Format_RGB32)
+        image.fill(QColor('#FAFAFA'))
+        painter = QPainter(image)
+        qcolors = {}
+        for x, y, w, h, color in rects:
+            if color not in qcolors:
+                qcolors[color] = QColor(color)
+            painter.fillRect(x, y, w, h, qcolors[color])
+
+        # Без QGuiApplication шрифтов нет: пакетные миниатюры остаются без подписей
+        if QGuiApplication.instance() is not None:
+            font = QFont()
+            for x, y, text, size, color in labels:
+                font.setPixelSize(size)
+                painter.setFont(font)
+                painter.setPen(QColor(color))
+                painter.drawText(x, y, str(text))
+        painter.end()
+        return image
+
+    def save_calendar_png(self, generated_schedule, start_year, program_years, file, cell=CALENDAR_IMAGE_CELL):
+        """PNG календаря в двоичный поток"""
+        image = self.render_calendar_image(generated_schedule, start_year, program_years, cell)
+        data = QByteArray()
+        buffer = QBuffer(data)
+        buffer.open(QIODevice.OpenModeFlag.WriteOnly)
+        image.save(buffer, 'PNG')
+        buffer.close()
+        file.write(bytes(data))
+
+    def save_calendar_svg(self, generated_schedule, start_year, program_years, file, cell=CALENDAR_IMAGE_CELL):
+        """SVG календаря в двоичный поток: текст собирается напрямую, без QtSvg"""
+        width, height, rects, labels = self.calendar_image_scene(generated_schedule, start_year, program_years, cell)
+
+        parts = [f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" '
+                 f'viewBox="0 0 {width} {height}" font-family="sans-serif">',
+                 f'<rect width="{width}" height="{height}" fill="#FAFAFA"/>']
+        parts.extend(f'<rect x="{x}" y="{y}" width="{w}" height="{h}" fill="{color}"/>'
+                     for x, y, w, h, color in rects)
+        parts.extend(f'<text x="{x}" y="{y}" font-size="{size}" fill="{color}">{escape(str(text))}</text>'
+                     for x, y, text, size, color in labels)
+        parts.append('</svg>\n')
+        file.write('\n'.join(parts).encode('utf-8'))
+
+    def add_calendar_style_carriers(self, ws):
+        """Ячейки-носители фиксированной таблицы стилей для потоковой записи календаря"""
+        calendar_styles = self.create_calendar_styles(self.create_excel_styles())
+
+        for idx, key in enumerate(self.calendar_style_keys()):
+            cell = ws.cell(row=STYLE_CARRIER_ROW + idx, column=1)
+            font, fill, border, alignment = self.resolve_calendar_style(calendar_styles, key)
+            if font is not None:
+                cell.font = font
+            if fill is not None:
+                cell.fill = fill
+            if border is not None:
+                cell.border = border
+            if alignment is not None:
+                cell.alignment = alignment
+
+    def read_style_carriers(self, sheet_xml):
+        """Номера стилей (cellXfs) носителей в сохраненном листе"""
+        carrier_ids = {}
+        for row, style_id in re.findall(rb'<c r="A(\d+)" s="(\d+)"', sheet_xml):
+            carrier_ids[int(row)] = int(style_id)
+
+        style_ids = {}
+        for idx, key in enumerate(self.calendar_style_keys()):
+            style_ids[key] = carrier_ids[STYLE_CARRIER_ROW + idx]
+        return style_ids
+
+    def merge_calendar_cells(self, cells, start_col, end_col):
+        """Объединить ячейки строки с границами крайних ячеек, как в openpyxl"""
+        by_col = {col: (value, key) for col, value, key in cells}
+
+        start_value, (font, fill, border, alignment) = by_col[start_col]
+        end_border = by_col[end_col][1][2] if end_col in by_col else None
+
+        by_col[start_col] = (start_value, (font, fill, ('merged', border, end_border, 'start'), alignment))
+        for col in range(start_col + 1, end_col + 1):
+            part = 'end' if col == end_col else 'inner'
+            by_col[col] = (None, (None, None, ('merged', border, end_border, part), None))
+
+        return [(col, value, key) for col, (value, key) in sorted(by_col.items(), key=lambda item: item[0])]
+
+    def iter_calendar_block_rows(self, actual_year, start_row, generated_schedule, activity_index, merges):
+        """Строки блока одного учебного года: заголовок года и календарь"""
+        # Заголовок года объединяется до оформления, поэтому крайние ячейки без границ
+        merges.append((start_row, 1, CALENDAR_LAST_COL))
+        yield start_row, 28, [(1, f"УЧЕБНЫЙ ГОД {actual_year}-{actual_year + 1}", CALENDAR_YEAR_KEY)]
+
+        grid_row = start_row + 2
+        grid = self.build_calendar_grid(actual_year, generated_schedule, activity_index)
+        grid_merges = {}
+        for offset, start_col, end_col in grid['merges']:
+            grid_merges.setdefault(offset, []).append((start_col, end_col))
+
+        for offset, height, cells in grid['rows']:
+            row = grid_row + offset
+            for start_col, end_col in grid_merges.get(offset, ()):
+                cells = self.merge_calendar_cells(cells, start_col, end_col)
+                merges.append((row, start_col, end_col))
+            yield row, height, cells
+
+    def calendar_rows_xml(self, rows, style_ids):
+        """XML строк листа (<row>...</row>) по ключам фиксированной таблицы стилей"""
+        parts = []
+        for row, height, cells in rows:
+            parts.append(f'<row r="{row}" ht="{height}" customHeight="1">')
+            for col, value, key in cells:
+                ref = f'{get_column_letter(col)}{row}'
+                style_id = style_ids[key]
+                if value is None or value == '':
+                    parts.append(f'<c r="{ref}" s="{style_id}"/>')
+                elif isinstance(value, int):
+                    parts.append(f'<c r="{ref}" s="{style_id}" t="n"><v>{value}</v></c>')
                 else:
-                    cell.value = ""
-                    cell.fill = PatternFill(start_color="FFFFFF", end_color="FFFFFF", fill_type="solid")
-                    cell.border = thin_border
+                    parts.append(f'<c r="{ref}" s="{style_id}" t="inlineStr"><is><t>{escape(value)}</t></is></c>')
+            parts.append('</row>')
+        return ''.join(parts)
 
-            ws.row_dimensions[current_row].height = 18
-            current_row += 1
+    def calendar_block_xml(self, actual_year, start_row, generated_schedule, style_ids, activity_index=None):
+        """Сериализованный блок учебного года: XML строк и объединения"""
+        if activity_index is None:
+            activity_index = self.build_activity_index(generated_schedule)
 
-        ws[f'A{current_row}'] = 'Неделя'
-        ws[f'A{current_row}'].font = header_font
-        ws[f'A{current_row}'].fill = header_fill
-        ws[f'A{current_row}'].alignment = Alignment(horizontal='center', vertical='center')
-        ws[f'A{current_row}'].border = thin_border
+        merges = []
+        rows = self.iter_calendar_block_rows(actual_year, start_row, generated_schedule, activity_index, merges)
+        return self.calendar_rows_xml(rows, style_ids), merges
 
-        for week_idx in range(len(all_weeks)):
-            col = week_idx + 2
-            cell = ws.cell(row=current_row, column=col)
-            cell.value = week_idx + 1
-            cell.font = Font(name='Calibri', size=10, bold=True, color='FFFFFF')
-            cell.alignment = Alignment(horizontal='center', vertical='center')
-            cell.fill = PatternFill(start_color="66BB6A", end_color="66BB6A", fill_type="solid")
+    def iter_calendar_blocks(self, generated_schedule, start_year, program_years, style_ids):
+        activity_index = self.build_activity_index(generated_schedule)
+        for academic_year in range(program_years):
+            yield self.calendar_block_xml(start_year + academic_year, 3 + academic_year * 22,
+                                          generated_schedule, style_ids, activity_index)
+
+    def write_calendar_sheet_xml(self, f, start_year, program_years, style_ids, blocks):
+        """Записать XML листа календаря: заголовок, затем блоки учебных лет по мере готовности"""
+        f.write(self.calendar_sheet_head(start_year, program_years, style_ids))
+
+        merges = [(1, 1, CALENDAR_LAST_COL)]
+        for xml, block_merges in blocks:
+            f.write(xml.encode('utf-8'))
+            merges += block_merges
+
+        f.write(self.calendar_sheet_tail(merges))
+
+    def calendar_sheet_head(self, start_year, program_years, style_ids):
+        """Начало XML листа календаря до блоков учебных лет: колонки и строка заголовка"""
+        last_row = program_years * 22
+        last_col = max([CALENDAR_LAST_COL] + [len(self.get_calendar_weeks(start_year + y)) + 1
+                                               for y in range(program_years)])
+
+        parts = [
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+            '<sheetPr><outlinePr summaryBelow="1" summaryRight="1"/><pageSetUpPr/></sheetPr>'
+            f'<dimension ref="A1:{get_column_letter(last_col)}{last_row}"/>'
+            '<sheetViews><sheetView workbookViewId="0"><selection activeCell="A1" sqref="A1"/>'
+            '</sheetView></sheetViews>'
+            '<sheetFormatPr baseColWidth="8" defaultRowHeight="15"/>'
+            '<cols><col min="1" max="1" width="6" customWidth="1"/>'
+        ]
+        parts += [f'<col min="{col}" max="{col}" width="4.5" customWidth="1"/>' for col in range(2, 60)]
+        parts.append('</cols><sheetData>')
+
+        title = self.excel_title(start_year, program_years)
+        title_cells = self.merge_calendar_cells([(1, title, CALENDAR_TITLE_KEY)], 1, CALENDAR_LAST_COL)
+        parts.append(self.calendar_rows_xml([(1, 35, title_cells)], style_ids))
+        return ''.join(parts).encode('utf-8')
+
+    def calendar_sheet_tail(self, merges):
+        """Конец XML листа календаря: объединения ячеек"""
+        parts = [f'</sheetData><mergeCells count="{len(merges)}">']
+        for row, start_col, end_col in merges:
+            parts.append(f'<mergeCell ref="{get_column_letter(start_col)}{row}:{get_column_letter(end_col)}{row}"/>')
+        parts.append('</mergeCells>'
+                     '<pageMargins left="0.75" right="0.75" top="1" bottom="1" header="0.5" footer="0.5"/>'
+                     '</worksheet>')
+        return ''.join(parts).encode('utf-8')
+
+    def fill_streaming_template(self, start_year, program_type, summary, diff=None):
+        """Шаблон потоковой записи с заполненными условными обозначениями и итогами"""
+        program_years = 2 if "Ординатура" in program_type else 3
 
-            is_last_col_of_month = False
-            for month_key, cols in month_columns.items():
-                if col == max(cols):
-                    is_last_col_of_month = True
-                    break
+        wb = self.load_excel_template(program_type, streaming=True)
+        wb["Условные обозначения"]['A1'] = self.excel_title(start_year, program_years)
+        self.fill_summary_sheet(wb["Итоги"], summary, program_years)
+        if diff is not None:
+            self.add_diff_sheet(wb, diff)
+
+        buffer = io.BytesIO()
+        wb.save(buffer)
+        return buffer
+
+    def write_streaming_package(self, buffer, file, generated_schedule, start_year, program_years):
+        """Собрать xlsx: части шаблона копируются, лист календаря пишется потоком"""
+        with zipfile.ZipFile(buffer) as source, \
+                zipfile.ZipFile(file, 'w', zipfile.ZIP_DEFLATED) as target:
+            style_ids = self.read_style_carriers(source.read(CALENDAR_SHEET_PATH))
+            blocks = self.iter_calendar_blocks(generated_schedule, start_year, program_years, style_ids)
+
+            for info in source.infolist():
+                if info.filename == CALENDAR_SHEET_PATH:
+                    with target.open(CALENDAR_SHEET_PATH, 'w') as f:
+                        self.write_calendar_sheet_xml(f, start_year, program_years, style_ids, blocks)
+                else:
+                    target.writestr(info, source.read(info.filename))
 
-            cell.border = thick_month_border if is_last_col_of_month else thin_border
+    def save_excel_streaming(self, generated_schedule, start_year, program_type, file, summary=None, diff=None):
+        """Облегченный экспорт: лист календаря пишется напрямую в zip, минуя объектную модель openpyxl"""
+        program_years = 2 if "Ординатура" in program_type else 3
 
-        ws.row_dimensions[current_row].height = 20
-        current_row += 1
+        if summary is None:
+            summary = self.compute_summary(generated_schedule)
+
+        # Условные обозначения и итоги заполняются в шаблоне как обычно
+        buffer = self.fill_streaming_template(start_year, program_type, summary, diff)
+        self.write_streaming_package(buffer, file, generated_schedule, start_year, program_years)
+
+    def group_sheet_names(self, groups):
+        """Допустимые и уникальные имена листов групп (до 31 символа, без []:*?/\\)"""
+        used = {'условные обозначения', 'итоги', GROUPS_SHEET_TITLE.lower(), OCCUPANCY_SHEET_TITLE.lower()}
+        names = []
+        for group in groups:
+            base = re.sub(r'[\[\]:*?/\\]', '_', str(group['name'])).strip("' ") or 'Группа'
+            name = base[:31]
+            number = 2
+            while name.lower() in used:
+                suffix = f' ({number})'
+                name = base[:31 - len(suffix)] + suffix
+                number += 1
+            used.add(name.lower())
+            names.append(name)
+        return names
+
+    def write_groups_list_xml(self, f, groups, sheet_names, style_ids):
+        """Лист со списком групп: набор, численность и объем графика каждой группы"""
+        header_key = CALENDAR_HEADER_KEY
+        cell_key = (None, None, 'thin', None)
+
+        rows = [(1, 20, [(col, text, header_key) for col, text in enumerate(
+            ['Группа', 'Год начала', 'Студентов', 'Периодов', 'Недель', 'Рабочих дней'], start=1)])]
+        for row, (group, sheet_name) in enumerate(zip(groups, sheet_names), start=2):
+            generated_schedule = group['schedule']
+            values = [sheet_name, group['start_year'], group.get('students') or '', len(generated_schedule),
+                      format_weeks(sum(period['weeks'] for period in generated_schedule)),
+                      sum(len(period['days']) for period in generated_schedule)]
+            rows.append((row, 18, [(col, value, cell_key) for col, value in enumerate(values, start=1)]))
+
+        f.write(
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+            f'<dimension ref="A1:F{len(groups) + 1}"/>'
+            '<sheetFormatPr baseColWidth="8" defaultRowHeight="15"/>'
+            '<cols><col min="1" max="1" width="32" customWidth="1"/>'
+            '<col min="2" max="6" width="14" customWidth="1"/></cols>'
+            '<sheetData>'.encode('utf-8')
+        )
+        f.write(self.calendar_rows_xml(rows, style_ids).encode('utf-8'))
+        f.write('</sheetData>'
+                '<pageMargins left="0.75" right="0.75" top="1" bottom="1" header="0.5" footer="0.5"/>'
+                '</worksheet>'.encode('utf-8'))
+
+    def write_occupancy_sheet_xml(self, f, occupancy, style_ids):
+        """Лист кривой загрузки: численность по дням для каждого типа занятий"""
+        activity_types = occupancy.activity_types()
+        header_key = CALENDAR_HEADER_KEY
+        cell_key = (None, None, 'thin', None)
+        last_col = get_column_letter(len(activity_types) + 2)
+
+        f.write(
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+            f'<dimension ref="A1:{last_col}{occupancy.day_count + 1}"/>'
+            '<sheetViews><sheetView workbookViewId="0"><pane ySplit="1" topLeftCell="A2" activePane="bottomLeft"'
+            ' state="frozen"/></sheetView></sheetViews>'
+            '<sheetFormatPr baseColWidth="8" defaultRowHeight="15"/>'
+            '<cols><col min="1" max="1" width="12" customWidth="1"/>'
+            f'<col min="2" max="{len(activity_types) + 2}" width="8" customWidth="1"/></cols>'
+            '<sheetData>'.encode('utf-8')
+        )
 
-        current_row += 1
+        header = [(1, 'Дата', header_key), (2, 'День', header_key)]
+        header += [(col, code, header_key) for col, code in enumerate(activity_types, start=3)]
+        f.write(self.calendar_rows_xml([(1, 20, header)], style_ids).encode('utf-8'))
+
+        # Строки пишутся пачками по неделе, без построения всего листа в памяти
+        rows = []
+        for index, date in enumerate(occupancy.dates()):
+            cells = [(1, date.strftime('%d.%m.%Y'), cell_key), (2, DAYS_OF_WEEK[date.weekday()], cell_key)]
+            cells += [(col, occupancy.daily[code][index], cell_key)
+                      for col, code in enumerate(activity_types, start=3)]
+            rows.append((index + 2, 15, cells))
+            if len(rows) == 7:
+                f.write(self.calendar_rows_xml(rows, style_ids).encode('utf-8'))
+                rows = []
+        f.write(self.calendar_rows_xml(rows, style_ids).encode('utf-8'))
+
+        f.write('</sheetData>'
+                '<pageMargins left="0.75" right="0.75" top="1" bottom="1" header="0.5" footer="0.5"/>'
+                '</worksheet>'.encode('utf-8'))
+
+    def groups_package_parts(self, sheets):
+        """Служебные части книги по группам по списку листов [(имя, часть)]: книга, связи и типы"""
+        relationship = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+        worksheet_type = 'application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml'
+
+        workbook = [
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            f'<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" xmlns:r="{relationship}">'
+            '<workbookPr/><bookViews><workbookView activeTab="0"/></bookViews><sheets>'
+        ]
+        workbook += [f'<sheet name="{escape(name, {chr(34): "&quot;"})}" sheetId="{idx}" r:id="rId{idx}"/>'
+                     for idx, (name, part) in enumerate(sheets, start=1)]
+        workbook.append('</sheets><calcPr calcId="124519" fullCalcOnLoad="1"/></workbook>')
 
-        ws[f'A{current_row}'] = 'Занятия'
-        ws[f'A{current_row}'].font = Font(name='Calibri', size=10, bold=True, color='FFFFFF')
-        ws[f'A{current_row}'].fill = PatternFill(start_color="66BB6A", end_color="66BB6A", fill_type="solid")
-        ws[f'A{current_row}'].alignment = Alignment(horizontal='center', vertical='center')
-        ws[f'A{current_row}'].border = thin_border
-        ws.row_dimensions[current_row].height = 20
-        current_row += 1
+        rels = [
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        ]
+        rels += [f'<Relationship Id="rId{idx}" Type="{relationship}/worksheet" Target="/{part}"/>'
+                 for idx, (name, part) in enumerate(sheets, start=1)]
+        rels.append(f'<Relationship Id="rId{len(sheets) + 1}" Type="{relationship}/styles" Target="styles.xml"/>'
+                    f'<Relationship Id="rId{len(sheets) + 2}" Type="{relationship}/theme" Target="theme/theme1.xml"/>'
+                    '</Relationships>')
+
+        content_types = [
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            '<Override PartName="/xl/workbook.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+            '<Override PartName="/xl/styles.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+            '<Override PartName="/xl/theme/theme1.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.theme+xml"/>'
+            '<Override PartName="/docProps/core.xml" '
+            'ContentType="application/vnd.openxmlformats-package.core-properties+xml"/>'
+            '<Override PartName="/docProps/app.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.extended-properties+xml"/>'
+        ]
+        content_types += [f'<Override PartName="/{part}" ContentType="{worksheet_type}"/>' for name, part in sheets]
+        content_types.append('</Types>')
 
-        for day_idx, day_name in enumerate(days_of_week):
-            ws[f'A{current_row}'] = day_name
-            ws[f'A{current_row}'].font = header_font
-            ws[f'A{current_row}'].fill = header_fill
-            ws[f'A{current_row}'].alignment = Alignment(horizontal='center', vertical='center')
-            ws[f'A{current_row}'].border = thin_border
+        return {
+            'xl/workbook.xml': ''.join(workbook).encode('utf-8'),
+            'xl/_rels/workbook.xml.rels': ''.join(rels).encode('utf-8'),
+            '[Content_Types].xml': ''.join(content_types).encode('utf-8'),
+        }
 
-            for week_idx, week_dates in enumerate(all_weeks):
-                col = week_idx + 2
-                date = week_dates[day_idx]
+    def export_pool(self, max_workers=None):
+        """Пул процессов для экспорта: исполнители строят блоки по календарю этого приложения.
 
-                cell = ws.cell(row=current_row, column=col)
+        Пул создает и закрывает вызывающий, один на всю пакетную выгрузку.
+        """
+        return ProcessPoolExecutor(max_workers=max_workers, initializer=init_export_worker,
+                                   initargs=(self.holiday_calendar,))
 
-                is_last_col_of_month = False
-                for month_key, cols in month_columns.items():
-                    if col == max(cols):
-                        is_last_col_of_month = True
-                        break
+    def iter_group_blocks(self, groups, program_years, style_ids, executor=None):
+        """Блоки учебных лет каждой группы по порядку.
 
-                thick_month_border_activity = Border(
-                    left=Side(style='thin', color='E0E0E0'),
-                    right=Side(style='medium', color='B0BEC5'),
-                    top=Side(style='thin', color='E0E0E0'),
-                    bottom=Side(style='thin', color='E0E0E0')
-                )
+        С executor блоки строятся в процессах-исполнителях, не более чем на
+        GROUP_EXPORT_LOOKAHEAD групп вперед, чтобы готовые части не копились в памяти.
+        """
+        if executor is None:
+            for group in groups:
+                yield self.iter_calendar_blocks(group['schedule'], group['start_year'], program_years, style_ids)
+            return
 
-                cell.border = thick_month_border_activity if is_last_col_of_month else thin_border
+        pending = deque()
+        for group in groups:
+            pending.append([executor.submit(render_calendar_block, group['start_year'] + academic_year,
+                                            3 + academic_year * 22, group['schedule'], style_ids)
+                            for academic_year in range(program_years)])
+            if len(pending) > GROUP_EXPORT_LOOKAHEAD:
+                yield [future.result() for future in pending.popleft()]
+        while pending:
+            yield [future.result() for future in pending.popleft()]
+
+    def save_excel_groups(self, groups, program_type, file, summary=None, occupancy=None, executor=None):
+        """Книга по группам: лист календаря на каждую группу, список групп и общие итоги.
+
+        groups — список словарей {'name', 'start_year', 'schedule', 'students'}.
+        Итоги по умолчанию — сумма итогов всех групп (ScheduleSummary.combined).
+        С occupancy (OccupancyIndex) добавляется лист кривой загрузки.
+        С executor (export_pool) листы групп строятся в процессах-исполнителях.
+        Стили общие для всех листов, листы групп пишутся в zip потоком по одному,
+        поэтому память не зависит от числа групп.
+        """
+        if not groups:
+            raise ValueError('Нет групп для экспорта')
 
-                if start_date <= date <= end_date:
-                    if self.is_holiday(date):
-                        cell.value = '*'
-                        cell.fill = holiday_fill
-                        cell.font = Font(name='Calibri', size=10, bold=True, color='D32F2F')
-                        cell.alignment = Alignment(horizontal='center', vertical='center')
-                    elif date.weekday() >= 5:
-                        cell.fill = weekend_fill
-                    else:
-                        activity_type = self.get_activity_for_date(date, generated_schedule)
-                        if activity_type and activity_type in activity_fills:
-                            cell.value = activity_type
+        program_years = 2 if "Ординатура" in program_type else 3
+
+        if summary is None:
+            summary = ScheduleSummary.combined(self.compute_summary(group['schedule']) for group in groups)
+        students = sum(group.get('students') or 0 for group in groups)
+
+        wb = self.load_excel_template(program_type, streaming=True)
+        wb["Условные обозначения"]['A1'] = f"КАЛЕНДАРНЫЙ УЧЕБНЫЙ ГРАФИК: {program_type}"
+        self.fill_summary_sheet(wb["Итоги"], summary, program_years, students, len(groups))
+
+        buffer = io.BytesIO()
+        wb.save(buffer)
+
+        sheet_names = self.group_sheet_names(groups)
+        # Лист календаря шаблона (sheet2) заменяется листами групп
+        sheets = [('Условные обозначения', 'xl/worksheets/sheet1.xml'), ('Итоги', 'xl/worksheets/sheet3.xml'),
+                  (GROUPS_SHEET_TITLE, GROUPS_SHEET_PATH)]
+        if occupancy is not None:
+            sheets.append((OCCUPANCY_SHEET_TITLE, OCCUPANCY_SHEET_PATH))
+        group_sheets = [(name, f'xl/worksheets/group{idx}.xml') for idx, name in enumerate(sheet_names, start=1)]
+        sheets += group_sheets
+
+        with zipfile.ZipFile(buffer) as source, \
+                zipfile.ZipFile(file, 'w', zipfile.ZIP_DEFLATED) as target:
+            style_ids = self.read_style_carriers(source.read(CALENDAR_SHEET_PATH))
+
+            package_parts = self.groups_package_parts(sheets)
+            for info in source.infolist():
+                if info.filename != CALENDAR_SHEET_PATH:
+                    target.writestr(info, package_parts.get(info.filename) or source.read(info.filename))
+
+            with target.open(GROUPS_SHEET_PATH, 'w') as f:
+                self.write_groups_list_xml(f, groups, sheet_names, style_ids)
+
+            if occupancy is not None:
+                with target.open(OCCUPANCY_SHEET_PATH, 'w') as f:
+                    self.write_occupancy_sheet_xml(f, occupancy, style_ids)
+
+            group_blocks = self.iter_group_blocks(groups, program_years, style_ids, executor)
+            for group, (name, part), blocks in zip(groups, group_sheets, group_blocks):
+                with target.open(part, 'w') as f:
+                    self.write_calendar_sheet_xml(f, group['start_year'], program_years, style_ids, blocks)
+
+    def package_segment(self, segments, used, key, build):
+        """Фрагмент пакета из прошлого экспорта по ключу входных данных или построенный заново"""
+        segment = segments.get(key)
+        if segment is None:
+            raw, extra = build()
+            segment = (raw, deflate_segment(raw), extra)
+        used[key] = segment
+        return segment
+
+    def package_entry(self, name, segments):
+        """Запись zip из фрагментов: CRC по исходным данным, сжатые фрагменты склеиваются"""
+        crc = 0
+        size = 0
+        for raw, compressed, extra in segments:
+            crc = zlib.crc32(raw, crc)
+            size += len(raw)
+        return name, crc, b''.join(segment[1] for segment in segments) + ZIP_DEFLATE_END, size
+
+    def save_excel_incremental(self, generated_schedule, start_year, program_type, file, summary=None):
+        """Потоковый экспорт, переиспользующий прошлый пакет.
+
+        Фрагменты (служебные части, условные обозначения, итоги, блоки учебных лет)
+        хранятся в сжатом виде под ключами из хэшей входных данных. Заново строятся
+        только фрагменты с изменившимися входными данными, остальные копируются
+        побайтно: сжатые фрагменты склеиваются без пересжатия.
+        """
+        program_years = 2 if "Ординатура" in program_type else 3
+
+        if summary is None:
+            summary = self.compute_summary(generated_schedule)
+
+        template_hash = hashlib.sha256(self.get_excel_template_bytes(program_type, streaming=True)).hexdigest()
+        cache = self.package_cache
+        if cache.get('template') != template_hash:
+            cache = {'template': template_hash, 'segments': {}}
+
+        segments = cache['segments']
+        used = {}
+        legend_key = ('legend', self.excel_title(start_year, program_years))
+        summary_key = ('summary', program_years, summary.fingerprint())
+
+        # Условные обозначения и итоги заполняются через openpyxl, только если изменились
+        if 'base' not in cache or legend_key not in segments or summary_key not in segments:
+            buffer = self.fill_streaming_template(start_year, program_type, summary)
+            with zipfile.ZipFile(buffer) as source:
+                cache['names'] = source.namelist()
+                cache['core'] = source.read('docProps/core.xml')
+                cache['style_ids'] = self.read_style_carriers(source.read(CALENDAR_SHEET_PATH))
+                cache['base'] = {}
+                for name in cache['names']:
+                    if name not in (CALENDAR_SHEET_PATH, 'docProps/core.xml'):
+                        raw = source.read(name)
+                        cache['base'][name] = (raw, deflate_segment(raw), None)
+                segments[legend_key] = cache['base'].pop('xl/worksheets/sheet1.xml')
+                segments[summary_key] = cache['base'].pop('xl/worksheets/sheet3.xml')
+
+        style_ids = cache['style_ids']
+        style_hash = hashlib.sha256(repr(tuple(style_ids.values())).encode('utf-8')).hexdigest()
+        holiday_hash = self.holiday_calendar.source_hash()
+        runs = schedule_runs(generated_schedule)
+        activity_index = None
+
+        block_segments = []
+        merges = [(1, 1, CALENDAR_LAST_COL)]
+        for academic_year in range(program_years):
+            actual_year = start_year + academic_year
+            start_row = 3 + academic_year * 22
+            first = datetime(actual_year, 9, 1).toordinal()
+            last = datetime(actual_year + 1, 8, 31).toordinal()
+
+            # Блок зависит только от занятий своего учебного года, праздников и номеров стилей
+            year_runs = tuple((max(run_first, first), min(run_last, last), activity_type)
+                              for run_first, run_last, activity_type in runs
+                              if run_first <= last and run_last >= first)
+            key = ('block', actual_year, start_row, style_hash, holiday_hash, year_runs)
+
+            if key not in segments and activity_index is None:
+                activity_index = self.build_activity_index(generated_schedule)
+
+            def build_block():
+                xml, block_merges = self.calendar_block_xml(actual_year, start_row, generated_schedule,
+                                                            style_ids, activity_index)
+                return xml.encode('utf-8'), block_merges
+
+            segment = self.package_segment(segments, used, key, build_block)
+            block_segments.append(segment)
+            merges += segment[2]
+
+        head = self.calendar_sheet_head(start_year, program_years, style_ids)
+        tail = self.calendar_sheet_tail(merges)
+        calendar_segments = [(head, deflate_segment(head), None)] + block_segments + \
+                            [(tail, deflate_segment(tail), None)]
+
+        now = datetime.now()
+        core = re.sub(rb'(<dcterms:modified[^>]*>)[^<]*', lambda match: match.group(1) + now.strftime(
+            '%Y-%m-%dT%H:%M:%SZ').encode('ascii'), cache['core'])
+
+        entries = []
+        for name in cache['names']:
+            if name == CALENDAR_SHEET_PATH:
+                entries.append(self.package_entry(name, calendar_segments))
+            elif name == 'docProps/core.xml':
+                entries.append(self.package_entry(name, [(core, deflate_segment(core), None)]))
+            elif name == 'xl/worksheets/sheet1.xml':
+                entries.append(self.package_entry(name, [self.package_segment(segments, used, legend_key, None)]))
+            elif name == 'xl/worksheets/sheet3.xml':
+                entries.append(self.package_entry(name, [self.package_segment(segments, used, summary_key, None)]))
+            else:
+                entries.append(self.package_entry(name, [cache['base'][name]]))
 
-                            month_key = (date.year, date.month)
-                            month_index = month_to_index.get(month_key, 0)
-                            is_bold = month_index % 2 == 0
+        # Хранится только то, что вошло в этот пакет
+        cache['segments'] = used
+        self.package_cache = cache
 
-                            cell.font = Font(name='Calibri', size=10, bold=is_bold, color='000000')
-                            cell.fill = activity_fills[activity_type]
-                            cell.alignment = Alignment(horizontal='center', vertical='center')
-                else:
-                    cell.value = ""
-                    cell.fill = PatternFill(start_color="FFFFFF", end_color="FFFFFF", fill_type="solid")
+        # Пакет за границей zip64 собирается обычным потоковым экспортом
+        package_size = sum(30 + len(name.encode('utf-8')) + len(compressed) for name, crc, compressed, size in entries)
+        if package_size >= ZIP_ENTRIES_LIMIT or len(entries) >= 0xFFFF \
+                or any(size >= ZIP_ENTRIES_LIMIT for name, crc, compressed, size in entries):
+            self.save_excel_streaming(generated_schedule, start_year, program_type, file, summary)
+            return
+
+        write_zip_entries(file, entries, now)
+
+    def write_excel(self, generated_schedule, start_year, program_type, stream, summary=None, streaming=False,
+                    diff=None, incremental=False):
+        """Записать книгу в любой двоичный поток, не касаясь диска"""
+        # Лист изменений в инкрементальный пакет не входит — такая книга собирается целиком
+        if incremental and diff is None:
+            self.save_excel_incremental(generated_schedule, start_year, program_type, stream, summary)
+        elif streaming:
+            self.save_excel_streaming(generated_schedule, start_year, program_type, stream, summary, diff)
+        else:
+            wb = self.create_excel_file(generated_schedule, start_year, program_type, summary, use_template=True,
+                                        diff=diff)
+            wb.save(stream)
+
+    def export_excel_bytes(self, generated_schedule, start_year, program_type, summary=None, streaming=False,
+                           diff=None):
+        """Книга целиком в памяти (bytes)"""
+        buffer = io.BytesIO()
+        self.write_excel(generated_schedule, start_year, program_type, buffer, summary, streaming, diff)
+        return buffer.getvalue()
+
+    def save_excel_atomic(self, generated_schedule, start_year, program_type, filename, summary=None,
+                          streaming=False, diff=None, incremental=False):
+        """Сохранить через временный файл и переименование: при сбое прежний файл не портится"""
+        self.save_file_atomic(filename, lambda f: self.write_excel(generated_schedule, start_year, program_type,
+                                                                   f, summary, streaming, diff, incremental))
+
+    def save_file_atomic(self, filename, write):
+        """Записать файл функцией write(поток) во временный файл рядом и переименовать"""
+        directory = os.path.dirname(os.path.abspath(filename))
+        suffix = os.path.splitext(filename)[1] + '.tmp'
+        fd, tmp_path = tempfile.mkstemp(prefix='.~', suffix=suffix, dir=directory)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                write(f)
+                f.flush()
+                os.fsync(f.fileno())
+
+            # mkstemp создает файл только для владельца; права как у обычного сохранения
+            umask = os.umask(0)
+            os.umask(umask)
+            os.chmod(tmp_path, 0o666 & ~umask)
+
+            os.replace(tmp_path, filename)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+
+    def iter_schedule_csv(self, groups):
+        """CSV по дням: строка на каждый рабочий день графика каждой группы"""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, delimiter=';', lineterminator='\r\n')
+        writer.writerow(['Группа', 'Дата', 'День', 'Курс', 'Семестр', 'Код', 'Вид деятельности'])
+        for group in groups:
+            for period in group['schedule']:
+                name = ACTIVITY_NAMES.get(period['type'], period['type'])
+                writer.writerows([group['name'], day.strftime('%Y-%m-%d'), DAYS_OF_WEEK[day.weekday()],
+                                  period['year'], period['semester'], period['type'], name]
+                                 for day in period['days'])
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+
+    def iter_schedule_json(self, groups):
+        """JSON-массив периодов: объект на каждый период, даты в ISO 8601"""
+        separator = '[\n'
+        for group in groups:
+            for period in group['schedule']:
+                record = {
+                    'group': group['name'],
+                    'start_year': group['start_year'],
+                    'year': period['year'],
+                    'semester': period['semester'],
+                    'type': period['type'],
+                    'name': ACTIVITY_NAMES.get(period['type'], period['type']),
+                    'weeks': period['weeks'],
+                    'start': period['start_date'].date().isoformat(),
+                    'end': period['end_date'].date().isoformat(),
+                    'days': len(period['days']),
+                }
+                yield separator + json.dumps(record, ensure_ascii=False)
+                separator = ',\n'
+        yield '[]\n' if separator == '[\n' else '\n]\n'
+
+    def iter_schedule_ics(self, groups):
+        """iCalendar: событие на весь день на каждый период с рабочими днями"""
+        stamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+        yield ''.join(ics_line(line) for line in (
+            'BEGIN:VCALENDAR', 'VERSION:2.0', 'PRODID:-//plan_app//Учебный график//RU', 'CALSCALE:GREGORIAN'))
+        for group in groups:
+            group_hash = hashlib.sha1(f"{group['name']}\0{group['start_year']}".encode('utf-8')).hexdigest()[:16]
+            for idx, period in enumerate(group['schedule']):
+                if not period['days']:
+                    continue
+                name = ACTIVITY_NAMES.get(period['type'], period['type'])
+                summary = f"{period['type']} — {name} ({group['name']})"
+                description = (f"Курс {period['year']}, семестр {period['semester']}, "
+                               f"{period['weeks']:g} нед., {len(period['days'])} раб. дн.")
+                yield ''.join(ics_line(line) for line in (
+                    'BEGIN:VEVENT',
+                    f'UID:{group_hash}-{idx}@plan_app',
+                    f'DTSTAMP:{stamp}',
+                    f"DTSTART;VALUE=DATE:{period['start_date']:%Y%m%d}",
+                    f"DTEND;VALUE=DATE:{period['end_date'] + timedelta(days=1):%Y%m%d}",
+                    f'SUMMARY:{ics_escape(summary)}',
+                    f'DESCRIPTION:{ics_escape(description)}',
+                    'END:VEVENT',
+                ))
+        yield ics_line('END:VCALENDAR')
+
+    def write_schedule_text(self, groups, stream, fmt):
+        """Записать графики групп в двоичный поток по частям: csv, json или ics.
+
+        groups — как в save_excel_groups: [{'name', 'start_year', 'schedule'}]; для наборов из
+        generate_cohorts — по группе на год начала. Память не зависит от числа групп.
+        """
+        chunks = {'csv': self.iter_schedule_csv, 'json': self.iter_schedule_json,
+                  'ics': self.iter_schedule_ics}[fmt](groups)
+        # CSV с BOM, чтобы Excel открыл кириллицу без мастера импорта
+        if fmt == 'csv':
+            stream.write(codecs.BOM_UTF8)
+        for chunk in chunks:
+            stream.write(chunk.encode('utf-8'))
+
+    def read_excel_periods(self, filename, work_week=WORK_WEEK_5):
+        """Периоды выгруженной книги: (год начала, лет обучения, [(курс, семестр, тип, начало, дней)]).
+
+        Книга открывается только для чтения, листы читаются построчно без загрузки целиком.
+        Дни берутся из строк «Занятия» календаря, границы семестров — из строки
+        «Продолжительность» листа итогов. У каникул после 31 августа начало неизвестно (None).
+        """
+        wb = load_workbook(filename, read_only=True)
+        try:
+            if 'Календарный график' not in wb.sheetnames or 'Итоги' not in wb.sheetnames:
+                raise ValueError(f'В книге нет листов графика: {filename}')
+
+            activity_days = {}
+            block_years = []
+            monday = title_row = None
+            for row_idx, values in enumerate(wb['Календарный график'].iter_rows(values_only=True), start=1):
+                first = values[0] if values else None
+                match = re.match(r'УЧЕБНЫЙ ГОД (\d{4})-', first) if isinstance(first, str) else None
+                if match:
+                    block_years.append(int(match.group(1)))
+                    monday = self.get_monday_of_week(datetime(block_years[-1], 9, 1))
+                    title_row = row_idx
+                    continue
+
+                # Строки занятий: 11-17 строки сетки, сетка на две строки ниже заголовка года
+                day_idx = row_idx - title_row - 13 if title_row is not None else -1
+                if not 0 <= day_idx < 7:
+                    continue
+                for week_idx, value in enumerate(values[1:]):
+                    if value in ACTIVITY_TYPES:
+                        activity_days[monday + timedelta(days=week_idx * 7 + day_idx)] = value
+
+            # Дни семестров и каникул по семестрам: строки в дн. на листе итогов
+            summary_rows = {kind if kind == 'total_days' else code: row
+                            for row, kind, symbol, name, code in self.iter_summary_rows()
+                            if kind == 'total_days' or (kind == 'days' and code == 'К')}
+            first_row, last_row = min(summary_rows.values()), max(summary_rows.values())
+            summary_values = dict(enumerate(wb['Итоги'].iter_rows(min_row=first_row, max_row=last_row,
+                                                                   values_only=True), start=first_row))
+        finally:
+            wb.close()
+
+        def semester_days(row):
+            values = summary_values.get(row, ())
+            result = []  # (курс, семестр, дней)
+            for year in range(1, len(block_years) + 1):
+                col_start = SUMMARY_COL_OFFSET + (year - 1) * 6
+                for semester, offset in ((1, 0), (2, 2)):
+                    idx = col_start + offset - 1
+                    match = re.match(r'(\d+) дн', str(values[idx] or '')) if idx < len(values) else None
+                    result.append((year, semester, int(match.group(1)) if match else 0))
+            return result
+
+        budgets = semester_days(summary_rows['total_days'])
+
+        if not activity_days or not any(count for *_, count in budgets):
+            raise ValueError(f'В книге нет выгруженного графика: {filename}')
+
+        start_year = block_years[0]
+        schedule_start = self.get_monday_of_week(datetime(start_year, 9, 1))
+        days = sorted(activity_days.items())
+
+        # Дни с понедельника до 1 сентября в календарь не попадают, но входят в первый период
+        hidden = [schedule_start + timedelta(days=i) for i in range((datetime(start_year, 9, 1) - schedule_start).days)]
+        days[:0] = [(date, days[0][1]) for date in hidden if self.is_working_day(date, work_week)]
+
+        bounds = list(accumulate(count for *_, count in budgets))
+        periods = []
+        semester_idx = 0
+        for position, (date, activity_type) in enumerate(days):
+            while semester_idx < len(budgets) - 1 and position >= bounds[semester_idx]:
+                semester_idx += 1
+            year, semester, _ = budgets[semester_idx]
+            if periods and periods[-1][:3] == [year, semester, activity_type]:
+                periods[-1][4] += 1
+            else:
+                periods.append([year, semester, activity_type, date, 1])
+
+        periods[0][3] = schedule_start
+
+        # Хвост последнего семестра после 31 августа в календарь не попадает: каникулы
+        # восстанавливаются по их длительности в итогах, остальное — продолжение последнего периода
+        missing = bounds[semester_idx] - len(days)
+        if missing > 0:
+            year, semester, _ = budgets[semester_idx]
+            vacation = semester_days(summary_rows['К'])[semester_idx][2]
+            vacation -= sum(period[4] for period in periods if period[:3] == [year, semester, 'К'])
+            vacation = min(max(vacation, 0), missing)
+            periods[-1][4] += missing - vacation
+            if vacation and periods[-1][2] == 'К':
+                periods[-1][4] += vacation
+            elif vacation:
+                periods.append([year, semester, 'К', None, vacation])
+
+        return start_year, len(block_years), [tuple(period) for period in periods]
+
+    def import_excel_schedule(self, filename, work_week=WORK_WEEK_5, activity_work_weeks=None):
+        """Строки periods_data, год начала и программа из выгруженной книги"""
+        if activity_work_weeks is None:
+            activity_work_weeks = ACTIVITY_WORK_WEEKS
+
+        start_year, program_years, periods = self.read_excel_periods(filename, work_week)
+
+        periods_data = []
+        for year, semester, activity_type, start, days in periods:
+            # Недели с округлением вверх до сотых: calculate_academic_weeks вернет те же дни
+            days_per_week = activity_work_weeks.get(activity_type, work_week).bit_count()
+            weeks = days // days_per_week if days % days_per_week == 0 else -(-days * 100 // days_per_week) / 100
+            periods_data.append({'Год': year, 'Семестр': semester, 'Тип': activity_type, 'Недели': weeks})
+
+        program_type = 'Ординатура (2 года)' if program_years == 2 else 'Аспирантура (3 года)'
+        return periods_data, start_year, program_type
+
+    def import_excel_archive(self, filenames, work_week=WORK_WEEK_5, activity_work_weeks=None):
+        """Импорт архива книг по одной: (файл, (строки, год, программа) или None, ошибка)"""
+        for filename in filenames:
+            try:
+                yield filename, self.import_excel_schedule(filename, work_week, activity_work_weeks), None
+            except (OSError, ValueError, KeyError, zipfile.BadZipFile, InvalidFileException) as e:
+                yield filename, None, str(e)
+
+    def parse_periods_text(self, text):
+        """Строки periods_data из CSV или вставки из таблицы: Год;Семестр;Тип;Недели.
+
+        Разделитель — табуляция, точка с запятой или запятая; строка заголовка пропускается.
+        Проверки выполняются по столбцам целиком: (строки, [(номер строки, ошибка)]).
+        """
+        lines = text.splitlines()
+        sample = next((line for line in lines if line.strip()), '')
+        delimiter = '\t' if '\t' in sample else ';' if ';' in sample else ','
+
+        numbers, records = [], []
+        for number, record in enumerate(csv.reader(lines, delimiter=delimiter), start=1):
+            record = [value.strip() for value in record]
+            if not any(record) or (not records and record[0] == 'Год'):
+                continue
+            numbers.append(number)
+            records.append((record + [''] * 4)[:4])
+
+        years, semesters, types, weeks_text = zip(*records) if records else ((), (), (), ())
+
+        def number(value):
+            try:
+                return float(value.replace(',', '.'))
+            except ValueError:
+                return None
+
+        weeks = [number(value) for value in weeks_text]
+        checks = (
+            ([value not in ('1', '2', '3') for value in years], 'Год должен быть от 1 до 3'),
+            ([value not in ('1', '2') for value in semesters], 'Семестр должен быть 1 или 2'),
+            ([value not in ACTIVITY_TYPES for value in types], 'Неизвестный тип'),
+            ([value is None for value in weeks], 'Количество недель должно быть числом'),
+            ([value is not None and value < 0 for value in weeks], 'Количество недель не может быть отрицательным'),
+            ([value is not None and value > 53 for value in weeks], 'Количество недель не может превышать 53'),
+        )
+        errors = sorted(((numbers[idx], message) for mask, message in checks
+                         for idx in compress(range(len(records)), mask)), key=lambda error: error[0])
+        if errors:
+            return [], errors
+
+        periods_data = [{'Год': int(year), 'Семестр': int(semester), 'Тип': activity_type, 'Недели': value}
+                        for year, semester, activity_type, value in zip(years, semesters, types, weeks)]
+        return periods_data, []
+
+    def read_periods_csv(self, filename):
+        """Строки periods_data из CSV-файла (UTF-8 или выгрузка Excel в cp1251)"""
+        with open(filename, 'rb') as f:
+            data = f.read()
+        try:
+            text = data.decode('utf-8-sig')
+        except UnicodeDecodeError:
+            text = data.decode('cp1251')
+        return self.parse_periods_text(text)
+
+    def diff_schedules(self, old_schedule, new_schedule):
+        """Сравнить две версии графика: периоды и отрезки дней со сменой занятия"""
+        diff = ScheduleDiff()
+
+        def keyed(generated_schedule):
+            # Периоды сопоставляются по (курс, семестр, тип, номер повтора в семестре)
+            counts = {}
+            periods = {}
+            for period in generated_schedule:
+                base = (period['year'], period['semester'], period['type'])
+                counts[base] = counts.get(base, 0) + 1
+                periods[base + (counts[base],)] = period
+            return periods
+
+        old_periods = keyed(old_schedule)
+        new_periods = keyed(new_schedule)
+
+        for key, period in new_periods.items():
+            previous = old_periods.get(key)
+            if previous is None:
+                diff.added.append(period)
+            elif (previous['start_date'], previous['end_date'], len(previous['days'])) != \
+                    (period['start_date'], period['end_date'], len(period['days'])):
+                diff.shifted.append((previous, period))
+        diff.removed = [period for key, period in old_periods.items() if key not in new_periods]
+
+        # Слияние упорядоченных отрезков двух версий по границам, без перебора дней
+        old_runs = sorted(schedule_runs(old_schedule))
+        new_runs = sorted(schedule_runs(new_schedule))
+        points = sorted({first for first, last, activity_type in old_runs + new_runs} |
+                        {last + 1 for first, last, activity_type in old_runs + new_runs})
+
+        def type_at(runs, pos, ordinal):
+            while pos < len(runs) and runs[pos][1] < ordinal:
+                pos += 1
+            if pos < len(runs) and runs[pos][0] <= ordinal:
+                return pos, runs[pos][2]
+            return pos, None
+
+        ranges = []
+        old_pos = new_pos = 0
+        mergeable = False  # между прошлым изменением и текущим были только дни без занятий
+        for start, end in zip(points, points[1:]):
+            old_pos, old_type = type_at(old_runs, old_pos, start)
+            new_pos, new_type = type_at(new_runs, new_pos, start)
+
+            if old_type == new_type:
+                if old_type is not None:
+                    mergeable = False
+                continue
+
+            diff.changed_days += end - start
+            if mergeable and ranges[-1][2:4] == [old_type, new_type]:
+                ranges[-1][1] = end - 1
+                ranges[-1][4] += end - start
+            else:
+                ranges.append([start, end - 1, old_type, new_type, end - start])
+            mergeable = True
+
+        diff.changed_ranges = [(datetime.fromordinal(first), datetime.fromordinal(last), old_type, new_type, days)
+                               for first, last, old_type, new_type, days in ranges]
+        return diff
+
+    def add_diff_sheet(self, wb, diff):
+        """Лист «Изменения»: периоды и отрезки дней с подсветкой"""
+        styles = self.create_excel_styles()
+        ws = wb.create_sheet("Изменения")
+
+        status_fills = {
+            'Добавлен': PatternFill(start_color="C8E6C9", end_color="C8E6C9", fill_type="solid"),
+            'Удален': PatternFill(start_color="FFCDD2", end_color="FFCDD2", fill_type="solid"),
+            'Сдвинут': PatternFill(start_color="FFF59D", end_color="FFF59D", fill_type="solid"),
+        }
+
+        def span(period):
+            if period is None:
+                return ''
+            return f"{period['start_date']:%d.%m.%Y}–{period['end_date']:%d.%m.%Y} ({len(period['days'])} дн)"
 
-            ws.row_dimensions[current_row].height = 18
+        def header(row, titles):
+            for col, text in enumerate(titles, start=1):
+                cell = ws.cell(row=row, column=col, value=text)
+                cell.font = styles['header_font']
+                cell.fill = styles['header_fill']
+                cell.alignment = Alignment(horizontal='center', vertical='center')
+                cell.border = styles['thin_border']
+
+        ws['A1'] = 'ИЗМЕНЕНИЯ ГРАФИКА'
+        ws['A1'].font = styles['title_font']
+        ws.row_dimensions[1].height = 30
+
+        header(3, ['Статус', 'Курс', 'Семестр', 'Тип', 'Было', 'Стало'])
+        rows = [('Добавлен', period, None, period) for period in diff.added]
+        rows += [('Удален', period, period, None) for period in diff.removed]
+        rows += [('Сдвинут', new, old, new) for old, new in diff.shifted]
+
+        current_row = 4
+        for status, period, old, new in rows:
+            values = [status, period['year'], period['semester'], period['type'], span(old), span(new)]
+            for col, value in enumerate(values, start=1):
+                cell = ws.cell(row=current_row, column=col, value=value)
+                cell.fill = status_fills[status]
+                cell.font = styles['data_font']
+                cell.border = styles['thin_border']
             current_row += 1
 
-        return current_row
+        current_row += 1
+        header(current_row, ['С', 'По', 'Было', 'Стало', 'Рабочих дней'])
+        current_row += 1
+
+        for first, last, old_type, new_type, days in diff.changed_ranges:
+            values = [first.strftime('%d.%m.%Y'), last.strftime('%d.%m.%Y'), old_type or '', new_type or '', days]
+            for col, value in enumerate(values, start=1):
+                cell = ws.cell(row=current_row, column=col, value=value)
+                cell.font = styles['data_font']
+                cell.border = styles['thin_border']
+                cell.alignment = Alignment(horizontal='center', vertical='center')
+            for col, activity_type in ((3, old_type), (4, new_type)):
+                if activity_type in styles['activity_fills']:
+                    ws.cell(row=current_row, column=col).fill = styles['activity_fills'][activity_type]
+            current_row += 1
+
+        ws.column_dimensions['A'].width = 14
+        for col in 'BCD':
+            ws.column_dimensions[col].width = 12
+        for col in 'EF':
+            ws.column_dimensions[col].width = 34
 
     def get_activity_for_date(self, date, generated_schedule):
         """Получить тип занятия для даты"""
@@ -480,23 +3067,9 @@ class EducationalScheduleApp:
                 return period['type']
         return None
 
-    def create_beautiful_summary_sheet(self, wb, generated_schedule, start_year, program_type):
-        """Создать итоговую таблицу точно как в примере"""
-        ws = wb.create_sheet("Итоги")
-
-        program_years = 2 if "Ординатура" in program_type else 3
-
-        # Стили
-        title_font = Font(name='Calibri', size=12, bold=True, color='1976D2')
-        header_font = Font(name='Calibri', size=11, bold=True, color='FFFFFF')
-        bold_font = Font(name='Calibri', size=10, bold=True, color='000000')
-        data_font = Font(name='Calibri', size=10, color='000000')
-
-        header_fill = PatternFill(start_color="92CDDC", end_color="92CDDC", fill_type="solid")
-
-        # Собираем статистику
-        stats = {}
-        holidays_count = {}  # Подсчет праздничных дней
+    def compute_summary(self, generated_schedule):
+        """Собрать статистику по графику за один проход"""
+        summary = ScheduleSummary()
 
         for period in generated_schedule:
             year = period['year']
@@ -506,32 +3079,94 @@ class EducationalScheduleApp:
             days = len(period['days'])
 
             key = (year, semester)
-            if key not in stats:
-                stats[key] = {}
-                holidays_count[key] = 0
+            if key not in summary.stats:
+                summary.stats[key] = {}
+                summary.holidays_count[key] = 0
+                summary.semester_weeks[key] = 0
+                summary.semester_days[key] = 0
+
+            stats = summary.stats[key]
 
             # Подсчет праздничных дней
             for day in period['days']:
                 if self.is_holiday(day):
-                    holidays_count[key] += 1
+                    summary.holidays_count[key] += 1
+
+            summary.semester_weeks[key] += weeks
+            summary.semester_days[key] += days
+            summary.period_count += 1
+            summary.total_weeks += weeks
+            summary.total_days += days
 
             # Обработка ГИА
             if activity_type == 'ГИА':
-                if 'Г' not in stats[key]:
-                    stats[key]['Г'] = {'weeks': 0, 'days': 0}
-                if 'Д' not in stats[key]:
-                    stats[key]['Д'] = {'weeks': 0, 'days': 0}
-                stats[key]['Г']['weeks'] += weeks / 2
-                stats[key]['Г']['days'] += days // 2
-                stats[key]['Д']['weeks'] += weeks / 2
-                stats[key]['Д']['days'] += days - (days // 2)
+                if 'Г' not in stats:
+                    stats['Г'] = {'weeks': 0, 'days': 0}
+                if 'Д' not in stats:
+                    stats['Д'] = {'weeks': 0, 'days': 0}
+                stats['Г']['weeks'] += weeks / 2
+                stats['Г']['days'] += days // 2
+                stats['Д']['weeks'] += weeks / 2
+                stats['Д']['days'] += days - (days // 2)
                 continue
 
-            if activity_type not in stats[key]:
-                stats[key][activity_type] = {'weeks': 0, 'days': 0}
+            if activity_type not in stats:
+                stats[activity_type] = {'weeks': 0, 'days': 0}
 
-            stats[key][activity_type]['weeks'] += weeks
-            stats[key][activity_type]['days'] += days
+            stats[activity_type]['weeks'] += weeks
+            stats[activity_type]['days'] += days
+
+        return summary
+
+    def iter_summary_rows(self):
+        """Строки листа итогов: (строка, вид, символ, название, код)"""
+        current_row = 6
+
+        for symbol, name, code in SUMMARY_ACTIVITY_TYPES:
+            yield current_row, 'weeks', symbol, name, code
+            current_row += 1
+
+            # Дополнительная строка для экзаменов (дни)
+            if code == 'Э':
+                yield current_row, 'days', symbol, name, code
+                current_row += 1
+            # Дополнительная строка для каникул (Продолжительность каникул)
+            elif code == 'К':
+                yield current_row, 'days', symbol, 'Продолжительность каникул', code
+                current_row += 1
+
+            # Строка "в том числе ДО"
+            yield current_row, 'note', '', 'в том числе ДО', None
+            current_row += 1
+
+        # Пустая строка
+        current_row += 1
+
+        yield current_row, 'duration', 'Продолжительность обучения ', None, None
+        current_row += 1
+        yield current_row, 'total_weeks', ' Итого', None, None
+        current_row += 1
+        yield current_row, 'total_days', ' Продолжительность', None, None
+        current_row += 1
+        yield current_row, 'leap', ' Високосный год', None, None
+        current_row += 1
+        yield current_row, 'students', ' Студентов', None, None
+        current_row += 1
+
+        # Пустые строки
+        current_row += 3
+
+        yield current_row, 'groups', ' Групп', None, None
+
+    def create_summary_layout(self, ws, program_years):
+        """Статическая часть листа итогов: заголовки, подписи, объединения"""
+        # Стили
+        title_font = Font(name='Calibri', size=12, bold=True, color='1976D2')
+        header_font = Font(name='Calibri', size=11, bold=True, color='FFFFFF')
+        bold_font = Font(name='Calibri', size=10, bold=True, color='000000')
+        data_font = Font(name='Calibri', size=10, color='000000')
+
+        header_fill = PatternFill(start_color="92CDDC", end_color="92CDDC", fill_type="solid")
 
         current_row = 1
 
@@ -546,7 +3181,7 @@ class EducationalScheduleApp:
         current_row += 1
 
         # ===== СТРОКА С КУРСАМИ =====
-        col_offset = 4  # ПРИБЛИЖАЕМ К НАЗВАНИЯМ! Колонка D вместо O
+        col_offset = SUMMARY_COL_OFFSET
 
         for year in range(1, program_years + 1):
             col_start = col_offset + (year - 1) * 6
@@ -565,388 +3200,65 @@ class EducationalScheduleApp:
             col_start = col_offset + (year - 1) * 6
             sem_base = (year - 1) * 2
 
-            # Сем. X
-            col1 = col_start
-            col2 = col_start + 1
-            ws.merge_cells(f'{get_column_letter(col1)}{current_row}:{get_column_letter(col2)}{current_row}')
-            cell = ws[f'{get_column_letter(col1)}{current_row}']
-            cell.value = f'Сем. {sem_base + 1}'
-            cell.font = header_font
-            cell.fill = header_fill
-            cell.alignment = Alignment(horizontal='center', vertical='center')
-
-            # Сем. Y
-            col1 = col_start + 2
-            col2 = col_start + 3
-            ws.merge_cells(f'{get_column_letter(col1)}{current_row}:{get_column_letter(col2)}{current_row}')
-            cell = ws[f'{get_column_letter(col1)}{current_row}']
-            cell.value = f'Сем. {sem_base + 2}'
-            cell.font = header_font
-            cell.fill = header_fill
-            cell.alignment = Alignment(horizontal='center', vertical='center')
-
-            # Всего
-            col1 = col_start + 4
-            col2 = col_start + 5
-            ws.merge_cells(f'{get_column_letter(col1)}{current_row}:{get_column_letter(col2)}{current_row}')
-            cell = ws[f'{get_column_letter(col1)}{current_row}']
-            cell.value = 'Всего'
-            cell.font = header_font
-            cell.fill = header_fill
-            cell.alignment = Alignment(horizontal='center', vertical='center')
-
-        current_row += 1
-
-        # ===== ДАННЫЕ =====
-        def format_weeks(weeks):
-            if weeks < 0.01:
-                return ''
-            whole = int(weeks)
-            fraction = weeks - whole
-            if fraction < 0.01:
-                return str(whole) if whole > 0 else ''
-            sixths = round(fraction * 6)
-            if sixths == 0:
-                return str(whole) if whole > 0 else ''
-            elif sixths == 6:
-                return str(whole + 1)
-            else:
-                return f'{whole} {sixths}/6' if whole > 0 else f'{sixths}/6'
-
-        # Список типов деятельности в правильном порядке
-        activity_types = [
-            ('', 'Теоретическое обучение', 'Т'),
-            ('Э', 'Экзаменационные сессии', 'Э'),
-            ('У', 'Учебная практика', 'У'),
-            ('Н', 'Научно-исслед. работа', 'Н'),
-            ('П', 'Производственная практика', 'П'),
-            ('Пд', 'Преддипломная практика', 'Пд'),
-            ('ПА', 'Повторная, вторая повторная промежуточная аттестация', 'ПА'),
-            ('Д', 'Подготовка к процедуре защиты и защита выпускной квалификационной работы', 'Д'),
-            ('Г', 'Подготовка к сдаче и сдача гос. экзамена', 'Г'),
-            ('К', 'Каникулы', 'К'),
-            ('*', 'Нерабочие праздничные дни (не включая воскресенья)', '*'),
-        ]
-
-        for symbol, name, code in activity_types:
-            # Символ (колонка A)
-            ws[f'A{current_row}'] = symbol
-            ws[f'A{current_row}'].font = bold_font
-            ws[f'A{current_row}'].alignment = Alignment(horizontal='center', vertical='center')
-
-            # Название (колонка B)
-            ws[f'B{current_row}'] = name
-            ws[f'B{current_row}'].font = data_font
-            ws[f'B{current_row}'].alignment = Alignment(horizontal='left', vertical='center')
-
-            # Данные
-            for year in range(1, program_years + 1):
-                col_start = col_offset + (year - 1) * 6
-
-                # Семестр 1
-                key = (year, 1)
-                sem1_weeks = 0
-                sem1_days = 0
-                if code == '*':
-                    sem1_days = holidays_count.get(key, 0)
-                elif key in stats and code in stats[key]:
-                    sem1_weeks = stats[key][code]['weeks']
-                    sem1_days = stats[key][code]['days']
-
-                col1 = col_start
-                col2 = col_start + 1
+            for offset, text in ((0, f'Сем. {sem_base + 1}'), (2, f'Сем. {sem_base + 2}'), (4, 'Всего')):
+                col1 = col_start + offset
+                col2 = col1 + 1
                 ws.merge_cells(f'{get_column_letter(col1)}{current_row}:{get_column_letter(col2)}{current_row}')
                 cell = ws[f'{get_column_letter(col1)}{current_row}']
-                if code == '*':
-                    cell.value = f'{sem1_days} дн' if sem1_days > 0 else ''
-                else:
-                    cell.value = format_weeks(sem1_weeks)
-                cell.font = data_font
+                cell.value = text
+                cell.font = header_font
+                cell.fill = header_fill
                 cell.alignment = Alignment(horizontal='center', vertical='center')
 
-                # Семестр 2
-                key = (year, 2)
-                sem2_weeks = 0
-                sem2_days = 0
-                if code == '*':
-                    sem2_days = holidays_count.get(key, 0)
-                elif key in stats and code in stats[key]:
-                    sem2_weeks = stats[key][code]['weeks']
-                    sem2_days = stats[key][code]['days']
-
-                col1 = col_start + 2
-                col2 = col_start + 3
-                ws.merge_cells(f'{get_column_letter(col1)}{current_row}:{get_column_letter(col2)}{current_row}')
-                cell = ws[f'{get_column_letter(col1)}{current_row}']
-                if code == '*':
-                    cell.value = f'{sem2_days} дн' if sem2_days > 0 else ''
-                else:
-                    cell.value = format_weeks(sem2_weeks)
-                cell.font = data_font
-                cell.alignment = Alignment(horizontal='center', vertical='center')
-
-                # Всего за год
-                year_total_weeks = sem1_weeks + sem2_weeks
-                year_total_days = sem1_days + sem2_days
-                col1 = col_start + 4
-                col2 = col_start + 5
-                ws.merge_cells(f'{get_column_letter(col1)}{current_row}:{get_column_letter(col2)}{current_row}')
-                cell = ws[f'{get_column_letter(col1)}{current_row}']
-                if code == '*':
-                    cell.value = f'{year_total_days} дн' if year_total_days > 0 else ''
-                else:
-                    cell.value = format_weeks(year_total_weeks)
-                cell.font = data_font
-                cell.alignment = Alignment(horizontal='center', vertical='center')
-
-            ws.row_dimensions[current_row].height = 25
-            current_row += 1
-
-            # Дополнительная строка для экзаменов (дни)
-            if code == 'Э':
+        # ===== ДАННЫЕ =====
+        for current_row, kind, symbol, name, code in self.iter_summary_rows():
+            if kind in ('weeks', 'days'):
+                # Символ (колонка A)
                 ws[f'A{current_row}'] = symbol
                 ws[f'A{current_row}'].font = bold_font
                 ws[f'A{current_row}'].alignment = Alignment(horizontal='center', vertical='center')
 
+                # Название (колонка B)
                 ws[f'B{current_row}'] = name
                 ws[f'B{current_row}'].font = data_font
                 ws[f'B{current_row}'].alignment = Alignment(horizontal='left', vertical='center')
 
-                for year in range(1, program_years + 1):
-                    col_start = col_offset + (year - 1) * 6
-
-                    # Сем 1 дни
-                    key = (year, 1)
-                    days1 = stats[key][code]['days'] if key in stats and code in stats[key] else 0
-                    col1 = col_start
-                    col2 = col_start + 1
-                    ws.merge_cells(f'{get_column_letter(col1)}{current_row}:{get_column_letter(col2)}{current_row}')
-                    cell = ws[f'{get_column_letter(col1)}{current_row}']
-                    cell.value = f'{days1} дн' if days1 > 0 else ''
-                    cell.font = data_font
-                    cell.alignment = Alignment(horizontal='center', vertical='center')
-
-                    # Сем 2 дни
-                    key = (year, 2)
-                    days2 = stats[key][code]['days'] if key in stats and code in stats[key] else 0
-                    col1 = col_start + 2
-                    col2 = col_start + 3
-                    ws.merge_cells(f'{get_column_letter(col1)}{current_row}:{get_column_letter(col2)}{current_row}')
-                    cell = ws[f'{get_column_letter(col1)}{current_row}']
-                    cell.value = f'{days2} дн' if days2 > 0 else ''
-                    cell.font = data_font
-                    cell.alignment = Alignment(horizontal='center', vertical='center')
-
-                    # Всего дней
-                    total_days = days1 + days2
-                    col1 = col_start + 4
-                    col2 = col_start + 5
-                    ws.merge_cells(f'{get_column_letter(col1)}{current_row}:{get_column_letter(col2)}{current_row}')
-                    cell = ws[f'{get_column_letter(col1)}{current_row}']
-                    cell.value = f'{total_days} дн' if total_days > 0 else ''
-                    cell.font = data_font
-                    cell.alignment = Alignment(horizontal='center', vertical='center')
-
                 ws.row_dimensions[current_row].height = 25
-                current_row += 1
-
-            # Дополнительная строка для каникул (Продолжительность каникул)
-            elif code == 'К':
-                ws[f'A{current_row}'] = symbol
-                ws[f'A{current_row}'].font = bold_font
-                ws[f'A{current_row}'].alignment = Alignment(horizontal='center', vertical='center')
-
-                ws[f'B{current_row}'] = 'Продолжительность каникул'
+            elif kind == 'note':
+                ws[f'B{current_row}'] = name
                 ws[f'B{current_row}'].font = data_font
                 ws[f'B{current_row}'].alignment = Alignment(horizontal='left', vertical='center')
+                continue
+            else:
+                ws[f'A{current_row}'] = symbol
+                ws[f'A{current_row}'].font = bold_font
 
-                for year in range(1, program_years + 1):
-                    col_start = col_offset + (year - 1) * 6
+            if kind in ('students', 'groups'):
+                continue
 
-                    # Сем 1 дни
-                    key = (year, 1)
-                    days1 = stats[key][code]['days'] if key in stats and code in stats[key] else 0
-                    col1 = col_start
-                    col2 = col_start + 1
-                    ws.merge_cells(f'{get_column_letter(col1)}{current_row}:{get_column_letter(col2)}{current_row}')
-                    cell = ws[f'{get_column_letter(col1)}{current_row}']
-                    cell.value = f'{days1} дн' if days1 > 0 else ''
-                    cell.font = data_font
-                    cell.alignment = Alignment(horizontal='center', vertical='center')
+            for year in range(1, program_years + 1):
+                col_start = col_offset + (year - 1) * 6
 
-                    # Сем 2 дни
-                    key = (year, 2)
-                    days2 = stats[key][code]['days'] if key in stats and code in stats[key] else 0
-                    col1 = col_start + 2
-                    col2 = col_start + 3
-                    ws.merge_cells(f'{get_column_letter(col1)}{current_row}:{get_column_letter(col2)}{current_row}')
-                    cell = ws[f'{get_column_letter(col1)}{current_row}']
-                    cell.value = f'{days2} дн' if days2 > 0 else ''
+                # Значение на весь курс
+                if kind in ('duration', 'leap'):
+                    col_end = col_start + 5
+                    ws.merge_cells(
+                        f'{get_column_letter(col_start)}{current_row}:{get_column_letter(col_end)}{current_row}')
+                    cell = ws[f'{get_column_letter(col_start)}{current_row}']
+                    cell.value = 'более 39 нед.' if kind == 'duration' else '-'
                     cell.font = data_font
                     cell.alignment = Alignment(horizontal='center', vertical='center')
+                    continue
 
-                    # Всего дней
-                    total_days = days1 + days2
-                    col1 = col_start + 4
-                    col2 = col_start + 5
+                # Сем. 1, Сем. 2, Всего
+                for offset in (0, 2, 4):
+                    col1 = col_start + offset
+                    col2 = col1 + 1
                     ws.merge_cells(f'{get_column_letter(col1)}{current_row}:{get_column_letter(col2)}{current_row}')
                     cell = ws[f'{get_column_letter(col1)}{current_row}']
-                    cell.value = f'{total_days} дн' if total_days > 0 else ''
-                    cell.font = data_font
+                    cell.font = bold_font if kind in ('total_weeks', 'total_days') else data_font
                     cell.alignment = Alignment(horizontal='center', vertical='center')
 
-                ws.row_dimensions[current_row].height = 25
-                current_row += 1
-
-            # Строка "в том числе ДО"
-            ws[f'B{current_row}'] = 'в том числе ДО'
-            ws[f'B{current_row}'].font = data_font
-            ws[f'B{current_row}'].alignment = Alignment(horizontal='left', vertical='center')
-            current_row += 1
-
-        # ===== ПУСТАЯ СТРОКА =====
-        current_row += 1
-
-        # ===== ПРОДОЛЖИТЕЛЬНОСТЬ ОБУЧЕНИЯ =====
-        ws[f'A{current_row}'] = 'Продолжительность обучения '
-        ws[f'A{current_row}'].font = bold_font
-
-        for year in range(1, program_years + 1):
-            col_start = col_offset + (year - 1) * 6
-            col_end = col_start + 5
-            ws.merge_cells(f'{get_column_letter(col_start)}{current_row}:{get_column_letter(col_end)}{current_row}')
-            cell = ws[f'{get_column_letter(col_start)}{current_row}']
-            cell.value = 'более 39 нед.'
-            cell.font = data_font
-            cell.alignment = Alignment(horizontal='center', vertical='center')
-
-        current_row += 1
-
-        # ===== ИТОГО =====
-        ws[f'A{current_row}'] = ' Итого'
-        ws[f'A{current_row}'].font = bold_font
-
-        for year in range(1, program_years + 1):
-            col_start = col_offset + (year - 1) * 6
-
-            # Сем 1
-            key = (year, 1)
-            sem1_total = 0
-            if key in stats:
-                for act_type in stats[key]:
-                    sem1_total += stats[key][act_type]['weeks']
-
-            col1 = col_start
-            col2 = col_start + 1
-            ws.merge_cells(f'{get_column_letter(col1)}{current_row}:{get_column_letter(col2)}{current_row}')
-            cell = ws[f'{get_column_letter(col1)}{current_row}']
-            cell.value = format_weeks(sem1_total)
-            cell.font = bold_font
-            cell.alignment = Alignment(horizontal='center', vertical='center')
-
-            # Сем 2
-            key = (year, 2)
-            sem2_total = 0
-            if key in stats:
-                for act_type in stats[key]:
-                    sem2_total += stats[key][act_type]['weeks']
-
-            col1 = col_start + 2
-            col2 = col_start + 3
-            ws.merge_cells(f'{get_column_letter(col1)}{current_row}:{get_column_letter(col2)}{current_row}')
-            cell = ws[f'{get_column_letter(col1)}{current_row}']
-            cell.value = format_weeks(sem2_total)
-            cell.font = bold_font
-            cell.alignment = Alignment(horizontal='center', vertical='center')
-
-            # Всего
-            year_total = sem1_total + sem2_total
-            col1 = col_start + 4
-            col2 = col_start + 5
-            ws.merge_cells(f'{get_column_letter(col1)}{current_row}:{get_column_letter(col2)}{current_row}')
-            cell = ws[f'{get_column_letter(col1)}{current_row}']
-            cell.value = format_weeks(year_total)
-            cell.font = bold_font
-            cell.alignment = Alignment(horizontal='center', vertical='center')
-
-        current_row += 1
-
-        # ===== ПРОДОЛЖИТЕЛЬНОСТЬ =====
-        ws[f'A{current_row}'] = ' Продолжительность'
-        ws[f'A{current_row}'].font = bold_font
-
-        for year in range(1, program_years + 1):
-            col_start = col_offset + (year - 1) * 6
-
-            # Сем 1
-            key = (year, 1)
-            sem1_days = 0
-            if key in stats:
-                for act_type in stats[key]:
-                    sem1_days += stats[key][act_type]['days']
-
-            col1 = col_start
-            col2 = col_start + 1
-            ws.merge_cells(f'{get_column_letter(col1)}{current_row}:{get_column_letter(col2)}{current_row}')
-            cell = ws[f'{get_column_letter(col1)}{current_row}']
-            cell.value = f'{sem1_days} дн' if sem1_days > 0 else ''
-            cell.font = bold_font
-            cell.alignment = Alignment(horizontal='center', vertical='center')
-
-            # Сем 2
-            key = (year, 2)
-            sem2_days = 0
-            if key in stats:
-                for act_type in stats[key]:
-                    sem2_days += stats[key][act_type]['days']
-
-            col1 = col_start + 2
-            col2 = col_start + 3
-            ws.merge_cells(f'{get_column_letter(col1)}{current_row}:{get_column_letter(col2)}{current_row}')
-            cell = ws[f'{get_column_letter(col1)}{current_row}']
-            cell.value = f'{sem2_days} дн' if sem2_days > 0 else ''
-            cell.font = bold_font
-            cell.alignment = Alignment(horizontal='center', vertical='center')
-
-            # Всего
-            year_days = sem1_days + sem2_days
-            col1 = col_start + 4
-            col2 = col_start + 5
-            ws.merge_cells(f'{get_column_letter(col1)}{current_row}:{get_column_letter(col2)}{current_row}')
-            cell = ws[f'{get_column_letter(col1)}{current_row}']
-            cell.value = f'{year_days} дн' if year_days > 0 else ''
-            cell.font = bold_font
-            cell.alignment = Alignment(horizontal='center', vertical='center')
-
-        current_row += 1
-
-        # ===== ВИСОКОСНЫЙ ГОД =====
-        ws[f'A{current_row}'] = ' Високосный год'
-        ws[f'A{current_row}'].font = bold_font
-
-        for year in range(1, program_years + 1):
-            col_start = col_offset + (year - 1) * 6
-            col_end = col_start + 5
-            ws.merge_cells(f'{get_column_letter(col_start)}{current_row}:{get_column_letter(col_end)}{current_row}')
-            cell = ws[f'{get_column_letter(col_start)}{current_row}']
-            cell.value = '-'
-            cell.font = data_font
-            cell.alignment = Alignment(horizontal='center', vertical='center')
-
-        current_row += 1
-
-        # ===== СТУДЕНТОВ =====
-        ws[f'A{current_row}'] = ' Студентов'
-        ws[f'A{current_row}'].font = bold_font
-        current_row += 1
-
-        # Пустые строки
-        current_row += 3
-
-        # ===== ГРУПП =====
-        ws[f'A{current_row}'] = ' Групп'
-        ws[f'A{current_row}'].font = bold_font
-
         # Настройка ширины колонок
         ws.column_dimensions['A'].width = 5
         ws.column_dimensions['B'].width = 70
@@ -954,19 +3266,650 @@ class EducationalScheduleApp:
         for col_idx in range(4, 30):
             ws.column_dimensions[get_column_letter(col_idx)].width = 10
 
+    def fill_summary_sheet(self, ws, summary, program_years, students=None, groups=None):
+        """Записать итоги в подготовленный лист"""
+        def format_days(days):
+            return f'{days} дн' if days > 0 else ''
+
+        for current_row, kind, symbol, name, code in self.iter_summary_rows():
+            # Численность заполняется только для книги по группам
+            if kind == 'students' and students is not None:
+                ws.cell(row=current_row, column=SUMMARY_COL_OFFSET).value = students
+            elif kind == 'groups' and groups is not None:
+                ws.cell(row=current_row, column=SUMMARY_COL_OFFSET).value = groups
+
+            if kind not in ('weeks', 'days', 'total_weeks', 'total_days'):
+                continue
+
+            for year in range(1, program_years + 1):
+                col_start = SUMMARY_COL_OFFSET + (year - 1) * 6
+
+                if kind == 'total_weeks':
+                    sem1 = summary.semester_weeks.get((year, 1), 0)
+                    sem2 = summary.semester_weeks.get((year, 2), 0)
+                    values = [format_weeks(sem1), format_weeks(sem2), format_weeks(sem1 + sem2)]
+                elif kind == 'total_days':
+                    sem1 = summary.semester_days.get((year, 1), 0)
+                    sem2 = summary.semester_days.get((year, 2), 0)
+                    values = [format_days(sem1), format_days(sem2), format_days(sem1 + sem2)]
+                elif kind == 'days':
+                    sem1 = summary.activity(year, 1, code)[1]
+                    sem2 = summary.activity(year, 2, code)[1]
+                    values = [format_days(sem1), format_days(sem2), format_days(sem1 + sem2)]
+                elif code == '*':
+                    sem1 = summary.holidays(year, 1)
+                    sem2 = summary.holidays(year, 2)
+                    values = [format_days(sem1), format_days(sem2), format_days(sem1 + sem2)]
+                else:
+                    sem1 = summary.activity(year, 1, code)[0]
+                    sem2 = summary.activity(year, 2, code)[0]
+                    values = [format_weeks(sem1), format_weeks(sem2), format_weeks(sem1 + sem2)]
+
+                for offset, value in zip((0, 2, 4), values):
+                    ws.cell(row=current_row, column=col_start + offset).value = value
+
+
+# Приложение процесса-исполнителя экспорта: создается один раз при запуске процесса
+export_worker_app = None
+
+
+def init_export_worker(holiday_calendar):
+    """Инициализатор пула export_pool: календарь родителя, без чтения файлов профиля"""
+    global export_worker_app
+    export_worker_app = EducationalScheduleApp(holiday_calendar=holiday_calendar)
+
+
+def render_calendar_block(actual_year, start_row, generated_schedule, style_ids):
+    """Блок учебного года для процесса-исполнителя"""
+    return export_worker_app.calendar_block_xml(actual_year, start_row, generated_schedule, style_ids)
+
+
+# Оформление окна: одна таблица стилей, состояния переключаются свойствами виджетов.
+# Фон разделов задан правилом с двумя именами: оно сильнее общих правил, как прежний стиль контейнера
+APP_STYLESHEET = """
+    QMainWindow {
+        background-color: #0e1117;
+    }
+
+    QLabel#mainTitle {
+        font-size: 42px;
+        font-weight: 800;
+        color: #fafafa;
+        margin: 0;
+        padding: 0;
+        letter-spacing: -0.5px;
+    }
+
+    QLabel#subtitle {
+        font-size: 18px;
+        color: #34d399;
+        margin-top: 4px;
+        font-weight: 500;
+        letter-spacing: 0.3px;
+    }
+
+    QLabel#sectionTitle {
+        font-size: 20px;
+        font-weight: 600;
+        color: #fafafa;
+        margin-bottom: 8px;
+    }
+
+    QLabel#inputLabel {
+        font-size: 14px;
+        font-weight: 600;
+        color: #fafafa;
+    }
+
+    QLabel#authorsLabel {
+        font-size: 13px;
+        color: #6b7280;
+        font-weight: 400;
+        opacity: 0.7;
+    }
+
+    QLabel#diffLabel {
+        font-size: 14px;
+        color: #e5e7eb;
+        padding: 12px;
+        background-color: #1a1c24;
+        border-radius: 6px;
+        border: 1px solid #fbbf24;
+    }
+
+    QLabel#holidayNote {
+        font-size: 13px;
+        color: #fbbf24;
+    }
+
+    QCheckBox {
+        font-size: 14px;
+        color: #e5e7eb;
+    }
+
+    QLabel#weeksTotalLabel {
+        font-size: 16px;
+        font-weight: 600;
+        color: #34d399;
+        margin-top: 8px;
+        padding: 8px;
+        background-color: #1a1c24;
+        border-radius: 6px;
+        border: 1px solid #31343f;
+    }
+
+    QComboBox {
+        padding: 12px 16px;
+        border: 1px solid #464a5e;
+        border-radius: 8px;
+        background-color: #262730;
+        font-size: 15px;
+        min-width: 240px;
+        color: #fafafa;
+        min-height: 44px;
+        font-weight: 400;
+    }
+
+    QComboBox:hover {
+        border-color: #2d8659;
+    }
+
+    QComboBox:focus {
+        border-color: #2d8659;
+        outline: none;
+    }
+
+    QComboBox::drop-down {
+        border: none;
+        width: 32px;
+    }
+
+    QComboBox::down-arrow {
+        image: none;
+        border-left: 5px solid transparent;
+        border-right: 5px solid transparent;
+        border-top: 7px solid #a3a8b4;
+        margin-right: 10px;
+    }
+
+    QComboBox QAbstractItemView {
+        background-color: #262730;
+        border: 1px solid #464a5e;
+        selection-background-color: #2d8659;
+        selection-color: #ffffff;
+        outline: none;
+        padding: 6px;
+        font-size: 15px;
+        color: #fafafa;
+    }
+
+    QComboBox QAbstractItemView::item {
+        padding: 10px 12px;
+        min-height: 36px;
+        color: #fafafa;
+    }
+
+    QComboBox QAbstractItemView::item:hover {
+        background-color: #2d8659;
+        color: #ffffff;
+    }
+
+    QPushButton#primaryButton {
+        padding: 14px 32px;
+        border: 2px solid #34d399;
+        border-radius: 10px;
+        background: qlineargradient(x1:0, y1:0, x2:1, y2:0,
+            stop:0 #34d399, stop:0.5 #2d8659, stop:1 #10b981);
+        color: white;
+        font-size: 17px;
+        font-weight: 700;
+        min-height: 56px;
+        letter-spacing: 1px;
+    }
+
+    QPushButton#primaryButton:hover {
+        background: qlineargradient(x1:0, y1:0, x2:1, y2:0,
+            stop:0 #6ee7b7, stop:0.5 #34d399, stop:1 #10b981);
+        border-color: #6ee7b7;
+        border-width: 3px;
+        padding: 13px 31px;
+    }
+
+    QPushButton#primaryButton:pressed {
+        background: qlineargradient(x1:0, y1:0, x2:1, y2:0,
+            stop:0 #22c55e, stop:0.5 #16a34a, stop:1 #15803d);
+        border-color: #16a34a;
+        border-width: 2px;
+        padding: 14px 32px;
+    }
+
+    QPushButton#downloadButton {
+        padding: 14px 32px;
+        border: 2px solid #3b82f6;
+        border-radius: 10px;
+        background: qlineargradient(x1:0, y1:0, x2:1, y2:0,
+            stop:0 #3b82f6, stop:0.5 #2563eb, stop:1 #1d4ed8);
+        color: white;
+        font-size: 17px;
+        font-weight: 700;
+        min-height: 56px;
+        letter-spacing: 0.5px;
+    }
+
+    QPushButton#downloadButton:hover {
+        background: qlineargradient(x1:0, y1:0, x2:1, y2:0,
+            stop:0 #93c5fd, stop:0.5 #60a5fa, stop:1 #3b82f6);
+        border-color: #93c5fd;
+        border-width: 3px;
+        padding: 13px 31px;
+    }
+
+    QPushButton#downloadButton:pressed {
+        background: qlineargradient(x1:0, y1:0, x2:1, y2:0,
+            stop:0 #2563eb, stop:0.5 #1d4ed8, stop:1 #1e40af);
+        border-color: #1d4ed8;
+        border-width: 2px;
+        padding: 14px 32px;
+    }
+
+    QPushButton#downloadButton:disabled {
+        background: #1a1c24;
+        color: #464a5e;
+        border-color: #31343f;
+        border-width: 1px;
+    }
+
+    QPushButton#secondaryButton {
+        padding: 10px 20px;
+        border: 2px solid #464a5e;
+        border-radius: 8px;
+        background-color: #262730;
+        color: #fafafa;
+        font-size: 15px;
+        font-weight: 500;
+        min-height: 40px;
+    }
+
+    QPushButton#secondaryButton:hover {
+        background: qlineargradient(x1:0, y1:0, x2:0, y2:1,
+            stop:0 #3d4150, stop:1 #2d3038);
+        border-color: #34d399;
+        border-width: 2px;
+        color: #34d399;
+    }
+
+    QPushButton#secondaryButton:pressed {
+        background-color: #1c1f26;
+        border-color: #2d8659;
+        color: #2d8659;
+    }
+
+    QTableWidget {
+        border: 1px solid #31343f;
+        border-radius: 8px;
+        background-color: #1a1c24;
+        font-size: 16px;
+        color: #fafafa;
+    }
+
+    QTableWidget::item {
+        padding: 16px;
+        color: #fafafa;
+        background-color: #1a1c24;
+        font-size: 16px;
+        border: none;
+    }
+
+    QTableWidget::item:selected {
+        background-color: #262730;
+        color: #fafafa;
+    }
+
+    QHeaderView::section {
+        background-color: #262730;
+        padding: 16px;
+        border: none;
+        border-bottom: 2px solid #31343f;
+        font-weight: 600;
+        font-size: 15px;
+        color: #fafafa;
+    }
+
+    QTableWidget::item:alternate {
+        background-color: #14161d;
+    }
+
+    QScrollArea {
+        border: none;
+        background-color: #0e1117;
+    }
+
+    QScrollBar:vertical {
+        border: none;
+        background: #1a1c24;
+        width: 12px;
+        margin: 0px;
+    }
+
+    QScrollBar::handle:vertical {
+        background: #464a5e;
+        border-radius: 6px;
+        min-height: 30px;
+    }
+
+    QScrollBar::handle:vertical:hover {
+        background: #5a5f75;
+    }
+
+    QScrollBar::add-line:vertical, QScrollBar::sub-line:vertical {
+        height: 0px;
+    }
+
+    QWidget#scrollContent {
+        background-color: #0e1117;
+    }
+
+    QWidget#scrollContent QWidget#contentContainer, QWidget#scrollContent QWidget#contentContainer * {
+        background-color: #0e1117;
+    }
+
+    QWidget#contentContainer QFrame#headerLine {
+        background: qlineargradient(x1:0, y1:0, x2:1, y2:0,
+            stop:0 transparent, stop:0.2 #34d399, stop:0.8 #34d399, stop:1 transparent);
+        border: none;
+        height: 3px;
+        margin: 16px 0px;
+    }
+
+    QWidget#contentContainer QLabel#weeksTotalLabel {
+        background-color: #1a1c24;
+    }
+
+    QLabel#weeksTotalLabel[overLimit="true"] {
+        color: #ef4444;
+        border: 2px solid #ef4444;
+    }
+
+    QWidget#contentContainer QWidget#periodCell {
+        background-color: transparent;
+    }
+
+    QWidget#contentContainer QWidget#periodCell QComboBox {
+        padding: 11px 16px;
+        border: 1px solid #464a5e;
+        border-radius: 6px;
+        background-color: #262730;
+        font-size: 16px;
+        color: #fafafa;
+    }
+
+    QWidget#contentContainer QWidget#periodCell QComboBox:hover {
+        border-color: #34d399;
+        border-width: 2px;
+        background-color: #2d3038;
+    }
+
+    QWidget#contentContainer QWidget#periodCell QComboBox::drop-down {
+        border: none;
+        width: 28px;
+    }
+
+    QWidget#contentContainer QWidget#periodCell QComboBox::down-arrow {
+        image: none;
+        border-left: 5px solid transparent;
+        border-right: 5px solid transparent;
+        border-top: 7px solid #a3a8b4;
+        margin-right: 10px;
+    }
+
+    QWidget#contentContainer QWidget#periodCell QComboBox:hover::down-arrow {
+        border-top-color: #34d399;
+    }
+
+    QWidget#contentContainer QWidget#periodCell QComboBox QAbstractItemView {
+        background-color: #262730;
+        border: 1px solid #464a5e;
+        selection-background-color: #2d8659;
+        selection-color: #ffffff;
+        font-size: 16px;
+    }
+
+    QWidget#contentContainer QWidget#periodCell QComboBox QAbstractItemView::item {
+        padding: 12px 14px;
+        min-height: 38px;
+    }
+
+    QWidget#contentContainer QWidget#periodCell QComboBox QAbstractItemView::item:hover {
+        background-color: #34d399;
+    }
+"""
+
+
+class CalendarView(QAbstractScrollArea):
+    """Календарь графиков в окне: недели по горизонтали, по семь строк дней на каждый график.
+
+    Рисуются только видимые недели; после новой генерации перерисовываются
+    только изменившиеся ячейки. Подсказка над днем показывает его период.
+    """
+
+    def __init__(self, app, parent=None):
+        super().__init__(parent)
+        self.app = app
+        self.colors = {key: QColor(color) for key, color in app.calendar_image_colors().items()}
+        self.epoch = None  # понедельник первой недели
+        self.weeks = 0
+        self.bands = []    # (подпись, ключи заливки по дням от epoch, начала периодов, периоды)
+        self.horizontalScrollBar().setSingleStep(CALENDAR_VIEW_CELL)
+        self.verticalScrollBar().setSingleStep(CALENDAR_VIEW_CELL)
+
+    def set_schedules(self, schedules):
+        """Показать графики [(подпись, график)]"""
+        schedules = [(label, generated_schedule) for label, generated_schedule in schedules if generated_schedule]
+        if schedules:
+            epoch = min(self.app.get_monday_of_week(generated_schedule[0]['start_date'])
+                        for label, generated_schedule in schedules)
+            end = max(period['end_date'] for label, generated_schedule in schedules for period in generated_schedule)
+            weeks = (end - epoch).days // 7 + 1
+        else:
+            epoch, weeks = None, 0
+
+        # Выходные и праздники общие для всех графиков
+        base = []
+        for idx in range(weeks * 7):
+            date = epoch + timedelta(days=idx)
+            base.append('holiday' if self.app.is_holiday(date) else 'weekend' if date.weekday() >= 5 else None)
+
+        bands = []
+        for label, generated_schedule in schedules:
+            cells = list(base)
+            periods = []
+            for period in generated_schedule:
+                for day in period['days']:
+                    idx = (day - epoch).days
+                    if cells[idx] not in ACTIVITY_TYPES:
+                        cells[idx] = period['type']
+                if period['days']:
+                    periods.append(period)
+            starts = [period['start_date'] for period in periods]
+            bands.append((label, cells, starts, periods))
+
+        old_bands = self.bands
+        same_layout = (epoch == self.epoch and weeks == self.weeks and
+                       [band[0] for band in bands] == [band[0] for band in old_bands])
+        self.epoch, self.weeks, self.bands = epoch, weeks, bands
+
+        if not same_layout:
+            self.update_scrollbars()
+            self.viewport().update()
+            return
+
+        region = QRegion()
+        for band_idx, (old, new) in enumerate(zip(old_bands, bands)):
+            for idx in compress(range(len(new[1])), map(operator.ne, old[1], new[1])):
+                region += self.cell_rect(band_idx, idx // 7, idx % 7)
+        if not region.isEmpty():
+            self.viewport().update(region)
+
+    def band_height(self):
+        return 7 * CALENDAR_VIEW_CELL + CALENDAR_VIEW_GAP
+
+    def cell_rect(self, band_idx, week, day):
+        """Ячейка дня в координатах области просмотра"""
+        x = CALENDAR_VIEW_LABEL_WIDTH + week * CALENDAR_VIEW_CELL - self.horizontalScrollBar().value()
+        y = (CALENDAR_VIEW_HEADER + band_idx * self.band_height() + day * CALENDAR_VIEW_CELL
+             - self.verticalScrollBar().value())
+        return QRect(x, y, CALENDAR_VIEW_CELL - 1, CALENDAR_VIEW_CELL - 1)
+
+    def update_scrollbars(self):
+        width = CALENDAR_VIEW_LABEL_WIDTH + self.weeks * CALENDAR_VIEW_CELL
+        height = CALENDAR_VIEW_HEADER + len(self.bands) * self.band_height()
+        viewport = self.viewport().size()
+        self.horizontalScrollBar().setRange(0, max(width - viewport.width(), 0))
+        self.horizontalScrollBar().setPageStep(viewport.width())
+        self.verticalScrollBar().setRange(0, max(height - viewport.height(), 0))
+        self.verticalScrollBar().setPageStep(viewport.height())
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self.update_scrollbars()
+
+    def scrollContentsBy(self, dx, dy):
+        self.viewport().update()
+
+    def paintEvent(self, event):
+        painter = QPainter(self.viewport())
+        rect = event.rect()
+        painter.fillRect(rect, QColor('#0e1117'))
+        if not self.bands:
+            return
+
+        cell = CALENDAR_VIEW_CELL
+        left = self.horizontalScrollBar().value()
+        top = self.verticalScrollBar().value()
+
+        # Только недели, попадающие в перерисовываемую область
+        first_week = max((rect.left() + left - CALENDAR_VIEW_LABEL_WIDTH) // cell, 0)
+        last_week = min((rect.right() + left - CALENDAR_VIEW_LABEL_WIDTH) // cell, self.weeks - 1)
+        white = self.colors[None]
+
+        for band_idx, (label, cells, starts, periods) in enumerate(self.bands):
+            band_top = CALENDAR_VIEW_HEADER + band_idx * self.band_height() - top
+            if band_top + 7 * cell < rect.top() or band_top > rect.bottom():
+                continue
+            for day in range(7):
+                y = band_top + day * cell
+                for week in range(first_week, last_week + 1):
+                    painter.fillRect(CALENDAR_VIEW_LABEL_WIDTH + week * cell - left, y, cell - 1, cell - 1,
+                                     self.colors.get(cells[week * 7 + day], white))
+
+        # Неподвижные заголовки: месяцы сверху, графики и дни недели слева
+        width = self.viewport().width()
+        painter.fillRect(0, 0, width, CALENDAR_VIEW_HEADER, QColor('#262730'))
+        painter.setPen(QColor('#fafafa'))
+        for week in range(max(first_week - 4, 0), last_week + 1):
+            monday = self.epoch + timedelta(days=week * 7)
+            if week == 0 or monday.month != (monday - timedelta(days=7)).month:
+                text = self.app.month_names_ru[monday.month][:3]
+                if week == 0 or monday.month == 1:
+                    text += f' {monday.year}'
+                painter.drawText(CALENDAR_VIEW_LABEL_WIDTH + week * cell - left + 2, CALENDAR_VIEW_HEADER - 6, text)
+
+        painter.fillRect(0, CALENDAR_VIEW_HEADER, CALENDAR_VIEW_LABEL_WIDTH, self.viewport().height(),
+                         QColor('#0e1117'))
+        for band_idx, (label, cells, starts, periods) in enumerate(self.bands):
+            band_top = CALENDAR_VIEW_HEADER + band_idx * self.band_height() - top
+            painter.setPen(QColor('#34d399'))
+            painter.drawText(4, band_top + cell - 4, label)
+            painter.setPen(QColor('#a3a8b4'))
+            for day, day_name in enumerate(DAYS_OF_WEEK):
+                painter.drawText(CALENDAR_VIEW_LABEL_WIDTH - 24, band_top + (day + 1) * cell - 4, day_name)
+        painter.fillRect(0, 0, CALENDAR_VIEW_LABEL_WIDTH, CALENDAR_VIEW_HEADER, QColor('#262730'))
+
+    def day_at(self, pos):
+        """(номер графика, дата) под точкой области просмотра или None"""
+        x = pos.x() + self.horizontalScrollBar().value() - CALENDAR_VIEW_LABEL_WIDTH
+        y = pos.y() + self.verticalScrollBar().value() - CALENDAR_VIEW_HEADER
+        if pos.x() < CALENDAR_VIEW_LABEL_WIDTH or pos.y() < CALENDAR_VIEW_HEADER or x < 0 or y < 0:
+            return None
+
+        band_idx, band_y = divmod(y, self.band_height())
+        week, day = x // CALENDAR_VIEW_CELL, band_y // CALENDAR_VIEW_CELL
+        if band_idx >= len(self.bands) or week >= self.weeks or day >= 7:
+            return None
+        return band_idx, self.epoch + timedelta(days=week * 7 + day)
+
+    def viewportEvent(self, event):
+        if event.type() != QEvent.Type.ToolTip:
+            return super().viewportEvent(event)
+
+        found = self.day_at(event.pos())
+        if found is None:
+            QToolTip.hideText()
+            return True
+
+        band_idx, date = found
+        label, cells, starts, periods = self.bands[band_idx]
+        lines = [f'{label}: {date:%d.%m.%Y}, {DAYS_OF_WEEK[date.weekday()]}']
+        key = cells[(date - self.epoch).days]
+        if key == 'holiday':
+            lines.append('Нерабочий праздничный день')
+
+        idx = bisect.bisect_right(starts, date) - 1
+        if idx >= 0 and date <= periods[idx]['end_date']:
+            period = periods[idx]
+            lines.append(f"{period['type']} — {ACTIVITY_NAMES.get(period['type'], period['type'])}")
+            lines.append(f"Курс {period['year']}, семестр {period['semester']}: "
+                         f"{period['start_date']:%d.%m.%Y}–{period['end_date']:%d.%m.%Y}, "
+                         f"{len(period['days'])} раб. дн.")
+        QToolTip.showText(event.globalPos(), '\n'.join(lines), self.viewport())
+        return True
+
 
 class MainWindow(QMainWindow):
-    def __init__(self):
+    def __init__(self, session_path=SESSION_PATH, catalog_path=CATALOG_PATH):
         super().__init__()
-        self.app = EducationalScheduleApp()
+        self.app = EducationalScheduleApp(calendar_store_path=CALENDAR_STORE_PATH)
+        # Каталог планов открывается при первом обращении
+        self.catalog_path = catalog_path
+        self.catalog = None
         self.periods_data = []
         self.generated_schedule = None
+        self.schedule_summary = None
+        self.schedule_diff = None
+        # (шаблон, год начала) последнего графика: отмена пересчитывает только изменившиеся периоды
+        self.schedule_source = None
         self.start_year = 2025
         self.program_type = "Ординатура (2 года)"
+        self.work_week = PROGRAM_WORK_WEEKS[self.program_type]
 
         self.init_ui()
         self.apply_styles()
 
+        # Снимок сессии пишется в фоне через паузу после последней правки
+        self.session_path = session_path
+        self.session_saved = None
+        self.session_executor = None
+        self.session_timer = QTimer(self)
+        self.session_timer.setSingleShot(True)
+        self.session_timer.setInterval(SESSION_SAVE_DELAY)
+        self.session_timer.timeout.connect(self.save_session)
+        self.restore_session()
+
+        # Правки за один проход цикла событий (вставка, очистка, смена программы) — один шаг истории
+        self.history = PlanHistory(self.plan_snapshot())
+        self.history_timer = QTimer(self)
+        self.history_timer.setSingleShot(True)
+        self.history_timer.setInterval(0)
+        self.history_timer.timeout.connect(self.record_history)
+        self.update_history_buttons()
+
+        model = self.table.model()
+        for signal in (model.dataChanged, model.rowsInserted, model.rowsRemoved, model.modelReset,
+                       self.program_combo.currentTextChanged, self.year_combo.currentTextChanged,
+                       self.work_week_combo.currentTextChanged):
+            signal.connect(self.schedule_session_save)
+            signal.connect(self.history_timer.start)
+
     def init_ui(self):
         self.setWindowTitle('Учебный график - Итоги как в примере')
         self.setGeometry(100, 100, 1500, 900)
@@ -982,13 +3925,13 @@ class MainWindow(QMainWindow):
         scroll.setFrameShape(QFrame.Shape.NoFrame)
 
         scroll_content = QWidget()
-        scroll_content.setStyleSheet("background-color: #0e1117;")
+        scroll_content.setObjectName("scrollContent")
         content_layout = QVBoxLayout(scroll_content)
         content_layout.setSpacing(0)
         content_layout.setContentsMargins(0, 0, 0, 0)
 
         content_container = QWidget()
-        content_container.setStyleSheet("background-color: #0e1117;")
+        content_container.setObjectName("contentContainer")
         container_layout = QVBoxLayout(content_container)
         container_layout.setContentsMargins(50, 40, 50, 50)
         container_layout.setSpacing(32)
@@ -1015,15 +3958,7 @@ class MainWindow(QMainWindow):
 
         header_line = QFrame()
         header_line.setFrameShape(QFrame.Shape.HLine)
-        header_line.setStyleSheet("""
-            QFrame {
-                background: qlineargradient(x1:0, y1:0, x2:1, y2:0,
-                    stop:0 transparent, stop:0.2 #34d399, stop:0.8 #34d399, stop:1 transparent);
-                border: none;
-                height: 3px;
-                margin: 16px 0px;
-            }
-        """)
+        header_line.setObjectName("headerLine")
         container_layout.addWidget(header_line)
         container_layout.addSpacing(8)
 
@@ -1045,17 +3980,35 @@ class MainWindow(QMainWindow):
         year_label = QLabel('Начальный год')
         year_label.setObjectName("inputLabel")
         self.year_combo = QComboBox()
-        self.year_combo.addItems(['2025', '2026', '2027'])
+        self.year_combo.addItems([str(year) for year in range(2025, 2036)])
         self.year_combo.currentTextChanged.connect(self.on_year_changed)
         year_layout.addWidget(year_label)
         year_layout.addWidget(self.year_combo)
 
+        work_week_layout = QVBoxLayout()
+        work_week_layout.setSpacing(8)
+        work_week_label = QLabel('Рабочая неделя')
+        work_week_label.setObjectName("inputLabel")
+        self.work_week_combo = QComboBox()
+        self.work_week_combo.addItems(list(WORK_WEEKS))
+        self.work_week_combo.currentTextChanged.connect(self.on_work_week_changed)
+        work_week_layout.addWidget(work_week_label)
+        work_week_layout.addWidget(self.work_week_combo)
+
         settings_row.addLayout(program_layout)
         settings_row.addLayout(year_layout)
+        settings_row.addLayout(work_week_layout)
         settings_row.addStretch()
 
         container_layout.addLayout(settings_row)
 
+        # Годы без постановления считаются по правилам и могут разойтись с официальным календарем
+        self.holiday_note = QLabel()
+        self.holiday_note.setObjectName("holidayNote")
+        self.holiday_note.setWordWrap(True)
+        container_layout.addWidget(self.holiday_note)
+        self.update_holiday_note()
+
         button_row = QHBoxLayout()
         button_row.setSpacing(12)
 
@@ -1063,12 +4016,27 @@ class MainWindow(QMainWindow):
         example_btn.setObjectName("secondaryButton")
         example_btn.clicked.connect(self.load_example)
 
+        open_btn = QPushButton('📂 Открыть Excel')
+        open_btn.setObjectName("secondaryButton")
+        open_btn.clicked.connect(self.open_excel)
+
         clear_btn = QPushButton('🗑️ Очистить')
         clear_btn.setObjectName("secondaryButton")
         clear_btn.clicked.connect(self.clear_data)
 
+        catalog_save_btn = QPushButton('🗂️ В каталог')
+        catalog_save_btn.setObjectName("secondaryButton")
+        catalog_save_btn.clicked.connect(self.save_to_catalog)
+
+        catalog_open_btn = QPushButton('🔎 Каталог планов')
+        catalog_open_btn.setObjectName("secondaryButton")
+        catalog_open_btn.clicked.connect(self.open_from_catalog)
+
         button_row.addWidget(example_btn)
+        button_row.addWidget(open_btn)
         button_row.addWidget(clear_btn)
+        button_row.addWidget(catalog_save_btn)
+        button_row.addWidget(catalog_open_btn)
         button_row.addStretch()
 
         container_layout.addLayout(button_row)
@@ -1080,7 +4048,7 @@ class MainWindow(QMainWindow):
 
         self.table = QTableWidget()
         self.table.setColumnCount(4)
-        self.table.setHorizontalHeaderLabels(['Год', 'Семестр', 'Тип', 'Недели'])
+        self.table.setHorizontalHeaderLabels(TABLE_COLUMNS)
         self.table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
         self.table.verticalHeader().setVisible(False)
         self.table.verticalHeader().setDefaultSectionSize(82)
@@ -1088,6 +4056,11 @@ class MainWindow(QMainWindow):
         self.table.setShowGrid(False)
         self.table.setMinimumHeight(400)
         self.table.itemChanged.connect(self.update_weeks_total)
+        self.table.verticalScrollBar().valueChanged.connect(self.ensure_row_widgets)
+        self.table.viewport().installEventFilter(self)
+        QShortcut(QKeySequence.StandardKey.Paste, self.table, self.paste_periods)
+        QShortcut(QKeySequence.StandardKey.Undo, self, self.undo)
+        QShortcut(QKeySequence.StandardKey.Redo, self, self.redo)
         container_layout.addWidget(self.table)
 
         # Метка для отображения суммы недель
@@ -1106,8 +4079,41 @@ class MainWindow(QMainWindow):
         remove_row_btn.setObjectName("secondaryButton")
         remove_row_btn.clicked.connect(self.remove_row)
 
+        paste_btn = QPushButton('📋 Вставить строки')
+        paste_btn.setObjectName("secondaryButton")
+        paste_btn.clicked.connect(self.paste_periods)
+
+        csv_btn = QPushButton('📄 Импорт CSV')
+        csv_btn.setObjectName("secondaryButton")
+        csv_btn.clicked.connect(self.import_csv)
+
+        solve_btn = QPushButton('🧩 Подобрать порядок')
+        solve_btn.setObjectName("secondaryButton")
+        solve_btn.clicked.connect(self.solve_plan)
+
+        # Ограничения подбора порядка
+        self.holidays_in_vacation_checkbox = QCheckBox('Праздники в каникулах')
+        self.holidays_in_vacation_checkbox.setChecked(True)
+        self.semester_after_winter_checkbox = QCheckBox('2 семестр после праздников')
+        self.semester_after_winter_checkbox.setChecked(True)
+
         table_btn_row.addWidget(add_row_btn)
         table_btn_row.addWidget(remove_row_btn)
+        table_btn_row.addWidget(paste_btn)
+        table_btn_row.addWidget(csv_btn)
+        self.undo_btn = QPushButton('↶ Отменить')
+        self.undo_btn.setObjectName("secondaryButton")
+        self.undo_btn.clicked.connect(self.undo)
+
+        self.redo_btn = QPushButton('↷ Повторить')
+        self.redo_btn.setObjectName("secondaryButton")
+        self.redo_btn.clicked.connect(self.redo)
+
+        table_btn_row.addWidget(solve_btn)
+        table_btn_row.addWidget(self.holidays_in_vacation_checkbox)
+        table_btn_row.addWidget(self.semester_after_winter_checkbox)
+        table_btn_row.addWidget(self.undo_btn)
+        table_btn_row.addWidget(self.redo_btn)
         table_btn_row.addStretch()
 
         container_layout.addLayout(table_btn_row)
@@ -1130,29 +4136,11 @@ class MainWindow(QMainWindow):
 
         container_layout.addLayout(action_row)
 
-        self.preview_section = QWidget()
-        self.preview_section.setStyleSheet("background-color: #0e1117;")
-        preview_layout = QVBoxLayout(self.preview_section)
-        preview_layout.setContentsMargins(0, 32, 0, 0)
-        preview_layout.setSpacing(16)
-
-        preview_label = QLabel('Предварительный просмотр')
-        preview_label.setObjectName("sectionTitle")
-        preview_layout.addWidget(preview_label)
-
-        self.preview_table = QTableWidget()
-        self.preview_table.setColumnCount(7)
-        self.preview_table.setHorizontalHeaderLabels(['Год', 'Семестр', 'Тип', 'Недели', 'Начало', 'Конец', 'Дней'])
-        self.preview_table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
-        self.preview_table.verticalHeader().setVisible(False)
-        self.preview_table.verticalHeader().setDefaultSectionSize(60)
-        self.preview_table.setAlternatingRowColors(True)
-        self.preview_table.setShowGrid(False)
-        self.preview_table.setMinimumHeight(350)
-        preview_layout.addWidget(self.preview_table)
-
-        self.preview_section.setVisible(False)
-        container_layout.addWidget(self.preview_section)
+        # Раздел просмотра строится при первой генерации графика
+        self.preview_section = None
+        self.preview_slot = QVBoxLayout()
+        self.preview_slot.setContentsMargins(0, 0, 0, 0)
+        container_layout.addLayout(self.preview_slot)
 
         footer_layout = QVBoxLayout()
         footer_layout.setContentsMargins(0, 32, 0, 0)
@@ -1170,274 +4158,88 @@ class MainWindow(QMainWindow):
         scroll.setWidget(scroll_content)
         main_layout.addWidget(scroll)
 
-    def apply_styles(self):
-        self.setStyleSheet("""
-            QMainWindow {
-                background-color: #0e1117;
-            }
-
-            QLabel#mainTitle {
-                font-size: 42px;
-                font-weight: 800;
-                color: #fafafa;
-                margin: 0;
-                padding: 0;
-                letter-spacing: -0.5px;
-            }
-
-            QLabel#subtitle {
-                font-size: 18px;
-                color: #34d399;
-                margin-top: 4px;
-                font-weight: 500;
-                letter-spacing: 0.3px;
-            }
-
-            QLabel#sectionTitle {
-                font-size: 20px;
-                font-weight: 600;
-                color: #fafafa;
-                margin-bottom: 8px;
-            }
-
-            QLabel#inputLabel {
-                font-size: 14px;
-                font-weight: 600;
-                color: #fafafa;
-            }
-
-            QLabel#authorsLabel {
-                font-size: 13px;
-                color: #6b7280;
-                font-weight: 400;
-                opacity: 0.7;
-            }
-
-            QLabel#weeksTotalLabel {
-                font-size: 16px;
-                font-weight: 600;
-                color: #34d399;
-                margin-top: 8px;
-                padding: 8px;
-                background-color: #1a1c24;
-                border-radius: 6px;
-                border: 1px solid #31343f;
-            }
-
-            QComboBox {
-                padding: 12px 16px;
-                border: 1px solid #464a5e;
-                border-radius: 8px;
-                background-color: #262730;
-                font-size: 15px;
-                min-width: 240px;
-                color: #fafafa;
-                min-height: 44px;
-                font-weight: 400;
-            }
-
-            QComboBox:hover {
-                border-color: #2d8659;
-            }
-
-            QComboBox:focus {
-                border-color: #2d8659;
-                outline: none;
-            }
-
-            QComboBox::drop-down {
-                border: none;
-                width: 32px;
-            }
-
-            QComboBox::down-arrow {
-                image: none;
-                border-left: 5px solid transparent;
-                border-right: 5px solid transparent;
-                border-top: 7px solid #a3a8b4;
-                margin-right: 10px;
-            }
-
-            QComboBox QAbstractItemView {
-                background-color: #262730;
-                border: 1px solid #464a5e;
-                selection-background-color: #2d8659;
-                selection-color: #ffffff;
-                outline: none;
-                padding: 6px;
-                font-size: 15px;
-                color: #fafafa;
-            }
-
-            QComboBox QAbstractItemView::item {
-                padding: 10px 12px;
-                min-height: 36px;
-                color: #fafafa;
-            }
-
-            QComboBox QAbstractItemView::item:hover {
-                background-color: #2d8659;
-                color: #ffffff;
-            }
-
-            QPushButton#primaryButton {
-                padding: 14px 32px;
-                border: 2px solid #34d399;
-                border-radius: 10px;
-                background: qlineargradient(x1:0, y1:0, x2:1, y2:0,
-                    stop:0 #34d399, stop:0.5 #2d8659, stop:1 #10b981);
-                color: white;
-                font-size: 17px;
-                font-weight: 700;
-                min-height: 56px;
-                letter-spacing: 1px;
-            }
-
-            QPushButton#primaryButton:hover {
-                background: qlineargradient(x1:0, y1:0, x2:1, y2:0,
-                    stop:0 #6ee7b7, stop:0.5 #34d399, stop:1 #10b981);
-                border-color: #6ee7b7;
-                border-width: 3px;
-                padding: 13px 31px;
-            }
-
-            QPushButton#primaryButton:pressed {
-                background: qlineargradient(x1:0, y1:0, x2:1, y2:0,
-                    stop:0 #22c55e, stop:0.5 #16a34a, stop:1 #15803d);
-                border-color: #16a34a;
-                border-width: 2px;
-                padding: 14px 32px;
-            }
-
-            QPushButton#downloadButton {
-                padding: 14px 32px;
-                border: 2px solid #3b82f6;
-                border-radius: 10px;
-                background: qlineargradient(x1:0, y1:0, x2:1, y2:0,
-                    stop:0 #3b82f6, stop:0.5 #2563eb, stop:1 #1d4ed8);
-                color: white;
-                font-size: 17px;
-                font-weight: 700;
-                min-height: 56px;
-                letter-spacing: 0.5px;
-            }
-
-            QPushButton#downloadButton:hover {
-                background: qlineargradient(x1:0, y1:0, x2:1, y2:0,
-                    stop:0 #93c5fd, stop:0.5 #60a5fa, stop:1 #3b82f6);
-                border-color: #93c5fd;
-                border-width: 3px;
-                padding: 13px 31px;
-            }
-
-            QPushButton#downloadButton:pressed {
-                background: qlineargradient(x1:0, y1:0, x2:1, y2:0,
-                    stop:0 #2563eb, stop:0.5 #1d4ed8, stop:1 #1e40af);
-                border-color: #1d4ed8;
-                border-width: 2px;
-                padding: 14px 32px;
-            }
-
-            QPushButton#downloadButton:disabled {
-                background: #1a1c24;
-                color: #464a5e;
-                border-color: #31343f;
-                border-width: 1px;
-            }
-
-            QPushButton#secondaryButton {
-                padding: 10px 20px;
-                border: 2px solid #464a5e;
-                border-radius: 8px;
-                background-color: #262730;
-                color: #fafafa;
-                font-size: 15px;
-                font-weight: 500;
-                min-height: 40px;
-            }
-
-            QPushButton#secondaryButton:hover {
-                background: qlineargradient(x1:0, y1:0, x2:0, y2:1,
-                    stop:0 #3d4150, stop:1 #2d3038);
-                border-color: #34d399;
-                border-width: 2px;
-                color: #34d399;
-            }
-
-            QPushButton#secondaryButton:pressed {
-                background-color: #1c1f26;
-                border-color: #2d8659;
-                color: #2d8659;
-            }
+    def ensure_preview_section(self):
+        """Построить раздел предварительного просмотра при первом обращении"""
+        if self.preview_section is not None:
+            return self.preview_section
 
-            QTableWidget {
-                border: 1px solid #31343f;
-                border-radius: 8px;
-                background-color: #1a1c24;
-                font-size: 16px;
-                color: #fafafa;
-            }
+        self.preview_section = QWidget()
+        preview_layout = QVBoxLayout(self.preview_section)
+        preview_layout.setContentsMargins(0, 32, 0, 0)
+        preview_layout.setSpacing(16)
 
-            QTableWidget::item {
-                padding: 16px;
-                color: #fafafa;
-                background-color: #1a1c24;
-                font-size: 16px;
-                border: none;
-            }
+        preview_label = QLabel('Предварительный просмотр')
+        preview_label.setObjectName("sectionTitle")
+        preview_layout.addWidget(preview_label)
 
-            QTableWidget::item:selected {
-                background-color: #262730;
-                color: #fafafa;
-            }
+        self.calendar_preview = QLabel()
+        self.calendar_preview.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        preview_layout.addWidget(self.calendar_preview)
 
-            QHeaderView::section {
-                background-color: #262730;
-                padding: 16px;
-                border: none;
-                border-bottom: 2px solid #31343f;
-                font-weight: 600;
-                font-size: 15px;
-                color: #fafafa;
-            }
+        self.preview_table = QTableWidget()
+        self.preview_table.setColumnCount(7)
+        self.preview_table.setHorizontalHeaderLabels(['Год', 'Семестр', 'Тип', 'Недели', 'Начало', 'Конец', 'Дней'])
+        self.preview_table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
+        self.preview_table.verticalHeader().setVisible(False)
+        self.preview_table.verticalHeader().setDefaultSectionSize(60)
+        self.preview_table.setAlternatingRowColors(True)
+        self.preview_table.setShowGrid(False)
+        self.preview_table.setMinimumHeight(350)
+        preview_layout.addWidget(self.preview_table)
 
-            QTableWidget::item:alternate {
-                background-color: #14161d;
-            }
+        self.calendar_view = CalendarView(self.app)
+        self.calendar_view.setMinimumHeight(CALENDAR_VIEW_HEADER + 7 * CALENDAR_VIEW_CELL + CALENDAR_VIEW_GAP + 24)
+        preview_layout.addWidget(self.calendar_view)
 
-            QScrollArea {
-                border: none;
-                background-color: #0e1117;
-            }
+        # Изменения относительно предыдущей генерации
+        self.diff_label = QLabel()
+        self.diff_label.setObjectName("diffLabel")
+        self.diff_label.setWordWrap(True)
+        self.diff_label.setVisible(False)
+        preview_layout.addWidget(self.diff_label)
 
-            QScrollBar:vertical {
-                border: none;
-                background: #1a1c24;
-                width: 12px;
-                margin: 0px;
-            }
+        self.diff_checkbox = QCheckBox('Добавить лист изменений в Excel')
+        self.diff_checkbox.setVisible(False)
+        preview_layout.addWidget(self.diff_checkbox)
 
-            QScrollBar::handle:vertical {
-                background: #464a5e;
-                border-radius: 6px;
-                min-height: 30px;
-            }
+        self.preview_section.setVisible(False)
+        self.preview_slot.addWidget(self.preview_section)
+        return self.preview_section
 
-            QScrollBar::handle:vertical:hover {
-                background: #5a5f75;
-            }
+    def eventFilter(self, obj, event):
+        # Изменение высоты таблицы открывает строки без выпадающих списков
+        if obj is self.table.viewport() and event.type() == QEvent.Type.Resize:
+            self.ensure_row_widgets()
+        return super().eventFilter(obj, event)
 
-            QScrollBar::add-line:vertical, QScrollBar::sub-line:vertical {
-                height: 0px;
-            }
-        """)
+    def apply_styles(self):
+        self.setStyleSheet(APP_STYLESHEET)
 
     def on_program_changed(self, text):
         self.program_type = text
+        work_week = PROGRAM_WORK_WEEKS.get(text, WORK_WEEK_5)
+        self.work_week_combo.setCurrentText(next(label for label, mask in WORK_WEEKS.items() if mask == work_week))
         self.update_weeks_total()  # Обновляем счетчик недель при смене типа программы
+        self.update_holiday_note()
 
     def on_year_changed(self, text):
         self.start_year = int(text)
+        self.update_holiday_note()
+
+    def update_holiday_note(self):
+        """Предупредить, если праздники каких-то лет графика вычислены, а не взяты из постановления"""
+        program_years = 2 if "Ординатура" in self.program_type else 3
+        computed = [year for year in range(self.start_year, self.start_year + program_years + 1)
+                    if not self.app.holiday_calendar.is_official(year)]
+        if computed:
+            years = ', '.join(map(str, computed))
+            self.holiday_note.setText(f'⚠️ Праздники на {years} г. рассчитаны по ТК РФ приблизительно: '
+                                      'переносы по постановлению правительства могут отличаться. '
+                                      'Официальный список можно положить в holidays.json.')
+        self.holiday_note.setVisible(bool(computed))
+
+    def on_work_week_changed(self, text):
+        self.work_week = WORK_WEEKS[text]
 
     def load_example(self):
         if "Аспирантура" in self.program_type:
@@ -1492,101 +4294,146 @@ class MainWindow(QMainWindow):
             ]
         self.update_table()
 
+    def open_excel(self):
+        """Загрузить периоды из ранее выгруженной книги"""
+        filename, _ = QFileDialog.getOpenFileName(self, 'Открыть Excel файл', '', 'Excel Files (*.xlsx)')
+        if not filename:
+            return
+
+        work_week = self.work_week
+        try:
+            periods_data, start_year, program_type = self.app.import_excel_schedule(filename, work_week)
+        except (OSError, ValueError, KeyError, zipfile.BadZipFile, InvalidFileException) as e:
+            QMessageBox.critical(self, 'Ошибка', f'Ошибка при открытии:\n{str(e)}')
+            return
+
+        # Смена программы сбрасывает рабочую неделю на принятую по умолчанию: возвращаем выбранную
+        self.set_plan(program_type, start_year, work_week, periods_data)
+
+    def can_set_plan(self, program_type, start_year, work_week):
+        """Есть ли такие программа, год и неделя в списках окна"""
+        return (self.program_combo.findText(program_type) >= 0 and work_week in WORK_WEEKS.values()
+                and self.year_combo.findText(str(start_year)) >= 0)
+
+    def set_plan(self, program_type, start_year, work_week, periods_data):
+        """Настройки и таблица плана; неделя ставится после программы, смена которой ее сбрасывает"""
+        self.program_combo.setCurrentText(program_type)
+        self.work_week_combo.setCurrentText(next(label for label, mask in WORK_WEEKS.items() if mask == work_week))
+        self.year_combo.setCurrentText(str(start_year))
+
+        self.periods_data = periods_data
+        self.update_table()
+
+    def show_stored_schedule(self, generated_schedule, schedule_source=None):
+        """Показать сохраненный график без повторной генерации"""
+        previous_schedule = self.generated_schedule
+        self.generated_schedule = generated_schedule
+        self.schedule_source = schedule_source
+        self.schedule_summary = self.app.compute_summary(generated_schedule)
+        self.ensure_preview_section()
+        self.show_schedule_diff(previous_schedule)
+        self.show_schedule_preview()
+        self.download_btn.setEnabled(True)
+
     def clear_data(self):
         self.periods_data = []
+        self.generated_schedule = None
+        self.schedule_summary = None
+        self.schedule_source = None
+        self.show_schedule_diff(None)
         self.update_table()
-        self.preview_section.setVisible(False)
+        if self.preview_section is not None:
+            self.preview_section.setVisible(False)
         self.download_btn.setEnabled(False)
+        self.schedule_session_save()
 
     def add_row(self):
         row_position = self.table.rowCount()
         self.table.insertRow(row_position)
+        self.fill_table_row(row_position, {'Год': 1, 'Семестр': 1, 'Тип': 'Т', 'Недели': 1.0})
+        self.table.setRowHeight(row_position, 82)
+        self.ensure_row_widgets()
 
-        table_combo_style = """
-            QComboBox {
-                padding: 11px 16px;
-                border: 1px solid #464a5e;
-                border-radius: 6px;
-                background-color: #262730;
-                font-size: 16px;
-                color: #fafafa;
-            }
-            QComboBox:hover {
-                border-color: #34d399;
-                border-width: 2px;
-                background-color: #2d3038;
-            }
-            QComboBox::drop-down {
-                border: none;
-                width: 28px;
-            }
-            QComboBox::down-arrow {
-                image: none;
-                border-left: 5px solid transparent;
-                border-right: 5px solid transparent;
-                border-top: 7px solid #a3a8b4;
-                margin-right: 10px;
-            }
-            QComboBox:hover::down-arrow {
-                border-top-color: #34d399;
-            }
-            QComboBox QAbstractItemView {
-                background-color: #262730;
-                border: 1px solid #464a5e;
-                selection-background-color: #2d8659;
-                selection-color: #ffffff;
-                font-size: 16px;
-            }
-            QComboBox QAbstractItemView::item {
-                padding: 12px 14px;
-                min-height: 38px;
-            }
-            QComboBox QAbstractItemView::item:hover {
-                background-color: #34d399;
-            }
-        """
-
-        year_combo = QComboBox()
-        year_combo.addItems(['1', '2', '3'])
-        year_combo.setStyleSheet(table_combo_style)
-        year_container = QWidget()
-        year_container.setStyleSheet("background-color: transparent;")
-        year_layout = QHBoxLayout(year_container)
-        year_layout.addWidget(year_combo)
-        year_layout.setContentsMargins(6, 0, 6, 0)
-        year_layout.setAlignment(Qt.AlignmentFlag.AlignCenter)
-        self.table.setCellWidget(row_position, 0, year_container)
-
-        semester_combo = QComboBox()
-        semester_combo.addItems(['1', '2'])
-        semester_combo.setStyleSheet(table_combo_style)
-        semester_container = QWidget()
-        semester_container.setStyleSheet("background-color: transparent;")
-        semester_layout = QHBoxLayout(semester_container)
-        semester_layout.addWidget(semester_combo)
-        semester_layout.setContentsMargins(6, 0, 6, 0)
-        semester_layout.setAlignment(Qt.AlignmentFlag.AlignCenter)
-        self.table.setCellWidget(row_position, 1, semester_container)
-
-        type_combo = QComboBox()
-        type_combo.addItems(['Т', 'Э', 'П', 'У', 'ПА', 'ГИА', 'Г', 'Д', 'К'])
-        type_combo.setStyleSheet(table_combo_style)
-        type_container = QWidget()
-        type_container.setStyleSheet("background-color: transparent;")
-        type_layout = QHBoxLayout(type_container)
-        type_layout.addWidget(type_combo)
-        type_layout.setContentsMargins(6, 0, 6, 0)
-        type_layout.setAlignment(Qt.AlignmentFlag.AlignCenter)
-        self.table.setCellWidget(row_position, 2, type_container)
-
-        weeks_item = QTableWidgetItem('1.0')
-        weeks_item.setTextAlignment(Qt.AlignmentFlag.AlignCenter | Qt.AlignmentFlag.AlignVCenter)
+    def fill_table_row(self, row_position, data):
+        """Значения строки таблицы; выпадающие списки создаются, когда строка видна"""
         font = QFont()
         font.setPointSize(16)
-        weeks_item.setFont(font)
-        self.table.setItem(row_position, 3, weeks_item)
+        for col, key in enumerate(TABLE_COLUMNS):
+            item = QTableWidgetItem(str(data[key]))
+            item.setTextAlignment(Qt.AlignmentFlag.AlignCenter | Qt.AlignmentFlag.AlignVCenter)
+            item.setFont(font)
+            if key in TABLE_CHOICES:
+                item.setFlags(item.flags() & ~Qt.ItemFlag.ItemIsEditable)
+            self.table.setItem(row_position, col, item)
+
+    def ensure_row_widgets(self):
+        """Выпадающие списки только для видимых строк: большая вставка не создает тысячи виджетов"""
+        first = self.table.rowAt(0)
+        if first < 0:
+            return
+        last = self.table.rowAt(self.table.viewport().height() - 1)
+        if last < 0:
+            last = self.table.rowCount() - 1
+
+        for row_position in range(first, last + 1):
+            if self.table.cellWidget(row_position, 0) is None:
+                self.create_row_widgets(row_position)
+
+    def create_row_widgets(self, row_position):
+        """Выпадающие списки строки; оформление задает APP_STYLESHEET по имени контейнера"""
+        for col, key in enumerate(TABLE_COLUMNS):
+            if key not in TABLE_CHOICES:
+                continue
 
-        self.table.setRowHeight(row_position, 82)
+            # Значение хранится в ячейке таблицы, список только редактирует его
+            item = self.table.item(row_position, col)
+            combo = QComboBox()
+            combo.addItems(TABLE_CHOICES[key])
+            combo.setCurrentText(item.text())
+            combo.currentTextChanged.connect(item.setText)
+            container = QWidget()
+            container.setObjectName("periodCell")
+            layout = QHBoxLayout(container)
+            layout.addWidget(combo)
+            layout.setContentsMargins(6, 0, 6, 0)
+            layout.setAlignment(Qt.AlignmentFlag.AlignCenter)
+            self.table.setCellWidget(row_position, col, container)
+
+    def paste_periods(self):
+        """Добавить в таблицу строки из буфера обмена"""
+        self.append_periods(self.app.parse_periods_text(QApplication.clipboard().text()))
+
+    def import_csv(self):
+        filename, _ = QFileDialog.getOpenFileName(self, 'Импорт CSV', '', 'CSV Files (*.csv *.txt)')
+        if not filename:
+            return
+
+        try:
+            parsed = self.app.read_periods_csv(filename)
+        except OSError as e:
+            QMessageBox.critical(self, 'Ошибка', f'Ошибка при открытии:\n{str(e)}')
+            return
+        self.append_periods(parsed)
+
+    def append_periods(self, parsed):
+        periods_data, errors = parsed
+        if errors:
+            lines = [f'Строка {number}: {message}' for number, message in errors[:10]]
+            if len(errors) > 10:
+                lines.append(f'... и еще {len(errors) - 10}')
+            QMessageBox.warning(self, 'Ошибка валидации', '\n'.join(lines))
+            return
+
+        if not periods_data:
+            QMessageBox.warning(self, 'Внимание', 'Нет строк вида Год;Семестр;Тип;Недели')
+            return
+
+        current = self.get_table_data()
+        if current is None:
+            return
+
+        self.periods_data = current + periods_data
+        self.update_table()
 
     def remove_row(self):
         current_row = self.table.currentRow()
@@ -1610,166 +4457,98 @@ class MainWindow(QMainWindow):
         program_years = 2 if "Ординатура" in self.program_type else 3
         max_weeks = program_years * 52
 
-        # Меняем цвет в зависимости от превышения лимита
-        if total_weeks > max_weeks:
+        # Цвет задает APP_STYLESHEET по свойству overLimit; перерисовка стиля только при смене состояния
+        over_limit = total_weeks > max_weeks
+        if over_limit:
             self.weeks_total_label.setText(f'Всего недель: {total_weeks:.1f} / {max_weeks} ⚠️ ПРЕВЫШЕНИЕ!')
-            self.weeks_total_label.setStyleSheet("""
-                font-size: 16px;
-                font-weight: 600;
-                color: #ef4444;
-                margin-top: 8px;
-                padding: 8px;
-                background-color: #1a1c24;
-                border-radius: 6px;
-                border: 2px solid #ef4444;
-            """)
         else:
             self.weeks_total_label.setText(f'Всего недель: {total_weeks:.1f} / {max_weeks}')
-            self.weeks_total_label.setStyleSheet("""
-                font-size: 16px;
-                font-weight: 600;
-                color: #34d399;
-                margin-top: 8px;
-                padding: 8px;
-                background-color: #1a1c24;
-                border-radius: 6px;
-                border: 1px solid #31343f;
-            """)
+
+        if self.weeks_total_label.property('overLimit') != over_limit:
+            self.weeks_total_label.setProperty('overLimit', over_limit)
+            self.weeks_total_label.style().unpolish(self.weeks_total_label)
+            self.weeks_total_label.style().polish(self.weeks_total_label)
 
     def update_table(self):
-        self.table.setRowCount(0)
-
-        table_combo_style = """
-            QComboBox {
-                padding: 11px 16px;
-                border: 1px solid #464a5e;
-                border-radius: 6px;
-                background-color: #262730;
-                font-size: 16px;
-                color: #fafafa;
-            }
-            QComboBox:hover {
-                border-color: #34d399;
-                border-width: 2px;
-                background-color: #2d3038;
-            }
-            QComboBox::drop-down {
-                border: none;
-                width: 28px;
-            }
-            QComboBox::down-arrow {
-                image: none;
-                border-left: 5px solid transparent;
-                border-right: 5px solid transparent;
-                border-top: 7px solid #a3a8b4;
-                margin-right: 10px;
-            }
-            QComboBox:hover::down-arrow {
-                border-top-color: #34d399;
-            }
-            QComboBox QAbstractItemView {
-                background-color: #262730;
-                border: 1px solid #464a5e;
-                selection-background-color: #2d8659;
-                selection-color: #ffffff;
-                font-size: 16px;
-            }
-            QComboBox QAbstractItemView::item {
-                padding: 12px 14px;
-                min-height: 38px;
-            }
-            QComboBox QAbstractItemView::item:hover {
-                background-color: #34d399;
-            }
-        """
+        # Одно изменение числа строк без сигналов и перерисовки: итог недель считается один раз
+        self.table.setUpdatesEnabled(False)
+        self.table.blockSignals(True)
+        try:
+            self.table.setRowCount(0)
+            self.table.setRowCount(len(self.periods_data))
+            for row_position, data in enumerate(self.periods_data):
+                self.fill_table_row(row_position, data)
+        finally:
+            self.table.blockSignals(False)
+            self.table.setUpdatesEnabled(True)
+
+        self.ensure_row_widgets()
+        self.update_weeks_total()
 
-        for data in self.periods_data:
-            row_position = self.table.rowCount()
-            self.table.insertRow(row_position)
-
-            year_combo = QComboBox()
-            year_combo.addItems(['1', '2', '3'])
-            year_combo.setCurrentText(str(data['Год']))
-            year_combo.setStyleSheet(table_combo_style)
-            year_container = QWidget()
-            year_container.setStyleSheet("background-color: transparent;")
-            year_layout = QHBoxLayout(year_container)
-            year_layout.addWidget(year_combo)
-            year_layout.setContentsMargins(6, 0, 6, 0)
-            year_layout.setAlignment(Qt.AlignmentFlag.AlignCenter)
-            self.table.setCellWidget(row_position, 0, year_container)
-
-            semester_combo = QComboBox()
-            semester_combo.addItems(['1', '2'])
-            semester_combo.setCurrentText(str(data['Семестр']))
-            semester_combo.setStyleSheet(table_combo_style)
-            semester_container = QWidget()
-            semester_container.setStyleSheet("background-color: transparent;")
-            semester_layout = QHBoxLayout(semester_container)
-            semester_layout.addWidget(semester_combo)
-            semester_layout.setContentsMargins(6, 0, 6, 0)
-            semester_layout.setAlignment(Qt.AlignmentFlag.AlignCenter)
-            self.table.setCellWidget(row_position, 1, semester_container)
-
-            type_combo = QComboBox()
-            type_combo.addItems(['Т', 'Э', 'П', 'У', 'ПА', 'ГИА', 'Г', 'Д', 'К'])
-            type_combo.setCurrentText(data['Тип'])
-            type_combo.setStyleSheet(table_combo_style)
-            type_container = QWidget()
-            type_container.setStyleSheet("background-color: transparent;")
-            type_layout = QHBoxLayout(type_container)
-            type_layout.addWidget(type_combo)
-            type_layout.setContentsMargins(6, 0, 6, 0)
-            type_layout.setAlignment(Qt.AlignmentFlag.AlignCenter)
-            self.table.setCellWidget(row_position, 2, type_container)
-
-            weeks_item = QTableWidgetItem(str(data['Недели']))
-            weeks_item.setTextAlignment(Qt.AlignmentFlag.AlignCenter | Qt.AlignmentFlag.AlignVCenter)
-            font = QFont()
-            font.setPointSize(16)
-            weeks_item.setFont(font)
-            self.table.setItem(row_position, 3, weeks_item)
+    def solve_plan(self):
+        """Упорядочить периоды таблицы по требуемым неделям и ограничениям"""
+        periods_data = self.get_table_data()
 
-            self.table.setRowHeight(row_position, 82)
+        if not periods_data:
+            QMessageBox.warning(self, 'Внимание', 'Добавьте периоды обучения')
+            return
 
-        self.update_weeks_total()
+        totals = {}
+        for period in periods_data:
+            key = (period['Год'], period['Семестр'], period['Тип'])
+            totals[key] = totals.get(key, 0) + period['Недели']
+
+        warnings = []
+        try:
+            periods_data = self.app.solve_plan(
+                totals, self.start_year, self.work_week,
+                holidays_in_vacation=self.holidays_in_vacation_checkbox.isChecked(),
+                semester_after_winter=self.semester_after_winter_checkbox.isChecked(), warnings=warnings)
+        except ValueError as e:
+            QMessageBox.warning(self, 'Подбор порядка', f'❌ Порядок не найден:\n{str(e)}')
+            return
+
+        # Праздники без каникул — на усмотрение пользователя
+        if warnings:
+            answer = QMessageBox.question(self, 'Подбор порядка',
+                                          '⚠️ ' + '\n'.join(warnings) + '\n\nПрименить найденный порядок?')
+            if answer != QMessageBox.StandardButton.Yes:
+                return
+
+        self.periods_data = periods_data
+        self.update_table()
 
     def get_table_data(self):
         data = []
         for row in range(self.table.rowCount()):
-            year_container = self.table.cellWidget(row, 0)
-            semester_container = self.table.cellWidget(row, 1)
-            type_container = self.table.cellWidget(row, 2)
+            year_item = self.table.item(row, 0)
+            semester_item = self.table.item(row, 1)
+            type_item = self.table.item(row, 2)
             weeks_item = self.table.item(row, 3)
 
-            if year_container and semester_container and type_container and weeks_item:
+            if year_item and semester_item and type_item and weeks_item:
                 try:
-                    year_combo = year_container.findChild(QComboBox)
-                    semester_combo = semester_container.findChild(QComboBox)
-                    type_combo = type_container.findChild(QComboBox)
-
-                    if year_combo and semester_combo and type_combo:
-                        weeks = float(weeks_item.text())
-
-                        # Валидация количества недель
-                        if weeks < 0:
-                            QMessageBox.warning(self, 'Ошибка валидации',
-                                              f'Ошибка в строке {row + 1}: Количество недель не может быть отрицательным!\n'
-                                              f'Введено: {weeks}')
-                            return None
-
-                        if weeks > 53:
-                            QMessageBox.warning(self, 'Ошибка валидации',
-                                              f'Ошибка в строке {row + 1}: Количество недель не может превышать 53!\n'
-                                              f'Введено: {weeks}')
-                            return None
-
-                        data.append({
-                            'Год': int(year_combo.currentText()),
-                            'Семестр': int(semester_combo.currentText()),
-                            'Тип': type_combo.currentText(),
-                            'Недели': weeks
-                        })
+                    weeks = float(weeks_item.text())
+
+                    # Валидация количества недель
+                    if weeks < 0:
+                        QMessageBox.warning(self, 'Ошибка валидации',
+                                          f'Ошибка в строке {row + 1}: Количество недель не может быть отрицательным!\n'
+                                          f'Введено: {weeks}')
+                        return None
+
+                    if weeks > 53:
+                        QMessageBox.warning(self, 'Ошибка валидации',
+                                          f'Ошибка в строке {row + 1}: Количество недель не может превышать 53!\n'
+                                          f'Введено: {weeks}')
+                        return None
+
+                    data.append({
+                        'Год': int(year_item.text()),
+                        'Семестр': int(semester_item.text()),
+                        'Тип': type_item.text(),
+                        'Недели': weeks
+                    })
                 except ValueError:
                     QMessageBox.warning(self, 'Ошибка валидации',
                                       f'Ошибка в строке {row + 1}: Некорректное значение в столбце "Недели"!\n'
@@ -1799,45 +4578,291 @@ class MainWindow(QMainWindow):
             return
 
         try:
-            self.generated_schedule = self.app.generate_schedule(periods_data, self.start_year)
-
-            self.preview_table.setRowCount(0)
-            for period in self.generated_schedule:
-                row_position = self.preview_table.rowCount()
-                self.preview_table.insertRow(row_position)
-
-                items = [
-                    str(period['year']),
-                    str(period['semester']),
-                    period['type'],
-                    f"{period['weeks']:.1f}",
-                    period['start_date'].strftime('%d.%m.%Y'),
-                    period['end_date'].strftime('%d.%m.%Y'),
-                    str(len(period['days']))
-                ]
-
-                for col, text in enumerate(items):
-                    item = QTableWidgetItem(text)
-                    item.setTextAlignment(Qt.AlignmentFlag.AlignCenter | Qt.AlignmentFlag.AlignVCenter)
-                    font = QFont()
-                    font.setPointSize(16)
-                    item.setFont(font)
-                    self.preview_table.setItem(row_position, col, item)
-
-                self.preview_table.setRowHeight(row_position, 60)
-
-            self.preview_section.setVisible(True)
+            previous_schedule = self.generated_schedule
+            plan = self.app.prepare_periods(periods_data, self.work_week)
+            self.generated_schedule = self.app.schedule_periods(plan, self.start_year)
+            self.schedule_source = (plan, self.start_year)
+            self.ensure_preview_section()
+            self.schedule_summary = self.app.compute_summary(self.generated_schedule)
+            self.show_schedule_diff(previous_schedule)
+            summary = self.schedule_summary
+
+            self.show_schedule_preview()
             self.download_btn.setEnabled(True)
+            self.schedule_session_save()
 
             QMessageBox.information(self, 'Успех',
                                     f'✅ График создан!\n\n'
-                                    f'📊 Периодов: {len(self.generated_schedule)}\n'
-                                    f'📅 Недель: {sum(p["weeks"] for p in self.generated_schedule):.1f}\n'
-                                    f'📝 Рабочих дней: {sum(len(p["days"]) for p in self.generated_schedule)}')
+                                    f'📊 Периодов: {summary.period_count}\n'
+                                    f'📅 Недель: {summary.total_weeks:.1f}\n'
+                                    f'📝 Рабочих дней: {summary.total_days}')
 
         except Exception as e:
             QMessageBox.critical(self, 'Ошибка', f'Ошибка при генерации:\n{str(e)}')
 
+    def show_schedule_preview(self):
+        """Заполнить раздел просмотра по self.generated_schedule"""
+        program_years = 2 if "Ординатура" in self.program_type else 3
+        self.ensure_preview_section()
+
+        self.preview_table.setRowCount(0)
+        for period in self.generated_schedule:
+            row_position = self.preview_table.rowCount()
+            self.preview_table.insertRow(row_position)
+
+            items = [
+                str(period['year']),
+                str(period['semester']),
+                period['type'],
+                f"{period['weeks']:.1f}",
+                period['start_date'].strftime('%d.%m.%Y'),
+                period['end_date'].strftime('%d.%m.%Y'),
+                str(len(period['days']))
+            ]
+
+            for col, text in enumerate(items):
+                item = QTableWidgetItem(text)
+                item.setTextAlignment(Qt.AlignmentFlag.AlignCenter | Qt.AlignmentFlag.AlignVCenter)
+                font = QFont()
+                font.setPointSize(16)
+                item.setFont(font)
+                self.preview_table.setItem(row_position, col, item)
+
+            self.preview_table.setRowHeight(row_position, 60)
+
+        image = self.app.render_calendar_image(self.generated_schedule, self.start_year, program_years)
+        self.calendar_preview.setPixmap(QPixmap.fromImage(image))
+        self.calendar_view.set_schedules([(f'Набор {self.start_year}', self.generated_schedule)])
+
+        self.preview_section.setVisible(True)
+
+    def show_schedule_diff(self, previous_schedule):
+        """Показать отличия нового графика от предыдущего"""
+        self.schedule_diff = None
+        if previous_schedule and self.generated_schedule:
+            diff = self.app.diff_schedules(previous_schedule, self.generated_schedule)
+            if not diff.is_empty():
+                self.schedule_diff = diff
+
+        if self.preview_section is None:
+            return
+
+        if self.schedule_diff is None:
+            self.diff_label.setVisible(False)
+            self.diff_checkbox.setVisible(False)
+            self.diff_checkbox.setChecked(False)
+            return
+
+        self.diff_label.setText('Изменения относительно предыдущей версии:\n' +
+                                '\n'.join(self.schedule_diff.describe()))
+        self.diff_label.setVisible(True)
+        self.diff_checkbox.setVisible(True)
+
+    def plan_snapshot(self):
+        """Текущий план для истории: настройки и строки таблицы кортежами"""
+        return (self.program_type, self.start_year, self.work_week, tuple(map(tuple, self.table_rows())))
+
+    def record_history(self):
+        if self.history.record(self.plan_snapshot()):
+            self.update_history_buttons()
+
+    def update_history_buttons(self):
+        self.undo_btn.setEnabled(bool(self.history.undo_stack))
+        self.redo_btn.setEnabled(bool(self.history.redo_stack))
+
+    def undo(self):
+        # Незаписанная правка сначала становится шагом истории
+        if self.history_timer.isActive():
+            self.history_timer.stop()
+            self.record_history()
+        self.apply_plan_snapshot(self.history.undo())
+
+    def redo(self):
+        self.apply_plan_snapshot(self.history.redo())
+
+    def apply_plan_snapshot(self, snapshot):
+        """Вернуть таблицу и настройки к снимку истории и пересчитать график, если он был создан"""
+        if snapshot is None:
+            return
+        program_type, start_year, work_week, rows = snapshot
+        self.set_plan(program_type, start_year, work_week, [dict(zip(TABLE_COLUMNS, row)) for row in rows])
+        self.update_history_buttons()
+
+        if self.generated_schedule is not None:
+            self.regenerate_schedule()
+
+    def regenerate_schedule(self):
+        """Пересчитать график по таблице: совпавшие с прежним графиком периоды не строятся заново"""
+        try:
+            plan = self.app.prepare_periods(self.periods_data, self.work_week)
+        except ValueError:
+            # В снимке неверное значение недель: прежний график остается до исправления
+            return
+
+        previous_schedule = self.generated_schedule
+        previous = None
+        if self.schedule_source is not None:
+            previous = self.schedule_source + (previous_schedule,)
+        self.generated_schedule = self.app.schedule_periods(plan, self.start_year, previous)
+        self.schedule_source = (plan, self.start_year)
+        self.schedule_summary = self.app.compute_summary(self.generated_schedule)
+        self.show_schedule_diff(previous_schedule)
+        self.show_schedule_preview()
+        self.schedule_session_save()
+
+    def schedule_session_save(self):
+        """Отложить запись снимка: серия правок дает одну запись"""
+        if self.session_path is not None:
+            self.session_timer.start()
+
+    def table_rows(self):
+        """Строки таблицы без проверок: неверные значения недель сохраняются текстом"""
+        rows = []
+        for row in range(self.table.rowCount()):
+            values = [self.table.item(row, col).text() for col in range(len(TABLE_COLUMNS))]
+            try:
+                weeks = float(values[3])
+                if values[3] == str(int(weeks)):
+                    values[3] = int(weeks)
+                elif values[3] == str(weeks):
+                    values[3] = weeks
+            except (ValueError, OverflowError):
+                pass
+            rows.append([int(values[0]), int(values[1]), values[2], values[3]])
+        return rows
+
+    def save_session(self):
+        """Записать снимок сессии в фоновом потоке, если что-то изменилось"""
+        self.session_timer.stop()
+        state = {'program_type': self.program_type, 'start_year': self.start_year, 'work_week': self.work_week,
+                 'rows': self.table_rows(), 'schedule': self.generated_schedule}
+        saved = self.session_saved
+        if saved is not None and saved['schedule'] is state['schedule'] and \
+                all(saved[key] == state[key] for key in ('program_type', 'start_year', 'work_week', 'rows')):
+            return
+        self.session_saved = state
+
+        state = dict(state, calendar_hash=self.app.holiday_calendar.source_hash().hex())
+        if self.session_executor is None:
+            self.session_executor = ThreadPoolExecutor(max_workers=1)
+        self.session_executor.submit(save_session_file, self.session_path, state)
+
+    def restore_session(self):
+        """Восстановить таблицу, настройки и график из снимка без повторной генерации"""
+        if self.session_path is None:
+            return
+        try:
+            with open(self.session_path, 'rb') as f:
+                state = decode_session(f.read())
+        except (OSError, ValueError):
+            return
+
+        if not self.can_set_plan(state['program_type'], state['start_year'], state['work_week']):
+            return
+
+        self.set_plan(state['program_type'], state['start_year'], state['work_week'],
+                      [dict(zip(TABLE_COLUMNS, row)) for row in state['rows']])
+
+        # График строился по другим праздникам: таблица остается, график нужно создать заново
+        if state['schedule'] and state['calendar_hash'] == self.app.holiday_calendar.source_hash().hex():
+            self.show_stored_schedule(state['schedule'])
+
+        self.session_saved = {'program_type': self.program_type, 'start_year': self.start_year,
+                              'work_week': self.work_week, 'rows': self.table_rows(),
+                              'schedule': self.generated_schedule}
+
+    def closeEvent(self, event):
+        # Несохраненные правки записываются до выхода
+        if self.session_timer.isActive():
+            self.save_session()
+        if self.session_executor is not None:
+            self.session_executor.shutdown(wait=True)
+            self.session_executor = None
+        if self.catalog is not None:
+            self.catalog.close()
+            self.catalog = None
+        super().closeEvent(event)
+
+    def get_catalog(self):
+        if self.catalog is None:
+            self.catalog = PlanCatalog(self.catalog_path)
+        return self.catalog
+
+    def save_to_catalog(self):
+        """Сохранить таблицу и, если он построен по ней, график в каталог планов"""
+        periods_data = self.get_table_data()
+        if not periods_data:
+            if periods_data is not None:
+                QMessageBox.warning(self, 'Внимание', 'Добавьте периоды обучения')
+            return
+
+        name, ok = QInputDialog.getText(self, 'Сохранить в каталог', 'Название плана:',
+                                        text=f'{self.program_type} {self.start_year}')
+        if not ok or not name.strip():
+            return
+
+        plan = {'name': name.strip(), 'program_type': self.program_type, 'start_year': self.start_year,
+                'work_week': self.work_week, 'periods_data': periods_data, 'schedule': None}
+        if self.schedule_source == (self.app.prepare_periods(periods_data, self.work_week), self.start_year):
+            plan['schedule'] = self.generated_schedule
+            plan['calendar_hash'] = self.app.holiday_calendar.source_hash().hex()
+
+        try:
+            self.get_catalog().save_plans([plan])
+        except (sqlite3.Error, ValueError, OSError) as e:
+            QMessageBox.critical(self, 'Ошибка', f'Ошибка каталога:\n{str(e)}')
+            return
+        QMessageBox.information(self, 'Успех', f'✅ План «{plan["name"]}» сохранен в каталог')
+
+    def open_from_catalog(self):
+        """Найти план в каталоге по условиям и загрузить его вместе с сохраненным графиком"""
+        query, ok = QInputDialog.getText(self, 'Каталог планов',
+                                         'Условия (например: Аспирантура 2026 ГИА:2.2), пусто — все планы:')
+        if not ok:
+            return
+
+        try:
+            found = self.get_catalog().find_plans(**parse_catalog_query(query))
+        except (sqlite3.Error, ValueError, OSError) as e:
+            QMessageBox.critical(self, 'Ошибка', f'Ошибка каталога:\n{str(e)}')
+            return
+        if not found:
+            QMessageBox.information(self, 'Каталог планов', 'Планы не найдены')
+            return
+
+        labels = [f"{plan['name']} — {plan['program_type']}, {plan['start_year']}, {plan['saved_at']}"
+                  for plan in found]
+        label, ok = QInputDialog.getItem(self, 'Каталог планов', f'Найдено планов: {len(found)}', labels, 0, False)
+        if not ok:
+            return
+
+        plan = self.get_catalog().load_plans([found[labels.index(label)]['id']])[0]
+        if not self.can_set_plan(plan['program_type'], plan['start_year'], plan['work_week']):
+            QMessageBox.warning(self, 'Внимание', 'Программа или год плана не поддерживаются')
+            return
+        self.set_plan(plan['program_type'], plan['start_year'], plan['work_week'], plan['periods_data'])
+
+        # График из каталога, если он построен по тем же праздникам
+        if plan['schedule'] and plan['calendar_hash'] == self.app.holiday_calendar.source_hash().hex():
+            plan_source = (self.app.prepare_periods(plan['periods_data'], plan['work_week']), plan['start_year'])
+            self.show_stored_schedule(plan['schedule'], plan_source)
+            self.schedule_session_save()
+
+    def record_export(self, filename, fmt):
+        """Отметить выгрузку у плана каталога с тем же содержимым; каталог не создается ради этого"""
+        if self.catalog_path is None or (self.catalog is None and not os.path.exists(self.catalog_path)):
+            return
+        periods_data = [{'Год': period['year'], 'Семестр': period['semester'], 'Тип': period['type'],
+                         'Недели': period['weeks']} for period in self.generated_schedule]
+        content_hash = plan_content_hash(self.program_type, self.start_year, self.work_week, periods_data)
+        try:
+            catalog = self.get_catalog()
+            for plan in catalog.find_plans(content_hash=content_hash):
+                if plan['content_hash'] == content_hash:
+                    catalog.record_export(plan['id'], filename, fmt, os.path.getsize(filename))
+        except (sqlite3.Error, ValueError, OSError):
+            pass
+
     def download_excel(self):
         if not self.generated_schedule:
             QMessageBox.warning(self, 'Внимание', 'Сначала сгенерируйте график')
@@ -1847,26 +4872,215 @@ class MainWindow(QMainWindow):
             self,
             'Сохранить Excel файл',
             f'график_{self.start_year}-{self.start_year + (2 if "Ординатура" in self.program_type else 3)}.xlsx',
-            'Excel Files (*.xlsx)'
+            'Excel Files (*.xlsx);;CSV по дням (*.csv);;JSON по периодам (*.json);;iCalendar (*.ics)'
         )
 
         if filename:
             try:
-                wb = self.app.create_excel_file(self.generated_schedule, self.start_year, self.program_type)
-                wb.save(filename)
+                fmt = os.path.splitext(filename)[1].lower().lstrip('.')
+                if fmt in ('csv', 'json', 'ics'):
+                    groups = [{'name': f'{self.program_type} {self.start_year}', 'start_year': self.start_year,
+                               'schedule': self.generated_schedule}]
+                    self.app.save_file_atomic(filename, lambda f: self.app.write_schedule_text(groups, f, fmt))
+                else:
+                    diff = self.schedule_diff if self.diff_checkbox.isChecked() else None
+                    self.app.save_excel_atomic(self.generated_schedule, self.start_year, self.program_type,
+                                               filename, self.schedule_summary, diff=diff, incremental=True)
+                self.record_export(filename, fmt or 'xlsx')
                 QMessageBox.information(self, 'Успех', f'✅ Файл сохранен:\n{filename}')
             except Exception as e:
                 QMessageBox.critical(self, 'Ошибка', f'Ошибка при сохранении:\n{str(e)}')
 
 
+def write_startup_log(marks):
+    """Записать этапы запуска: [(этап, time.perf_counter())], первая отметка - начало"""
+    steps = [f'{label} {(end - begin) * 1000:.0f} мс'
+             for (_, begin), (label, end) in zip(marks, marks[1:])]
+    line = (f"{datetime.now():%Y-%m-%d %H:%M:%S} " + '; '.join(steps) +
+            f'; всего {(marks[-1][1] - marks[0][1]) * 1000:.0f} мс')
+    print(line, file=sys.stderr)
+    try:
+        os.makedirs(os.path.dirname(STARTUP_LOG_PATH), exist_ok=True)
+        with open(STARTUP_LOG_PATH, 'a', encoding='utf-8') as f:
+            f.write(line + '\n')
+    except OSError:
+        pass
+
+
+class StartupTimer(QObject):
+    """Отметка первой отрисовки окна для журнала запуска"""
+
+    def __init__(self, window, marks):
+        super().__init__(window)
+        self.marks = marks
+        window.installEventFilter(self)
+
+    def eventFilter(self, obj, event):
+        if event.type() == QEvent.Type.Paint:
+            obj.removeEventFilter(self)
+            self.marks.append(('первая отрисовка', time.perf_counter()))
+            write_startup_log(self.marks)
+        return False
+
+
 def main():
+    # Процессы-исполнители экспорта в собранном exe
+    multiprocessing.freeze_support()
+
+    if len(sys.argv) > 1 and sys.argv[1] == '--build-calendar':
+        path = sys.argv[2] if len(sys.argv) > 2 else CALENDAR_STORE_PATH
+        schedule_app = EducationalScheduleApp()
+        build_calendar_store(path, schedule_app.holiday_calendar)
+        print(f'Календарь сохранен: {path}')
+        return
+
+    if len(sys.argv) > 1 and sys.argv[1] == '--catalog-add':
+        # python main.py --catalog-add книга.xlsx ...: выгруженные книги в каталог одной транзакцией
+        schedule_app = EducationalScheduleApp()
+        calendar_hash = schedule_app.holiday_calendar.source_hash().hex()
+        plans = []
+        for filename, imported, error in schedule_app.import_excel_archive(sys.argv[2:]):
+            if error:
+                print(f'{filename}: {error}')
+                continue
+            periods_data, start_year, program_type = imported
+            work_week = PROGRAM_WORK_WEEKS.get(program_type, WORK_WEEK_5)
+            plans.append({'name': os.path.splitext(os.path.basename(filename))[0], 'program_type': program_type,
+                          'start_year': start_year, 'work_week': work_week, 'periods_data': periods_data,
+                          'schedule': schedule_app.generate_schedule(periods_data, start_year, work_week),
+                          'calendar_hash': calendar_hash})
+        catalog = PlanCatalog()
+        plan_ids = catalog.save_plans(plans)
+        catalog.close()
+        print(f'Сохранено планов: {len(set(plan_ids))} ({CATALOG_PATH})')
+        return
+
+    if len(sys.argv) > 1 and sys.argv[1] == '--catalog-find':
+        # python main.py --catalog-find Аспирантура ГИА:2.2: поиск в каталоге без открытия xlsx
+        try:
+            filters = parse_catalog_query(' '.join(sys.argv[2:]))
+        except ValueError as e:
+            sys.exit(str(e))
+        catalog = PlanCatalog()
+        for plan in catalog.find_plans(**filters):
+            print(f"{plan['id']}\t{plan['name']}\t{plan['program_type']}\t{plan['start_year']}\t"
+                  f"{plan['saved_at']}\t{plan['content_hash'][:12]}")
+        catalog.close()
+        return
+
+    if len(sys.argv) > 1 and sys.argv[1] == '--export-groups':
+        # python main.py --export-groups группы.xlsx книга.xlsx ...: графики книг листами одной книги
+        out_path = sys.argv[2]
+        schedule_app = EducationalScheduleApp()
+        groups = []
+        program_types = set()
+        for filename, imported, error in schedule_app.import_excel_archive(sys.argv[3:]):
+            if error:
+                print(f'{filename}: {error}')
+                continue
+            periods_data, start_year, program_type = imported
+            work_week = PROGRAM_WORK_WEEKS.get(program_type, WORK_WEEK_5)
+            groups.append({'name': os.path.splitext(os.path.basename(filename))[0], 'start_year': start_year,
+                           'schedule': schedule_app.generate_schedule(periods_data, start_year, work_week)})
+            program_types.add(program_type)
+        if len(program_types) != 1:
+            sys.exit('Нужны книги одной программы')
+        program_type = program_types.pop()
+
+        # Один пул на всю выгрузку: процессы поднимаются один раз
+        with schedule_app.export_pool() as executor:
+            schedule_app.save_file_atomic(out_path, lambda f: schedule_app.save_excel_groups(
+                groups, program_type, f, executor=executor))
+        print(f'Групп: {len(groups)} ({out_path})')
+        return
+
+    if len(sys.argv) > 1 and sys.argv[1] == '--cohorts':
+        # python main.py --cohorts книга.xlsx 2025,2026:30,... [П=60,У=60] [группы.xlsx]:
+        # наборы по шаблону книги (год начала:студентов), перестановка практик под вместимость баз
+        # и книга по группам с листом загрузки
+        schedule_app = EducationalScheduleApp()
+        try:
+            periods_data, _, program_type = schedule_app.import_excel_schedule(sys.argv[2])
+            students = {}
+            for item in sys.argv[3].split(','):
+                year, _, count = item.partition(':')
+                students[int(year)] = int(count or 1)
+            capacities = {}
+            for item in filter(None, (sys.argv[4] if len(sys.argv) > 4 else '').split(',')):
+                code, _, count = item.partition('=')
+                if code not in ACTIVITY_TYPES:
+                    raise ValueError(f'Неизвестный тип занятий: {code}')
+                capacities[code] = int(count)
+        except IndexError:
+            sys.exit('Использование: --cohorts книга.xlsx годы [вместимость] [группы.xlsx]')
+        except (OSError, ValueError, KeyError, zipfile.BadZipFile, InvalidFileException) as e:
+            sys.exit(str(e))
+
+        work_week = PROGRAM_WORK_WEEKS.get(program_type, WORK_WEEK_5)
+        start_years = sorted(students)
+        schedules = {start_year: generated_schedule for start_year, (generated_schedule, _)
+                     in schedule_app.generate_cohorts(periods_data, start_years, program_type, work_week).items()}
+
+        if capacities:
+            cohorts = [{'start_year': start_year, 'periods': periods_data, 'students': students[start_year],
+                        'work_week': work_week} for start_year in start_years]
+            optimizer = PlacementOptimizer(schedule_app, cohorts, capacities)
+            before = optimizer.overflow
+            after = optimizer.optimize()
+            print(f'Превышение вместимости: {before} -> {after} студенто-дн.')
+            for start_year, layout in zip(start_years, optimizer.layouts()):
+                if layout != periods_data:
+                    schedules[start_year] = schedule_app.generate_schedule(layout, start_year, work_week)
+                    print(f"{start_year}: {' '.join(row['Тип'] for row in layout)}")
+
+        if len(sys.argv) > 5:
+            groups = [{'name': f'Набор {start_year}', 'start_year': start_year, 'schedule': schedules[start_year],
+                       'students': students[start_year]} for start_year in start_years]
+            with schedule_app.export_pool() as executor:
+                schedule_app.save_file_atomic(sys.argv[5], lambda f: schedule_app.save_excel_groups(
+                    groups, program_type, f, occupancy=OccupancyIndex.from_groups(groups), executor=executor))
+            print(f'Групп: {len(groups)} ({sys.argv[5]})')
+        return
+
+    if len(sys.argv) > 1 and sys.argv[1] == '--thumbnails':
+        # python main.py --thumbnails папка книга.xlsx ...: миниатюры календаря без окна.
+        # Шрифтам подписей нужен QGuiApplication; платформа offscreen задается до его создания,
+        # поэтому на сервере без дисплея ничего настраивать не нужно
+        os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+        gui_app = QGuiApplication(sys.argv[:1])
+        out_dir = sys.argv[2]
+        os.makedirs(out_dir, exist_ok=True)
+        schedule_app = EducationalScheduleApp()
+        for filename, imported, error in schedule_app.import_excel_archive(sys.argv[3:]):
+            if error:
+                print(f'{filename}: {error}')
+                continue
+            periods_data, start_year, program_type = imported
+            generated_schedule = schedule_app.generate_schedule(periods_data, start_year)
+            program_years = 2 if "Ординатура" in program_type else 3
+            path = os.path.join(out_dir, os.path.splitext(os.path.basename(filename))[0] + '.png')
+            with open(path, 'wb') as f:
+                schedule_app.save_calendar_png(generated_schedule, start_year, program_years, f)
+            print(path)
+        del gui_app
+        return
+
+    startup_log = '--startup-log' in sys.argv or bool(os.environ.get('PLAN_APP_STARTUP_LOG'))
+    if '--startup-log' in sys.argv:
+        sys.argv.remove('--startup-log')
+    marks = [('старт', STARTUP_STARTED), ('импорт модулей', time.perf_counter())]
+
     app = QApplication(sys.argv)
 
     font = QFont()
     font.setPointSize(10)
     app.setFont(font)
+    marks.append(('QApplication', time.perf_counter()))
 
     window = MainWindow()
+    marks.append(('построение окна', time.perf_counter()))
+    if startup_log:
+        StartupTimer(window, marks)
     window.show()
     sys.exit(app.exec())
 
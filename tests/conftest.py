@@ -0,0 +1,43 @@
+import os
+import sys
+
+# Картинки и окно рисуются без экрана
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+import main
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    """Приложение без файлов профиля: календарь в памяти, шаблоны во временной папке"""
+    monkeypatch.setattr(main, 'HOLIDAY_OVERRIDE_FILES', [])
+    monkeypatch.setattr(main, 'TEMPLATE_CACHE_DIR', str(tmp_path / 'templates'))
+    return main.EducationalScheduleApp(calendar_store_path=None)
+
+
+@pytest.fixture(scope='session')
+def qapp():
+    from PyQt6.QtWidgets import QApplication
+    return QApplication.instance() or QApplication([])
+
+
+@pytest.fixture
+def window(qapp, tmp_path, monkeypatch):
+    """Окно с сессией и каталогом во временной папке; сообщения копятся в window.messages"""
+    monkeypatch.setattr(main, 'HOLIDAY_OVERRIDE_FILES', [])
+    monkeypatch.setattr(main, 'TEMPLATE_CACHE_DIR', str(tmp_path / 'templates'))
+    monkeypatch.setattr(main, 'CALENDAR_STORE_PATH', str(tmp_path / 'calendar.bin'))
+
+    messages = []
+    for kind in ('information', 'warning', 'critical'):
+        monkeypatch.setattr(main.QMessageBox, kind,
+                            staticmethod(lambda parent, title, text, *args, kind=kind: messages.append((kind, text))))
+
+    window = main.MainWindow(session_path=str(tmp_path / 'session.bin'),
+                             catalog_path=str(tmp_path / 'catalog.sqlite3'))
+    window.messages = messages
+    yield window
+    window.close()
@@ -0,0 +1,52 @@
+"""Планы из примеров окна (MainWindow.load_example)"""
+
+ORDINATURA = [
+    {'Год': 1, 'Семестр': 1, 'Тип': 'Т', 'Недели': 10},
+    {'Год': 1, 'Семестр': 1, 'Тип': 'П', 'Недели': 12},
+    {'Год': 1, 'Семестр': 1, 'Тип': 'ПА', 'Недели': 1},
+    {'Год': 1, 'Семестр': 2, 'Тип': 'Т', 'Недели': 4},
+    {'Год': 1, 'Семестр': 2, 'Тип': 'П', 'Недели': 16},
+    {'Год': 1, 'Семестр': 2, 'Тип': 'ПА', 'Недели': 1},
+    {'Год': 1, 'Семестр': 2, 'Тип': 'К', 'Недели': 6},
+    {'Год': 2, 'Семестр': 1, 'Тип': 'Т', 'Недели': 10},
+    {'Год': 2, 'Семестр': 1, 'Тип': 'П', 'Недели': 12},
+    {'Год': 2, 'Семестр': 1, 'Тип': 'ПА', 'Недели': 1},
+    {'Год': 2, 'Семестр': 2, 'Тип': 'Т', 'Недели': 9},
+    {'Год': 2, 'Семестр': 2, 'Тип': 'П', 'Недели': 8},
+    {'Год': 2, 'Семестр': 2, 'Тип': 'ПА', 'Недели': 1},
+    {'Год': 2, 'Семестр': 2, 'Тип': 'ГИА', 'Недели': 2},
+    {'Год': 2, 'Семестр': 2, 'Тип': 'К', 'Недели': 6},
+]
+
+ASPIRANTURA = [
+    {'Год': 1, 'Семестр': 1, 'Тип': 'Т', 'Недели': 12},
+    {'Год': 1, 'Семестр': 1, 'Тип': 'Э', 'Недели': 2},
+    {'Год': 1, 'Семестр': 1, 'Тип': 'П', 'Недели': 8},
+    {'Год': 1, 'Семестр': 1, 'Тип': 'ПА', 'Недели': 1},
+    {'Год': 1, 'Семестр': 2, 'Тип': 'Т', 'Недели': 10},
+    {'Год': 1, 'Семестр': 2, 'Тип': 'Э', 'Недели': 2},
+    {'Год': 1, 'Семестр': 2, 'Тип': 'П', 'Недели': 6},
+    {'Год': 1, 'Семестр': 2, 'Тип': 'ПА', 'Недели': 1},
+    {'Год': 1, 'Семестр': 2, 'Тип': 'К', 'Недели': 6},
+    {'Год': 2, 'Семестр': 1, 'Тип': 'Т', 'Недели': 12},
+    {'Год': 2, 'Семестр': 1, 'Тип': 'Э', 'Недели': 2},
+    {'Год': 2, 'Семестр': 1, 'Тип': 'П', 'Недели': 8},
+    {'Год': 2, 'Семестр': 1, 'Тип': 'ПА', 'Недели': 1},
+    {'Год': 2, 'Семестр': 2, 'Тип': 'Т', 'Недели': 10},
+    {'Год': 2, 'Семестр': 2, 'Тип': 'Э', 'Недели': 2},
+    {'Год': 2, 'Семестр': 2, 'Тип': 'П', 'Недели': 6},
+    {'Год': 2, 'Семестр': 2, 'Тип': 'ПА', 'Недели': 1},
+    {'Год': 2, 'Семестр': 2, 'Тип': 'К', 'Недели': 6},
+    {'Год': 3, 'Семестр': 1, 'Тип': 'Т', 'Недели': 10},
+    {'Год': 3, 'Семестр': 1, 'Тип': 'У', 'Недели': 4},
+    {'Год': 3, 'Семестр': 1, 'Тип': 'П', 'Недели': 8},
+    {'Год': 3, 'Семестр': 1, 'Тип': 'ПА', 'Недели': 1},
+    {'Год': 3, 'Семестр': 2, 'Тип': 'Т', 'Недели': 6},
+    {'Год': 3, 'Семестр': 2, 'Тип': 'П', 'Недели': 6},
+    {'Год': 3, 'Семестр': 2, 'Тип': 'Г', 'Недели': 2},
+    {'Год': 3, 'Семестр': 2, 'Тип': 'Д', 'Недели': 4},
+    {'Год': 3, 'Семестр': 2, 'Тип': 'К', 'Недели': 8},
+]
+
+ORDINATURA_TYPE = 'Ординатура (2 года)'
+ASPIRANTURA_TYPE = 'Аспирантура (3 года)'
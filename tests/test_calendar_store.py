@@ -0,0 +1,35 @@
+from datetime import datetime
+
+import main
+from sample_plans import ASPIRANTURA
+
+
+def test_missing_store_is_not_built(tmp_path):
+    path = tmp_path / 'calendar.bin'
+    app = main.EducationalScheduleApp(calendar_store_path=str(path))
+
+    assert app.calendar_store is None
+    assert not path.exists()
+    assert app.is_holiday(datetime(2026, 1, 7))
+
+
+def test_built_store_matches_memory_index(app, tmp_path):
+    path = str(tmp_path / 'calendar.bin')
+    main.build_calendar_store(path, app.holiday_calendar)
+    assert [entry.name for entry in tmp_path.iterdir()] == ['calendar.bin']
+
+    stored = main.EducationalScheduleApp(calendar_store_path=path, holiday_calendar=app.holiday_calendar)
+    assert stored.calendar_store is not None
+    assert stored.generate_schedule(ASPIRANTURA, 2026) == app.generate_schedule(ASPIRANTURA, 2026)
+    stored.calendar_store.close()
+
+
+def test_stale_store_falls_back_to_memory(app, tmp_path):
+    path = str(tmp_path / 'calendar.bin')
+    main.build_calendar_store(path, main.HolidayCalendar())
+
+    # Другие списки праздников: файл не используется и не перезаписывается
+    before = (tmp_path / 'calendar.bin').read_bytes()
+    stale = main.EducationalScheduleApp(calendar_store_path=path, holiday_calendar=app.holiday_calendar)
+    assert stale.calendar_store is None
+    assert (tmp_path / 'calendar.bin').read_bytes() == before
@@ -0,0 +1,63 @@
+import pytest
+
+import main
+from sample_plans import ASPIRANTURA, ASPIRANTURA_TYPE, ORDINATURA, ORDINATURA_TYPE
+
+
+def make_plan(app, name, program_type, start_year, periods_data, generate=True):
+    work_week = main.PROGRAM_WORK_WEEKS[program_type]
+    schedule = app.generate_schedule(periods_data, start_year, work_week) if generate else None
+    return {'name': name, 'program_type': program_type, 'start_year': start_year, 'work_week': work_week,
+            'periods_data': periods_data, 'schedule': schedule,
+            'calendar_hash': app.holiday_calendar.source_hash().hex()}
+
+
+@pytest.fixture
+def catalog(tmp_path):
+    catalog = main.PlanCatalog(str(tmp_path / 'catalog.sqlite3'))
+    yield catalog
+    catalog.close()
+
+
+def test_catalog_save_load_find(app, catalog):
+    ordinatura = make_plan(app, 'Ординатура 2025', ORDINATURA_TYPE, 2025, ORDINATURA)
+    aspirantura = make_plan(app, 'Аспирантура 2026', ASPIRANTURA_TYPE, 2026, ASPIRANTURA, generate=False)
+    # Одинаковые планы в одном пакете хранятся один раз
+    plan_ids = catalog.save_plans([ordinatura, aspirantura, dict(ordinatura, name='Копия')])
+    assert plan_ids[0] == plan_ids[2] != plan_ids[1]
+    assert len(catalog.find_plans()) == 2
+
+    loaded = catalog.load_plans([plan_ids[1], plan_ids[0], 999])
+    assert [plan['id'] for plan in loaded] == [plan_ids[1], plan_ids[0]]
+    assert loaded[1]['name'] == 'Копия'
+    for plan, source in zip(loaded, (aspirantura, ordinatura)):
+        assert plan['periods_data'] == source['periods_data']
+        assert plan['schedule'] == source['schedule']
+        assert plan['work_week'] == source['work_week']
+
+    # Повторное сохранение без графика оставляет прежний график
+    assert catalog.save_plans([dict(ordinatura, name='Без графика', schedule=None)]) == [plan_ids[0]]
+    assert catalog.load_plans([plan_ids[0]])[0]['schedule'] == ordinatura['schedule']
+
+    content_hash = loaded[0]['content_hash']
+    for query, expected in [('', plan_ids[:2]),
+                            ('Асп', [plan_ids[1]]),
+                            ('2025', [plan_ids[0]]),
+                            ('ГИА:2.2', [plan_ids[0]]),
+                            ('Г:3', [plan_ids[1]]),
+                            ('ГИА:.1', []),
+                            (f'hash:{content_hash[:4].upper()}', [plan_ids[1]]),
+                            ('Ординатура 2026', [])]:
+        found = catalog.find_plans(**main.parse_catalog_query(query))
+        assert sorted(plan['id'] for plan in found) == sorted(expected), query
+
+    catalog.record_export(plan_ids[0], 'a.xlsx', 'xlsx', 100)
+    catalog.record_export(plan_ids[0], 'a.ics', 'ics', 20)
+    assert [row[:3] for row in catalog.exports(plan_ids[0])] == [('a.ics', 'ics', 20), ('a.xlsx', 'xlsx', 100)]
+    assert catalog.exports(plan_ids[1]) == []
+
+
+@pytest.mark.parametrize('query', ['ГИА:x', 'Магистратура', '20255'])
+def test_catalog_query_errors(query):
+    with pytest.raises(ValueError):
+        main.parse_catalog_query(query)
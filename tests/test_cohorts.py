@@ -0,0 +1,43 @@
+import main
+from sample_plans import ASPIRANTURA, ASPIRANTURA_TYPE
+
+# Один семестр: практику можно поставить в любую из четырех двухнедельных позиций до аттестации
+SEMESTER = [
+    {'Год': 1, 'Семестр': 1, 'Тип': 'Т', 'Недели': 2},
+    {'Год': 1, 'Семестр': 1, 'Тип': 'П', 'Недели': 2},
+    {'Год': 1, 'Семестр': 1, 'Тип': 'Т', 'Недели': 2},
+    {'Год': 1, 'Семестр': 1, 'Тип': 'Т', 'Недели': 2},
+    {'Год': 1, 'Семестр': 1, 'Тип': 'ПА', 'Недели': 1},
+    {'Год': 1, 'Семестр': 1, 'Тип': 'К', 'Недели': 1},
+]
+
+
+def practice_overflow(app, layouts, capacity):
+    """Превышение перебором по дням графиков"""
+    counts = {}
+    for layout in layouts:
+        for period in app.generate_schedule(layout, 2025):
+            if period['type'] == 'П':
+                for day in period['days']:
+                    counts[day] = counts.get(day, 0) + 1
+    return sum(max(0, count - capacity) for count in counts.values())
+
+
+def test_generate_cohorts_matches_single_schedules(app):
+    cohorts = app.generate_cohorts(ASPIRANTURA, [2025, 2026, 2027], ASPIRANTURA_TYPE)
+    for start_year, (generated_schedule, summary) in cohorts.items():
+        assert generated_schedule == app.generate_schedule(ASPIRANTURA, start_year)
+
+
+def test_overflow_drops_to_zero(app):
+    cohorts = [{'start_year': 2025, 'periods': SEMESTER, 'students': 1} for _ in range(6)]
+    assert practice_overflow(app, [SEMESTER] * 6, 2) > 0
+
+    layouts, overflow = app.optimize_placements(cohorts, {'П': 2})
+
+    assert overflow == 0
+    assert practice_overflow(app, layouts, 2) == 0
+    for layout in layouts:
+        assert sorted(map(id, layout)) == sorted(map(id, SEMESTER))
+        # Хвост семестра на месте: практика не уходит за аттестацию
+        assert layout[4:] == SEMESTER[4:]
@@ -0,0 +1,39 @@
+import pytest
+
+import main
+from sample_plans import ASPIRANTURA, ASPIRANTURA_TYPE, ORDINATURA, ORDINATURA_TYPE
+
+
+def schedule_days(generated_schedule):
+    return [(period['year'], period['semester'], period['type'], period['days']) for period in generated_schedule]
+
+
+@pytest.mark.parametrize('program_type, plan, start_year, work_week', [
+    (ORDINATURA_TYPE, ORDINATURA, 2025, main.WORK_WEEK_5),
+    (ASPIRANTURA_TYPE, ASPIRANTURA, 2026, main.WORK_WEEK_5),
+    (ORDINATURA_TYPE, ORDINATURA, 2027, main.WORK_WEEK_6),
+])
+@pytest.mark.parametrize('streaming, incremental', [(False, False), (True, False), (True, True)])
+def test_import_round_trip(app, tmp_path, program_type, plan, start_year, work_week, streaming, incremental):
+    # Дробные недели: импорт должен вернуть те же рабочие дни
+    plan = [dict(row, Недели=row['Недели'] + 0.2 * (idx % 3)) for idx, row in enumerate(plan)]
+    generated_schedule = app.generate_schedule(plan, start_year, work_week)
+    filename = str(tmp_path / 'график.xlsx')
+    app.save_excel_atomic(generated_schedule, start_year, program_type, filename, streaming=streaming,
+                          incremental=incremental)
+
+    periods_data, imported_year, imported_type = app.import_excel_schedule(filename, work_week)
+
+    assert (imported_year, imported_type) == (start_year, program_type)
+    assert [(row['Год'], row['Семестр'], row['Тип']) for row in periods_data] == \
+        [(row['Год'], row['Семестр'], row['Тип']) for row in plan]
+    assert schedule_days(app.generate_schedule(periods_data, start_year, work_week)) == \
+        schedule_days(generated_schedule)
+
+
+def test_import_archive_reports_bad_files(app, tmp_path):
+    broken = tmp_path / 'не книга.xlsx'
+    broken.write_bytes(b'not a zip')
+
+    [(filename, imported, error)] = app.import_excel_archive([str(broken)])
+    assert imported is None and error
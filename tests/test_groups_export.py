@@ -0,0 +1,37 @@
+import io
+import zipfile
+
+from openpyxl import load_workbook
+
+import main
+from sample_plans import ORDINATURA, ORDINATURA_TYPE
+
+
+def test_three_group_workbook_opens(app):
+    groups = [{'name': f'Группа "{year}"', 'start_year': year, 'schedule': app.generate_schedule(ORDINATURA, year),
+               'students': 10 + year % 10} for year in (2025, 2026, 2027)]
+    buffer = io.BytesIO()
+    app.save_excel_groups(groups, ORDINATURA_TYPE, buffer, occupancy=main.OccupancyIndex.from_groups(groups))
+
+    with zipfile.ZipFile(io.BytesIO(buffer.getvalue())) as package:
+        assert package.testzip() is None
+        assert main.CALENDAR_SHEET_PATH not in package.namelist()
+
+    wb = load_workbook(io.BytesIO(buffer.getvalue()))
+    names = [group['name'] for group in groups]
+    assert wb.sheetnames == ['Условные обозначения', 'Итоги', main.GROUPS_SHEET_TITLE,
+                             main.OCCUPANCY_SHEET_TITLE] + names
+    for group, name in zip(groups, names):
+        assert wb[name]['A1'].value == app.excel_title(group['start_year'], 2)
+        assert wb[name].merged_cells.ranges
+
+    # Итоги — по всем группам, а не по первой
+    expected = main.ScheduleSummary.combined(app.compute_summary(group['schedule']) for group in groups)
+    reference = load_workbook(io.BytesIO(app.export_excel_bytes(groups[0]['schedule'], 2025, ORDINATURA_TYPE,
+                                                                   expected)))
+    summary_values = [[cell.value for cell in row] for row in wb['Итоги'].iter_rows(max_col=15)]
+    reference_values = [[cell.value for cell in row] for row in reference['Итоги'].iter_rows(max_col=15)]
+    # От книги одной группы с теми же итогами отличаются только строки численности и числа групп
+    differing = [row for row, reference_row in zip(summary_values, reference_values) if row != reference_row]
+    assert [row[main.SUMMARY_COL_OFFSET - 1] for row in differing] == [48, 3]
+    assert expected.total_days == sum(len(period['days']) for group in groups for period in group['schedule'])
@@ -0,0 +1,111 @@
+import random
+
+import pytest
+
+import main
+from sample_plans import ASPIRANTURA, ASPIRANTURA_TYPE
+
+
+def test_history_undo_redo():
+    rows = tuple((row['Год'], row['Семестр'], row['Тип'], row['Недели']) for row in ASPIRANTURA)
+    first = (ASPIRANTURA_TYPE, 2025, main.WORK_WEEK_5, rows)
+    history = main.PlanHistory(first, limit=3)
+    assert history.undo() is None and history.redo() is None
+    assert not history.record(first)
+
+    second = first[:3] + (tuple(tuple(row) for row in rows[:2]) + ((1, 1, 'Т', 9),) + rows[3:],)
+    assert history.record(second)
+    # Неизмененные строки берутся из прежнего снимка, а не копируются
+    assert history.current[3][0] is rows[0] and history.current[3][-1] is rows[-1]
+
+    third = (ASPIRANTURA_TYPE, 2026) + second[2:]
+    assert history.record(third)
+    assert history.undo() == second
+    assert history.undo() == first
+    assert history.undo() is None
+    assert history.redo() == second
+
+    # Новая правка отменяет повтор
+    assert history.record(first)
+    assert history.redo() is None
+    assert history.undo() == second
+
+    # Старые шаги вытесняются пределом
+    for weeks in range(5):
+        history.record(first[:3] + (((1, 1, 'Т', weeks),),))
+    assert len(history.undo_stack) == 3
+
+
+def set_weeks(window, row, weeks):
+    window.table.item(row, 3).setText(str(weeks))
+    window.history_timer.stop()
+    window.record_history()
+
+
+def full_schedule(window):
+    return window.app.generate_schedule(window.get_table_data(), window.start_year, window.work_week)
+
+
+def test_undo_redo_regenerates_schedule(window):
+    window.program_combo.setCurrentText(ASPIRANTURA_TYPE)
+    window.load_example()
+    window.history_timer.stop()
+    window.record_history()
+    original = full_schedule(window)
+
+    set_weeks(window, 3, 5)
+    set_weeks(window, 10, 1)
+    window.year_combo.setCurrentText('2027')
+    window.history_timer.stop()
+    window.record_history()
+    window.generate_schedule()
+    edited = window.generated_schedule
+    assert edited != original
+
+    # Каждый шаг пересчитывается по прежнему графику и совпадает с полным построением
+    for step in range(3):
+        window.undo()
+        assert window.generated_schedule == full_schedule(window), step
+    assert window.table_rows() == [list(row) for row in window.history.current[3]]
+    assert window.generated_schedule == original
+
+    for step in range(3):
+        window.redo()
+        assert window.generated_schedule == full_schedule(window), step
+    assert window.generated_schedule == edited
+    assert window.schedule_diff is not None
+
+
+def random_row(rnd):
+    return {'Год': rnd.randint(1, 3), 'Семестр': rnd.randint(1, 2), 'Тип': rnd.choice(main.ACTIVITY_TYPES),
+            'Недели': rnd.choice([0, 0.5, 1, 2, 3.5, 6, 12])}
+
+
+def edit_plan(rnd, rows):
+    rows = [dict(row) for row in rows]
+    action = rnd.randrange(4)
+    if action == 0 and rows:
+        rows[rnd.randrange(len(rows))]['Недели'] = rnd.choice([0, 1, 2.5, 8])
+    elif action == 1:
+        rows.insert(rnd.randint(0, len(rows)), random_row(rnd))
+    elif action == 2 and rows:
+        del rows[rnd.randrange(len(rows))]
+    elif len(rows) > 1:
+        i = rnd.randrange(len(rows) - 1)
+        rows[i], rows[i + 1] = rows[i + 1], rows[i]
+    return rows
+
+
+@pytest.mark.parametrize('work_week', [main.WORK_WEEK_5, main.WORK_WEEK_6], ids=['5 days', '6 days'])
+def test_incremental_schedule_matches_full(app, work_week):
+    rnd = random.Random(5)
+    for _ in range(100):
+        before = [random_row(rnd) for _ in range(rnd.randint(0, 25))]
+        after = edit_plan(rnd, before)
+        start_year = rnd.choice([2025, 2026])
+        plan_before = app.prepare_periods(before, work_week)
+        plan_after = app.prepare_periods(after, work_week)
+        previous = (plan_before, start_year, app.schedule_periods(plan_before, start_year))
+        new_year = start_year if rnd.random() < 0.9 else 2027
+        assert (app.schedule_periods(plan_after, new_year, previous) ==
+                app.schedule_periods(plan_after, new_year)), (before, after)
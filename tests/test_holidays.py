@@ -0,0 +1,43 @@
+from datetime import datetime
+
+import pytest
+
+import main
+
+# Будние дни, в которых расчет по правилам расходится с постановлениями:
+# (нет в расчете, лишние в расчете). Субботние переносы и выбор мостов правительством не предсказать
+KNOWN_DEVIATIONS = {
+    2025: (['05-08', '06-13', '11-03'], ['02-24', '03-10', '12-31']),
+    2026: ([], ['12-31']),
+    2027: ([], ['12-31']),
+    2028: ([], ['05-08', '11-06']),
+}
+
+
+def weekdays(days):
+    return {day.strftime('%m-%d') for day in days if day.weekday() < 5}
+
+
+@pytest.mark.parametrize('year', sorted(KNOWN_DEVIATIONS))
+def test_computed_holidays_match_official(app, year):
+    official = weekdays(datetime.strptime(value, '%Y-%m-%d') for value in app.holidays[year])
+    computed = weekdays(main.HolidayCalendar().compute_holidays(year))
+
+    missing, extra = KNOWN_DEVIATIONS[year]
+    assert sorted(official - computed) == missing
+    assert sorted(computed - official) == extra
+
+
+def test_january_weekends_are_carried_over():
+    calendar = main.HolidayCalendar()
+    # 3 и 4 января 2026 — выходные: перенос на мост 9 января и на 31 декабря
+    assert {datetime(2026, 1, 9), datetime(2026, 12, 31)} <= set(calendar.compute_holidays(2026))
+    # 2 января 2027 — на понедельник 22 февраля перед 23 февраля во вторник
+    assert datetime(2027, 2, 22) in calendar.compute_holidays(2027)
+    # Праздник в выходной тоже нерабочий: это важно для шестидневки
+    assert calendar.is_holiday(datetime(2026, 5, 9))
+
+
+def test_computed_years_are_not_official(app):
+    assert app.holiday_calendar.is_official(2026)
+    assert not app.holiday_calendar.is_official(2030)
@@ -0,0 +1,74 @@
+import io
+import struct
+import zipfile
+
+from openpyxl import load_workbook
+
+import main
+from sample_plans import ASPIRANTURA, ASPIRANTURA_TYPE
+
+
+def export(app, plan, start_year, incremental=True):
+    buffer = io.BytesIO()
+    app.write_excel(app.generate_schedule(plan, start_year), start_year, ASPIRANTURA_TYPE, buffer,
+                    streaming=True, incremental=incremental)
+    return buffer.getvalue()
+
+
+def raw_entries(data):
+    """Сжатые данные записей zip как есть, по локальным заголовкам"""
+    entries = {}
+    with zipfile.ZipFile(io.BytesIO(data)) as package:
+        assert package.testzip() is None
+        for info in package.infolist():
+            name_length, extra_length = struct.unpack_from('<HH', data, info.header_offset + 26)
+            start = info.header_offset + 30 + name_length + extra_length
+            entries[info.filename] = data[start:start + info.compress_size]
+    return entries
+
+
+def package_parts(data):
+    with zipfile.ZipFile(io.BytesIO(data)) as package:
+        return {name: package.read(name) for name in package.namelist() if name != 'docProps/core.xml'}
+
+
+def test_incremental_matches_streaming(app):
+    data = export(app, ASPIRANTURA, 2026)
+
+    assert package_parts(data) == package_parts(export(app, ASPIRANTURA, 2026, incremental=False))
+    wb = load_workbook(io.BytesIO(data))
+    assert wb.sheetnames == ['Условные обозначения', 'Календарный график', 'Итоги']
+
+
+def test_one_period_edit_copies_unchanged_entries(app):
+    first = export(app, ASPIRANTURA, 2026)
+    first_blocks = [segment for key, segment in app.package_cache['segments'].items() if key[0] == 'block']
+
+    # Правка последнего периода третьего курса: первые два учебных года не меняются
+    plan = [dict(row) for row in ASPIRANTURA]
+    plan[-1]['Недели'] += 1
+    second = export(app, plan, 2026)
+
+    assert package_parts(second) == package_parts(export(app, plan, 2026, incremental=False))
+
+    first_raw, second_raw = raw_entries(first), raw_entries(second)
+    changed = {name for name in first_raw if first_raw[name] != second_raw[name]} - {'docProps/core.xml'}
+    assert changed == {main.CALENDAR_SHEET_PATH, 'xl/worksheets/sheet3.xml'}
+
+    # Блоки первых двух лет вошли в лист календаря теми же сжатыми байтами
+    for raw, compressed, merges in first_blocks[:2]:
+        assert compressed in second_raw[main.CALENDAR_SHEET_PATH]
+    assert first_blocks[2][1] not in second_raw[main.CALENDAR_SHEET_PATH]
+
+
+def test_large_package_falls_back_to_streaming(app, monkeypatch):
+    def write_zip_entries(*args):
+        raise AssertionError('пакет за границей zip64 записан без zip64')
+
+    monkeypatch.setattr(main, 'ZIP_ENTRIES_LIMIT', 1000)
+    monkeypatch.setattr(main, 'write_zip_entries', write_zip_entries)
+    data = export(app, ASPIRANTURA, 2026)
+
+    with zipfile.ZipFile(io.BytesIO(data)) as package:
+        assert package.testzip() is None
+    assert package_parts(data) == package_parts(export(app, ASPIRANTURA, 2026, incremental=False))
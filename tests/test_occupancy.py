@@ -0,0 +1,34 @@
+import random
+from datetime import timedelta
+
+import main
+from sample_plans import ORDINATURA, ORDINATURA_TYPE
+
+
+def test_occupancy_matches_brute_force(app):
+    cohorts = app.generate_cohorts(ORDINATURA, range(2025, 2029), ORDINATURA_TYPE)
+    groups = [{'start_year': 2025 + idx % 4, 'schedule': cohorts[2025 + idx % 4][0], 'students': 10 + idx}
+              for idx in range(7)]
+    occupancy = main.OccupancyIndex.from_groups(groups)
+
+    brute = {}
+    for group in groups:
+        for period in group['schedule']:
+            for day in period['days']:
+                brute[period['type'], day] = brute.get((period['type'], day), 0) + group['students']
+
+    dates = occupancy.dates()
+    first, last = dates[0] - timedelta(days=3), dates[-1] + timedelta(days=3)
+    for activity_type in main.ACTIVITY_TYPES:
+        day = first
+        while day <= last:
+            assert occupancy.on_day(activity_type, day) == brute.get((activity_type, day), 0)
+            day += timedelta(days=1)
+
+    rng = random.Random(3)
+    for _ in range(200):
+        activity_type = rng.choice(main.ACTIVITY_TYPES)
+        start = first + timedelta(days=rng.randrange((last - first).days))
+        end = start + timedelta(days=rng.randint(-2, 60))
+        expected = sum(count for (code, day), count in brute.items() if code == activity_type and start <= day <= end)
+        assert occupancy.student_days(activity_type, start, end) == expected
@@ -0,0 +1,35 @@
+import io
+import zipfile
+
+from openpyxl import load_workbook
+
+from sample_plans import ORDINATURA, ORDINATURA_TYPE
+
+
+def export_groups(app, groups, executor=None):
+    buffer = io.BytesIO()
+    app.save_excel_groups(groups, ORDINATURA_TYPE, buffer, executor=executor)
+    return buffer.getvalue()
+
+
+def package_parts(data):
+    # В docProps/core.xml время сохранения книги, оно может отличаться на секунду
+    with zipfile.ZipFile(io.BytesIO(data)) as package:
+        return {name: package.read(name) for name in package.namelist() if name != 'docProps/core.xml'}
+
+
+def test_pool_export_matches_sequential(app):
+    # Праздника нет во встроенных списках: исполнители должны взять календарь родителя
+    app.holiday_calendar.official[2025].append('2025-10-01')
+    app.holiday_calendar.compiled.pop(2025, None)
+
+    groups = [{'name': f'Группа {year}', 'start_year': year, 'schedule': app.generate_schedule(ORDINATURA, year)}
+              for year in (2025, 2026, 2027)]
+
+    with app.export_pool(max_workers=2) as executor:
+        parallel = export_groups(app, groups, executor)
+        # Пул принадлежит вызывающему и переживает выгрузку
+        assert export_groups(app, groups[:1], executor)
+
+    assert package_parts(parallel) == package_parts(export_groups(app, groups))
+    assert load_workbook(io.BytesIO(parallel)).sheetnames[-3:] == [group['name'] for group in groups]
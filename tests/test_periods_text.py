@@ -0,0 +1,41 @@
+from PyQt6.QtWidgets import QApplication
+
+import main
+
+
+def test_parse_periods_text(app):
+    periods_data, errors = app.parse_periods_text('Год;Семестр;Тип;Недели\n1;1;Т;10\n1;1;Э;2,5\n\n2;2;К;6\n')
+    assert errors == []
+    assert periods_data == [{'Год': 1, 'Семестр': 1, 'Тип': 'Т', 'Недели': 10.0},
+                            {'Год': 1, 'Семестр': 1, 'Тип': 'Э', 'Недели': 2.5},
+                            {'Год': 2, 'Семестр': 2, 'Тип': 'К', 'Недели': 6.0}]
+
+    periods_data, errors = app.parse_periods_text('1\t1\tТ\t10\n1\t1\tX\t-2\n3\t3\tП\tabc\n1\t2\tК\t60')
+    assert periods_data == []
+    assert errors == [(2, 'Неизвестный тип'), (2, 'Количество недель не может быть отрицательным'),
+                      (3, 'Семестр должен быть 1 или 2'), (3, 'Количество недель должно быть числом'),
+                      (4, 'Количество недель не может превышать 53')]
+
+
+def test_read_periods_csv_from_excel(app, tmp_path):
+    path = tmp_path / 'план.csv'
+    path.write_bytes('Год;Семестр;Тип;Недели\r\n1;1;ГИА;2,5\r\n'.encode('cp1251'))
+    assert app.read_periods_csv(str(path)) == ([{'Год': 1, 'Семестр': 1, 'Тип': 'ГИА', 'Недели': 2.5}], [])
+
+
+def test_paste_appends_rows(window):
+    window.load_example()
+    example = window.get_table_data()
+    rows = [{'Год': 1 + idx % 3, 'Семестр': 1 + idx % 2, 'Тип': main.ACTIVITY_TYPES[idx % 9], 'Недели': idx % 7 + 0.5}
+            for idx in range(500)]
+
+    QApplication.clipboard().setText('\n'.join(f"{row['Год']}\t{row['Семестр']}\t{row['Тип']}\t{row['Недели']}"
+                                               for row in rows))
+    window.paste_periods()
+    assert window.get_table_data() == example + rows
+
+    # Ошибка в одной строке — таблица не меняется
+    QApplication.clipboard().setText('1;1;Т;1\n1;1;Z;1')
+    window.paste_periods()
+    assert window.get_table_data() == example + rows
+    assert window.messages[-1] == ('warning', 'Строка 2: Неизвестный тип')
@@ -0,0 +1,41 @@
+import random
+
+from sample_plans import ORDINATURA
+
+
+def day_types(generated_schedule):
+    return {day: period['type'] for period in generated_schedule for day in period['days']}
+
+
+def test_changed_days_match_brute_force(app):
+    old_schedule = app.generate_schedule(ORDINATURA, 2025)
+    old_days = day_types(old_schedule)
+    rng = random.Random(7)
+
+    for _ in range(40):
+        plan = [dict(row) for row in ORDINATURA]
+        idx = rng.randrange(len(plan))
+        operation = rng.randrange(3)
+        if operation == 0:
+            plan[idx]['Недели'] = max(0.5, plan[idx]['Недели'] + rng.choice([-2, -1, 1, 2]))
+        elif operation == 1:
+            del plan[idx]
+        else:
+            plan.insert(idx, dict(plan[idx], Тип=rng.choice('ТПУЭК'), Недели=rng.choice([1, 2, 3])))
+
+        new_schedule = app.generate_schedule(plan, 2025)
+        new_days = day_types(new_schedule)
+        changed = {day for day in old_days.keys() | new_days.keys() if old_days.get(day) != new_days.get(day)}
+
+        diff = app.diff_schedules(old_schedule, new_schedule)
+        assert diff.changed_days == len(changed)
+
+        covered = set()
+        for first, last, old_type, new_type, count in diff.changed_ranges:
+            days = {day for day in changed if first <= day <= last}
+            assert len(days) == count
+            assert all(old_days.get(day) == old_type and new_days.get(day) == new_type for day in days)
+            covered |= days
+        assert covered == changed
+
+    assert app.diff_schedules(old_schedule, old_schedule).is_empty()
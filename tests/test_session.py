@@ -0,0 +1,66 @@
+import json
+import zlib
+
+import pytest
+
+import main
+from sample_plans import ASPIRANTURA_TYPE
+
+
+def open_window(window):
+    return main.MainWindow(session_path=window.session_path, catalog_path=window.catalog_path)
+
+
+def test_session_restores_schedule(window, monkeypatch):
+    window.program_combo.setCurrentText(ASPIRANTURA_TYPE)
+    window.year_combo.setCurrentText('2027')
+    window.load_example()
+    window.generate_schedule()
+    window.save_session()
+    window.session_executor.shutdown(wait=True)
+    window.session_executor = None
+
+    # График берется из снимка, а не строится заново
+    def schedule_periods(*args, **kwargs):
+        raise AssertionError('график построен заново')
+    monkeypatch.setattr(main.EducationalScheduleApp, 'schedule_periods', schedule_periods)
+
+    restored = open_window(window)
+    assert (restored.program_type, restored.start_year) == (ASPIRANTURA_TYPE, 2027)
+    assert restored.table_rows() == window.table_rows()
+    assert restored.generated_schedule == window.generated_schedule
+    restored.close()
+
+
+@pytest.mark.parametrize('data', [
+    b'',
+    b'not a session file',
+    main.SESSION_HEADER.pack(main.SESSION_MAGIC, main.SESSION_VERSION) + b'\x78\x9c broken',
+    main.SESSION_HEADER.pack(main.SESSION_MAGIC, main.SESSION_VERSION) + zlib.compress(b'{"schedule": null}'),
+    main.SESSION_HEADER.pack(main.SESSION_MAGIC, main.SESSION_VERSION + 1) + zlib.compress(b'{}'),
+], ids=['empty', 'foreign', 'bad zlib', 'missing keys', 'other version'])
+def test_corrupt_session_is_ignored(window, data):
+    with open(window.session_path, 'wb') as f:
+        f.write(data)
+
+    restored = open_window(window)
+    assert restored.table.rowCount() == 0
+    assert restored.generated_schedule is None
+    assert window.messages == []
+    restored.close()
+
+
+def test_truncated_session_is_ignored(window):
+    window.load_example()
+    window.generate_schedule()
+    state = {'program_type': window.program_type, 'start_year': window.start_year, 'work_week': window.work_week,
+             'rows': window.table_rows(), 'schedule': window.generated_schedule,
+             'calendar_hash': window.app.holiday_calendar.source_hash().hex()}
+    data = main.encode_session(state)
+    assert main.decode_session(data)['rows'] == json.loads(json.dumps(state['rows']))
+
+    with open(window.session_path, 'wb') as f:
+        f.write(data[:len(data) // 2])
+    restored = open_window(window)
+    assert restored.generated_schedule is None
+    restored.close()
@@ -0,0 +1,86 @@
+from datetime import datetime
+
+import pytest
+
+import main
+from sample_plans import ASPIRANTURA_TYPE, ORDINATURA_TYPE
+
+
+def test_short_first_semester_reports_working_days(app):
+    # 16 недель и 1 неделя каникул — на один рабочий день меньше, чем до 9 января 2026
+    totals = {(1, 1, 'Т'): 16, (1, 1, 'К'): 1, (1, 2, 'Т'): 10}
+    with pytest.raises(ValueError, match='не хватает 1 раб. дн.'):
+        app.solve_plan(totals, 2025)
+
+    totals[1, 1, 'Т'] = 10
+    with pytest.raises(ValueError, match='не хватает 31 раб. дн.'):
+        app.solve_plan(totals, 2025)
+
+
+def test_winter_holidays_without_vacation(app):
+    totals = {(1, 1, 'Т'): 20, (1, 1, 'П'): 4, (1, 2, 'Т'): 10}
+    with pytest.raises(ValueError, match='зимние праздники не удается поставить в каникулы'):
+        app.solve_plan(totals, 2025)
+
+    # Со списком предупреждений семестр без К не отвергается
+    warnings = []
+    periods_data = app.solve_plan(totals, 2025, warnings=warnings)
+    assert [row['Тип'] for row in periods_data] == ['Т', 'П', 'Т']
+    assert warnings == ['1 курс, 1 семестр: зимние праздники приходятся на занятия, в семестре нет каникул (К)']
+
+    # Отключенное ограничение не дает ни ошибки, ни предупреждения
+    warnings = []
+    app.solve_plan(totals, 2025, holidays_in_vacation=False, warnings=warnings)
+    assert warnings == []
+
+
+@pytest.mark.parametrize('work_week', [main.WORK_WEEK_5, main.WORK_WEEK_6])
+def test_solvable_plan(app, work_week):
+    totals = {(1, 1, 'Т'): 10, (1, 1, 'П'): 6, (1, 1, 'ПА'): 1, (1, 1, 'К'): 3,
+              (1, 2, 'Т'): 12, (1, 2, 'П'): 8, (1, 2, 'ПА'): 1, (1, 2, 'К'): 6}
+    periods_data = app.solve_plan(totals, 2025, work_week)
+
+    assert {(row['Год'], row['Семестр'], row['Тип']): row['Недели'] for row in periods_data} == totals
+    schedule = app.generate_schedule(periods_data, 2025, work_week)
+    second = [period for period in schedule if period['semester'] == 2]
+    assert second[0]['start_date'] > datetime(2026, 1, 8)
+    # Последний рабочий день перед праздниками — в каникулах
+    before_winter = max((period for period in schedule if period['days'] and period['days'][0] < datetime(2026, 1, 1)),
+                        key=lambda period: period['start_date'])
+    assert before_winter['type'] == 'К'
+
+
+@pytest.mark.parametrize('program_type', [ORDINATURA_TYPE, ASPIRANTURA_TYPE])
+def test_window_solves_example(window, monkeypatch, program_type):
+    questions = []
+
+    def question(parent, title, text, *args):
+        questions.append(text)
+        return answer
+    monkeypatch.setattr(main.QMessageBox, 'question', staticmethod(question))
+
+    window.program_combo.setCurrentText(program_type)
+    window.load_example()
+    example = window.table_rows()
+    shuffled = example[::-1]
+    window.set_plan(window.program_type, window.start_year, window.work_week,
+                    [dict(zip(main.TABLE_COLUMNS, row)) for row in shuffled])
+
+    # Отказ от предупреждения оставляет таблицу как есть
+    answer = main.QMessageBox.StandardButton.No
+    window.solve_plan()
+    assert 'в семестре нет каникул (К)' in questions[-1]
+    assert window.table_rows() == shuffled
+
+    answer = main.QMessageBox.StandardButton.Yes
+    window.solve_plan()
+    assert window.table_rows() == example
+    assert window.messages == []
+
+    # Без ограничения о праздниках вопроса нет
+    window.holidays_in_vacation_checkbox.setChecked(False)
+    window.set_plan(window.program_type, window.start_year, window.work_week,
+                    [dict(zip(main.TABLE_COLUMNS, row)) for row in shuffled])
+    window.solve_plan()
+    assert len(questions) == 2
+    assert window.table_rows() == example
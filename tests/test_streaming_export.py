@@ -0,0 +1,57 @@
+import io
+
+import pytest
+from openpyxl import load_workbook
+
+import main
+from sample_plans import ASPIRANTURA, ASPIRANTURA_TYPE, ORDINATURA, ORDINATURA_TYPE
+
+CASES = [
+    (ORDINATURA_TYPE, ORDINATURA, 2025, main.WORK_WEEK_5),
+    (ASPIRANTURA_TYPE, ASPIRANTURA, 2026, main.WORK_WEEK_5),
+    (ORDINATURA_TYPE, ORDINATURA, 2027, main.WORK_WEEK_6),
+]
+
+
+def workbook_contents(data):
+    """Значения, оформление, объединения и ширины столбцов всех листов"""
+    wb = load_workbook(io.BytesIO(data))
+    contents = {}
+    for ws in wb.worksheets:
+        cells = {}
+        for row in ws.iter_rows():
+            for cell in row:
+                if cell.value is None and not cell.has_style:
+                    continue
+                cells[cell.coordinate] = (cell.value, repr(cell.font), repr(cell.fill), repr(cell.border),
+                                          repr(cell.alignment), cell.number_format)
+        contents[ws.title] = {
+            'cells': cells,
+            'merged': sorted(str(merged) for merged in ws.merged_cells.ranges),
+            'widths': {key: dim.width for key, dim in ws.column_dimensions.items()},
+            'heights': {key: dim.height for key, dim in ws.row_dimensions.items() if dim.height},
+        }
+    return contents
+
+
+@pytest.mark.parametrize('program_type, plan, start_year, work_week', CASES)
+def test_streaming_export_matches_openpyxl(app, program_type, plan, start_year, work_week):
+    schedule = app.generate_schedule(plan, start_year, work_week)
+    summary = app.compute_summary(schedule)
+
+    expected = app.export_excel_bytes(schedule, start_year, program_type, summary)
+    streamed = app.export_excel_bytes(schedule, start_year, program_type, summary, streaming=True)
+
+    expected_contents = workbook_contents(expected)
+    assert workbook_contents(streamed) == expected_contents
+    assert expected_contents['Календарный график']['merged']
+
+
+def test_template_matches_fresh_workbook(app):
+    schedule = app.generate_schedule(ASPIRANTURA, 2026)
+    fresh = app.create_excel_file(schedule, 2026, ASPIRANTURA_TYPE)
+    buffer = io.BytesIO()
+    fresh.save(buffer)
+
+    assert workbook_contents(app.export_excel_bytes(schedule, 2026, ASPIRANTURA_TYPE)) == \
+        workbook_contents(buffer.getvalue())
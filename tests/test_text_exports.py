@@ -0,0 +1,80 @@
+import codecs
+import csv
+import io
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+from sample_plans import ASPIRANTURA, ORDINATURA
+
+
+@pytest.fixture
+def groups(app):
+    return [{'name': 'Группа; "А", 1', 'start_year': 2025, 'schedule': app.generate_schedule(ORDINATURA, 2025)},
+            {'name': 'Аспиранты', 'start_year': 2026, 'schedule': app.generate_schedule(ASPIRANTURA, 2026)}]
+
+
+def export(app, groups, fmt):
+    stream = io.BytesIO()
+    app.write_schedule_text(groups, stream, fmt)
+    return stream.getvalue()
+
+
+def test_csv_has_a_row_per_working_day(app, groups):
+    data = export(app, groups, 'csv')
+    assert data.startswith(codecs.BOM_UTF8)
+
+    header, *rows = csv.reader(io.StringIO(data.decode('utf-8-sig'), newline=''), delimiter=';')
+    assert header == ['Группа', 'Дата', 'День', 'Курс', 'Семестр', 'Код', 'Вид деятельности']
+    expected = [[group['name'], f'{day:%Y-%m-%d}', str(period['year']), str(period['semester']), period['type']]
+                for group in groups for period in group['schedule'] for day in period['days']]
+    assert [row[:2] + row[3:6] for row in rows] == expected
+
+
+def test_json_lists_every_period(app, groups):
+    records = json.loads(export(app, groups, 'json').decode('utf-8'))
+
+    periods = [(group, period) for group in groups for period in group['schedule']]
+    assert len(records) == len(periods)
+    for record, (group, period) in zip(records, periods):
+        assert record['group'] == group['name'] and record['type'] == period['type']
+        assert record['start'] == period['start_date'].date().isoformat()
+        assert record['end'] == period['end_date'].date().isoformat()
+        assert record['days'] == len(period['days'])
+    assert json.loads(export(app, [], 'json')) == []
+
+
+def test_ics_is_well_formed(app, groups):
+    data = export(app, groups, 'ics')
+    assert data.endswith(b'\r\n')
+    physical = data.split(b'\r\n')[:-1]
+    assert all(len(line) <= 75 for line in physical)
+    assert b'\n' not in data.replace(b'\r\n', b'')
+
+    # Развернуть продолжения строк (RFC 5545, 3.1) и разобрать свойства
+    lines = data.decode('utf-8').replace('\r\n ', '').split('\r\n')[:-1]
+    events, stack = [], []
+    for line in lines:
+        name, _, value = line.partition(':')
+        if name == 'BEGIN':
+            stack.append(value)
+            if value == 'VEVENT':
+                events.append({})
+        elif name == 'END':
+            assert stack.pop() == value
+        else:
+            assert stack
+            if stack[-1] == 'VEVENT':
+                events[-1][name] = value
+    assert not stack and lines[0] == 'BEGIN:VCALENDAR'
+
+    periods = [(group, period) for group in groups for period in group['schedule'] if period['days']]
+    assert len(events) == len(periods)
+    assert len({event['UID'] for event in events}) == len(events)
+    for event, (group, period) in zip(events, periods):
+        start = datetime.strptime(event['DTSTART;VALUE=DATE'], '%Y%m%d')
+        end = datetime.strptime(event['DTEND;VALUE=DATE'], '%Y%m%d')
+        assert (start, end) == (period['start_date'], period['end_date'] + timedelta(days=1))
+        assert event['DTSTAMP'].endswith('Z')
+    assert events[0]['SUMMARY'].endswith(r'(Группа\; "А"\, 1)')
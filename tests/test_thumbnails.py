@@ -0,0 +1,22 @@
+import os
+import subprocess
+import sys
+
+from sample_plans import ORDINATURA, ORDINATURA_TYPE
+
+MAIN = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'main.py')
+
+
+def test_thumbnails_without_display(app, tmp_path):
+    workbook = tmp_path / 'график.xlsx'
+    app.save_excel_atomic(app.generate_schedule(ORDINATURA, 2025), 2025, ORDINATURA_TYPE, str(workbook))
+
+    # Ни дисплея, ни QT_QPA_PLATFORM: платформу offscreen выбирает сама команда
+    env = {key: value for key, value in os.environ.items()
+           if key not in ('QT_QPA_PLATFORM', 'DISPLAY', 'WAYLAND_DISPLAY')}
+    env['HOME'] = str(tmp_path)
+    result = subprocess.run([sys.executable, MAIN, '--thumbnails', str(tmp_path / 'thumbs'), str(workbook)],
+                            env=env, capture_output=True, text=True, timeout=120)
+
+    assert result.returncode == 0, result.stderr
+    assert (tmp_path / 'thumbs' / 'график.png').read_bytes().startswith(b'\x89PNG\r\n\x1a\n')